@@ -1,7 +1,7 @@
 from django.shortcuts import render
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Sum, Count, Q, F
+from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
 from django.http import JsonResponse
@@ -37,7 +37,7 @@ class DashboardHomeView(LoginRequiredMixin, TemplateView):
         context['low_stock_products'] = InventoryStock.objects.select_related(
             'product', 'warehouse'
         ).filter(
-            quantity__lte=F('min_stock_level')
+            low_stock=True
         )[:10]
         
         # Thanh toán chờ xử lý
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:38
+
+from django.db import migrations, models
+import utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmers', '0002_alter_farmer_active_farm_area_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='farmerdocument',
+            name='file',
+            field=models.FileField(max_length=255, storage=utils.storage.get_document_storage, upload_to='farmer_documents/', verbose_name='File tài liệu'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import RegexValidator, MinValueValidator, MaxValueValidator
+from utils.storage import get_document_storage
 
 class Farmer(models.Model):
     """Model cho thông tin nông dân - nhà cung cấp sản phẩm"""
@@ -190,7 +191,7 @@ class FarmerDocument(models.Model):
     farmer = models.ForeignKey(Farmer, on_delete=models.CASCADE, related_name='documents')
     document_type = models.CharField(max_length=30, choices=DOCUMENT_TYPE_CHOICES, verbose_name="Loại tài liệu")
     title = models.CharField(max_length=200, verbose_name="Tiêu đề")
-    file = models.FileField(upload_to='farmer_documents/', verbose_name="File tài liệu")
+    file = models.FileField(upload_to='farmer_documents/', storage=get_document_storage, max_length=255, verbose_name="File tài liệu")
     issue_date = models.DateField(blank=True, null=True, verbose_name="Ngày cấp")
     expiry_date = models.DateField(blank=True, null=True, verbose_name="Ngày hết hạn")
     notes = models.TextField(blank=True, verbose_name="Ghi chú")
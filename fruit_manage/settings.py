@@ -118,6 +118,10 @@ DATABASES = {
     }
 }
 
+# Kết nối riêng cho bộ đếm số chứng từ (utils/sequences.py): câu UPDATE giữ số commit
+# ngay trên kết nối này, không khóa dòng bộ đếm tới hết transaction của request
+DATABASES['sequences'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -163,6 +167,32 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Biến động tồn kho cũ hơn số ngày này được chuyển sang lưu trữ theo tháng
+STOCK_MOVEMENT_ARCHIVE_DAYS = 365
+
+# Phương pháp tính giá vốn xuất kho: 'average' (bình quân gia quyền di động) hoặc 'fifo'
+INVENTORY_VALUATION_METHOD = 'average'
+
+# Tính lại mức tồn tối thiểu/tối đa từ nhu cầu xuất kho (inventory/forecasting.py)
+REORDER_WINDOW_DAYS = 90
+REORDER_LEAD_TIME_DAYS = 7
+REORDER_SERVICE_LEVEL_Z = 1.65  # mức phục vụ ~95%
+REORDER_REVIEW_DAYS = 7
+
+# Nhập hàng làm kho vượt sức chứa (tấn): 'reject' từ chối phiếu, 'warn' vẫn ghi và trả về cảnh báo
+WAREHOUSE_CAPACITY_POLICY = 'reject'
+
+# Số chứng từ mỗi tiến trình lấy trước từ bộ đếm (utils/sequences.py); 1 = dãy số liên tục
+SEQUENCE_BLOCK_SIZE = 20
+# Alias kết nối của bộ đếm; 'default' thì bộ đếm chạy trong transaction của người gọi.
+# Khi chạy test, utils.testing.TestRunner đặt lại thành 'default' (TestCase chỉ cho dùng 'default')
+SEQUENCE_DATABASE = 'sequences'
+
+# Lọc điểm GPS khi nhận vị trí xe (orders/positions.py): chỉ lưu điểm cách điểm đã lưu trước đó
+# ít nhất TRACKING_MIN_DISTANCE_M mét, hoặc sau ít nhất TRACKING_MAX_INTERVAL_SECONDS giây
+TRACKING_MIN_DISTANCE_M = 50
+TRACKING_MAX_INTERVAL_SECONDS = 300
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -172,10 +202,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
 
+TEST_RUNNER = 'utils.testing.TestRunner'
+
 # Cache configuration
+# Cache dùng chung giữa các worker: số phiên bản của các khối tổng hợp tồn kho/danh mục
+# sản phẩm (inventory/aggregates.py) và vị trí xe (orders/positions.py) phải thấy được
+# từ mọi tiến trình. Bảng cache được tạo bởi migration utils/0003.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
     }
 }
 
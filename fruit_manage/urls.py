@@ -35,6 +35,7 @@ urlpatterns = [
     path('activity-logs/', include('activity_logs.urls')),
     path('management/', include('management.urls')),
     path('api/', include('utils.api_urls')),
+    path('documents/', include('utils.urls')),
 ]
 
 # Serve media files during development
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:38
+
+from django.db import migrations, models
+import utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('import_export', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importexportdocument',
+            name='file',
+            field=models.FileField(max_length=255, storage=utils.storage.get_document_storage, upload_to='import_export_documents/', verbose_name='File tài liệu'),
+        ),
+        migrations.AlterField(
+            model_name='shippingdocument',
+            name='file',
+            field=models.FileField(max_length=255, storage=utils.storage.get_document_storage, upload_to='shipping_documents/', verbose_name='File tài liệu'),
+        ),
+    ]
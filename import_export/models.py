@@ -1,6 +1,8 @@
 from django.db import models
 from orders.models import Order
 from accounts.models import User
+from utils.sequences import allocate_number
+from utils.storage import get_document_storage
 
 class ImportExportDocument(models.Model):
     """Tài liệu xuất nhập khẩu"""
@@ -42,7 +44,7 @@ class ImportExportDocument(models.Model):
     approval_date = models.DateField(blank=True, null=True, verbose_name="Ngày duyệt")
     
     # File và ghi chú
-    file = models.FileField(upload_to='import_export_documents/', verbose_name="File tài liệu")
+    file = models.FileField(upload_to='import_export_documents/', storage=get_document_storage, max_length=255, verbose_name="File tài liệu")
     notes = models.TextField(blank=True, verbose_name="Ghi chú")
     
     # Thông tin người tạo/cập nhật
@@ -113,13 +115,7 @@ class CustomsDeclaration(models.Model):
     def save(self, *args, **kwargs):
         if not self.declaration_number:
             # Tự động tạo số tờ khai
-            prefix = 'TK'
-            last_declaration = CustomsDeclaration.objects.order_by('-id').first()
-            if last_declaration:
-                number = int(last_declaration.declaration_number.split('-')[-1]) + 1
-            else:
-                number = 1
-            self.declaration_number = f"{prefix}-{number:06d}"
+            self.declaration_number = allocate_number('TK')
         
         self.total_tax = self.customs_duty + self.vat_amount + self.other_fees
         super().save(*args, **kwargs)
@@ -154,7 +150,7 @@ class ShippingDocument(models.Model):
     eta = models.DateField(blank=True, null=True, verbose_name="Ngày đến dự kiến")
     
     # File và ghi chú
-    file = models.FileField(upload_to='shipping_documents/', verbose_name="File tài liệu")
+    file = models.FileField(upload_to='shipping_documents/', storage=get_document_storage, max_length=255, verbose_name="File tài liệu")
     notes = models.TextField(blank=True, verbose_name="Ghi chú")
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="Người tạo")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Ngày tạo")
@@ -0,0 +1,154 @@
+"""
+Tổng hợp tồn kho theo kho (WarehouseStockSummary).
+
+Sổ cái gọi record_stock_changes() với giá trị cũ/mới của các dòng vừa cộng,
+nên danh sách kho chỉ cần đọc số đã tính sẵn thay vì Count/Sum trên toàn bộ tồn kho.
+Các chỉnh sửa tay trên InventoryStock (form, admin) đi qua rebuild_warehouse_summary().
+
+Khối tổng hợp của danh sách tồn kho (stock_list_summary) được cache theo một
+số phiên bản; mọi lần ghi tồn kho tăng số phiên bản sau khi commit. Danh mục
+sản phẩm kèm tồn kho của form tạo đơn hàng (product_catalog_json) dùng thêm
+số phiên bản của danh mục, tăng khi sửa sản phẩm hoặc đơn vị tính.
+Số phiên bản nằm trong cache dùng chung của mọi worker (DatabaseCache, xem
+settings.CACHES), nên lần ghi ở một worker làm mất hiệu lực khối đã cache ở mọi worker.
+"""
+import json
+
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.utils import timezone
+
+from products.models import Product
+from .models import InventoryStock, Warehouse, WarehouseStockSummary
+
+ZERO = Decimal('0')
+
+STOCK_SUMMARY_VERSION_KEY = 'inventory:stock_summary_version'
+PRODUCT_CATALOG_VERSION_KEY = 'inventory:product_catalog_version'
+STOCK_SUMMARY_TIMEOUT = 300  # giây, khối của phiên bản cũ tự hết hạn
+
+
+def _is_low(quantity, min_level):
+    return quantity <= min_level
+
+
+def record_stock_changes(warehouse_id, changes, value_delta=ZERO):
+    """
+    Cộng phần chênh lệch vào tổng hợp của kho bằng một câu UPDATE F(), không khóa
+    trước dòng tổng hợp; gọi ở cuối transaction của sổ cái để dòng này bị giữ ngắn nhất.
+    `changes` là các dict {'old', 'new', 'min_stock_level', 'weight_per_unit', 'created'};
+    value_delta là phần chênh lệch giá trị tồn do inventory/valuation.py tính.
+    Dòng tồn kho vừa được tạo (created) chưa có trong tổng hợp nên không trừ trạng thái cũ.
+    """
+    sku = low = 0
+    quantity = tonnage = ZERO
+    for change in changes:
+        old, new, min_level = change['old'], change['new'], change['min_stock_level']
+        quantity += new - old
+        tonnage += (new - old) * change.get('weight_per_unit', ZERO)
+        sku += (new > 0) - (old > 0)
+        low += _is_low(new, min_level) - (0 if change.get('created') else _is_low(old, min_level))
+    if not (sku or low or quantity or tonnage or value_delta):
+        return
+
+    updates = {
+        'sku_count': F('sku_count') + sku,
+        'total_quantity': F('total_quantity') + quantity,
+        'used_tonnage': F('used_tonnage') + tonnage,
+        'low_stock_count': F('low_stock_count') + low,
+        'total_value': F('total_value') + value_delta,
+        'updated_at': timezone.now(),
+    }
+    if not WarehouseStockSummary.objects.filter(warehouse_id=warehouse_id).update(**updates):
+        # Chưa có dòng tổng hợp (kho tạo trước khi có bảng tổng hợp): tính lại toàn bộ
+        # một lần, đã bao gồm thay đổi vừa ghi
+        rebuild_warehouse_summary(warehouse_id)
+
+
+def rebuild_warehouse_summary(warehouse_id):
+    """
+    Tính lại tổng hợp của một kho từ InventoryStock (sửa tay, kiểm kê, lần đầu của kho).
+    Ghi đè giá trị tuyệt đối nên vẫn khóa dòng tổng hợp trước khi đọc, để không ghi đè
+    phần cộng dồn của transaction khác; sổ cái không đi qua đường này.
+    """
+    with transaction.atomic():
+        summary, _ = WarehouseStockSummary.objects.select_for_update().get_or_create(warehouse_id=warehouse_id)
+        totals = InventoryStock.objects.filter(warehouse_id=warehouse_id).aggregate(
+            sku_count=Count('id', filter=Q(quantity__gt=0)),
+            total_quantity=Sum('quantity', default=ZERO),
+            low_stock_count=Count('id', filter=Q(low_stock=True)),
+            total_value=Sum('stock_value', default=ZERO),
+            used_tonnage=Sum(
+                F('quantity') * F('product__weight_per_unit'), default=ZERO, output_field=DecimalField()
+            ),
+        )
+        for field, value in totals.items():
+            setattr(summary, field, value)
+        summary.save()
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def bump_stock_summary_version():
+    """Làm mất hiệu lực khối tổng hợp đã cache; gọi qua transaction.on_commit"""
+    _bump_version(STOCK_SUMMARY_VERSION_KEY)
+
+
+def bump_product_catalog_version():
+    """Làm mất hiệu lực danh mục sản phẩm đã cache; gọi qua transaction.on_commit"""
+    _bump_version(PRODUCT_CATALOG_VERSION_KEY)
+
+
+def stock_list_summary():
+    """
+    Tổng hợp cho danh sách tồn kho, tính bằng một câu aggregate và cache theo phiên bản:
+    total_products, total_stock, low_stock_count, warehouse_count, inventory_value, stock_rows.
+    """
+    version = cache.get_or_set(STOCK_SUMMARY_VERSION_KEY, 1, None)
+    key = f'inventory:stock_list_summary:{version}'
+    summary = cache.get(key)
+    if summary is None:
+        summary = Warehouse.objects.aggregate(
+            warehouse_count=Count('id', distinct=True),
+            stock_rows=Count('inventorystock'),
+            total_products=Count('inventorystock__product', distinct=True),
+            total_stock=Sum('inventorystock__quantity', default=ZERO),
+            low_stock_count=Count('inventorystock', filter=Q(inventorystock__low_stock=True)),
+            inventory_value=Sum('inventorystock__stock_value', default=ZERO),
+        )
+        cache.set(key, summary, STOCK_SUMMARY_TIMEOUT)
+    return summary
+
+
+def product_catalog_json():
+    """
+    JSON các sản phẩm đang kinh doanh kèm tổng tồn mọi kho (id, name, code, price, unit, stock).
+    Một câu GROUP BY trên sản phẩm, đơn vị và tồn kho; chuỗi JSON được cache theo
+    phiên bản tồn kho và phiên bản danh mục.
+    """
+    stock_version = cache.get_or_set(STOCK_SUMMARY_VERSION_KEY, 1, None)
+    catalog_version = cache.get_or_set(PRODUCT_CATALOG_VERSION_KEY, 1, None)
+    key = f'inventory:product_catalog:{catalog_version}:{stock_version}'
+    catalog = cache.get(key)
+    if catalog is None:
+        rows = Product.objects.filter(is_active=True).order_by('name').values(
+            'id', 'name', 'code', 'selling_price', 'unit__name'
+        ).annotate(stock=Sum('inventorystock__quantity', default=ZERO))
+        catalog = json.dumps([{
+            'id': row['id'],
+            'name': row['name'],
+            'code': row['code'],
+            'price': float(row['selling_price']),
+            'unit': row['unit__name'] or '',
+            'stock': float(row['stock'])
+        } for row in rows])
+        cache.set(key, catalog, STOCK_SUMMARY_TIMEOUT)
+    return catalog
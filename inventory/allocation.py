@@ -0,0 +1,168 @@
+"""
+Giữ hàng cho đơn bán khi đơn chuyển sang trạng thái 'confirmed'.
+
+Phần giữ được trả lại khi đơn bị hủy hoặc trả hàng (release_order), và được
+xuất kho khi đơn giao vận/hoàn thành (consume_order): bỏ giữ và ghi phiếu xuất
+qua sổ cái trong cùng transaction, nên hàng đã giao không còn bị tính là đang giữ.
+
+Mỗi dòng đơn được phân bổ qua các kho theo thứ tự cố định: kho gần khách
+trước (địa chỉ kho cùng tỉnh/thành với khách hàng), sau đó kho còn nhiều hàng
+khả dụng hơn, cuối cùng theo id kho. Các dòng tồn kho liên quan được khóa theo
+thứ tự (warehouse_id, product_id), cùng thứ tự với sổ cái, để tránh deadlock.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.db.models.functions import Greatest
+
+from orders.models import Order
+from .ledger import apply_movements
+from .models import InventoryStock, StockMovement, StockReservation, Warehouse
+
+ZERO = Decimal('0')
+
+# Trạng thái đơn làm xuất kho / trả lại phần hàng đang giữ
+CONSUMING_STATUSES = ('shipped', 'completed')
+RELEASING_STATUSES = ('cancelled', 'returned')
+
+
+class InsufficientStockError(Exception):
+    """Không đủ hàng khả dụng để giữ cho đơn"""
+
+
+def _add_reserved(amounts):
+    """Cộng {stock_id: delta} vào reserved_quantity bằng một câu UPDATE, không để âm"""
+    if not amounts:
+        return
+    delta = Case(
+        *[When(pk=stock_id, then=Value(d, output_field=DecimalField())) for stock_id, d in amounts.items()],
+        default=Value(ZERO, output_field=DecimalField()),
+        output_field=DecimalField(),
+    )
+    InventoryStock.objects.filter(pk__in=list(amounts)).update(
+        reserved_quantity=Greatest(F('reserved_quantity') + delta, Value(ZERO, output_field=DecimalField()))
+    )
+
+
+def _proximity(warehouse_address, province):
+    """0 nếu kho cùng tỉnh/thành với khách hàng, ngược lại 1"""
+    if province and province.lower() in (warehouse_address or '').lower():
+        return 0
+    return 1
+
+
+def reserve_order(order):
+    """
+    Giữ hàng cho toàn bộ các dòng của đơn bán. Đơn đã giữ hàng thì bỏ qua.
+    Thiếu hàng ở bất kỳ dòng nào thì không giữ gì và ném InsufficientStockError.
+    """
+    if order.order_type != 'sale':
+        return []
+    with transaction.atomic():
+        # Khóa đơn để hai lần xác nhận đồng thời không giữ hàng hai lần
+        list(Order.objects.select_for_update().filter(pk=order.pk).values_list('pk', flat=True))
+        if StockReservation.objects.filter(order=order).exists():
+            return []
+
+        details = list(order.details.select_related('product').order_by('id'))
+        if not details:
+            return []
+        product_ids = sorted({detail.product_id for detail in details})
+        province = order.customer.province if order.customer_id else ''
+        addresses = dict(Warehouse.objects.filter(is_active=True).values_list('id', 'address'))
+
+        stocks = list(
+            InventoryStock.objects.select_for_update()
+            .filter(product_id__in=product_ids, warehouse_id__in=list(addresses))
+            .order_by('warehouse_id', 'product_id')
+        )
+        available = {stock.pk: stock.quantity - stock.reserved_quantity for stock in stocks}
+        by_product = defaultdict(list)
+        for stock in stocks:
+            by_product[stock.product_id].append(stock)
+
+        reservations = []
+        reserved = defaultdict(Decimal)
+        for detail in details:
+            candidates = sorted(
+                by_product[detail.product_id],
+                key=lambda s: (_proximity(addresses[s.warehouse_id], province), -available[s.pk], s.warehouse_id),
+            )
+            remaining = detail.quantity
+            for stock in candidates:
+                if remaining <= 0:
+                    break
+                take = min(remaining, available[stock.pk])
+                if take <= 0:
+                    continue
+                available[stock.pk] -= take
+                reserved[stock.pk] += take
+                remaining -= take
+                reservations.append(StockReservation(order=order, order_detail=detail, stock=stock, quantity=take))
+            if remaining > 0:
+                raise InsufficientStockError(
+                    f'Không đủ hàng khả dụng cho sản phẩm {detail.product.name}: thiếu {remaining}'
+                )
+
+        _add_reserved(reserved)
+        return StockReservation.objects.bulk_create(reservations)
+
+
+def _take_reservations(order):
+    """
+    Khóa và xóa các dòng giữ hàng của đơn, trừ phần đã giữ khỏi reserved_quantity.
+    Trả về các dòng giữ hàng đã xóa (kèm stock) hoặc [] nếu đơn không giữ gì.
+    """
+    reservations = list(
+        StockReservation.objects.select_for_update().filter(order=order).select_related('stock').order_by('id')
+    )
+    if not reservations:
+        return []
+    released = defaultdict(Decimal)
+    for reservation in reservations:
+        released[reservation.stock_id] -= reservation.quantity
+    # Khóa tồn kho theo cùng thứ tự với lúc giữ hàng
+    list(InventoryStock.objects.select_for_update().filter(pk__in=list(released))
+         .order_by('warehouse_id', 'product_id').values_list('pk', flat=True))
+    _add_reserved(released)
+    StockReservation.objects.filter(pk__in=[r.pk for r in reservations]).delete()
+    return reservations
+
+
+def release_order(order):
+    """Trả lại toàn bộ phần hàng đang giữ của đơn (khi hủy đơn hoặc trả hàng)"""
+    with transaction.atomic():
+        return len(_take_reservations(order))
+
+
+def consume_order(order, user=None):
+    """
+    Xuất kho phần hàng đang giữ của đơn (khi giao vận/hoàn thành): bỏ giữ và ghi
+    phiếu xuất cho từng kho/sản phẩm đã giữ. Đơn không còn giữ hàng thì bỏ qua.
+    Trả về số phiếu xuất đã tạo.
+    """
+    with transaction.atomic():
+        quantities = defaultdict(Decimal)
+        for reservation in _take_reservations(order):
+            quantities[(reservation.stock.warehouse_id, reservation.stock.product_id)] += reservation.quantity
+        by_warehouse = defaultdict(list)
+        for (warehouse_id, product_id), quantity in sorted(quantities.items()):
+            by_warehouse[warehouse_id].append(StockMovement(
+                warehouse_id=warehouse_id,
+                product_id=product_id,
+                movement_type='outbound',
+                quantity=quantity,
+                reference_type='order',
+                reference_id=order.pk,
+                notes=f'Xuất kho cho đơn {order.order_number}',
+                created_by=user,
+            ))
+        created = 0
+        for warehouse_id, movements in by_warehouse.items():
+            # bulk_create không phát post_save nên tự cộng vào sổ cái (kèm giá vốn) trước khi ghi
+            apply_movements(warehouse_id, movements)
+            StockMovement.objects.bulk_create(movements)
+            created += len(movements)
+        return created
@@ -0,0 +1,276 @@
+"""
+Lưu trữ lịch sử biến động tồn kho theo tháng.
+
+Các tháng cũ hơn STOCK_MOVEMENT_ARCHIVE_DAYS được ghi ra file JSONL nén
+(MEDIA_ROOT/stock_movement_archive/YYYY-MM.jsonl.gz, dòng mới nhất trước)
+rồi xóa khỏi bảng StockMovement. Mỗi tháng để lại tổng theo
+(kho, sản phẩm, loại biến động) trong StockMovementRollup, nên các phép cộng
+dồn trên cả tháng không cần mở file. Tháng được tính theo TIME_ZONE.
+"""
+import gzip
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from products.models import Product
+from accounts.models import User
+from .models import StockMovement, StockMovementArchive, StockMovementRollup, Warehouse
+
+ARCHIVE_DIR = 'stock_movement_archive'
+
+ARCHIVE_FIELDS = (
+    'id', 'warehouse_id', 'product_id', 'movement_type', 'quantity', 'unit_cost', 'cost_of_goods',
+    'reference_type', 'reference_id', 'notes', 'created_by_id', 'created_at',
+)
+
+DELETE_BATCH_SIZE = 2000
+
+
+def month_start(value):
+    """Ngày đầu tháng (theo giờ địa phương) chứa thời điểm value"""
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """Khoảng [đầu tháng, đầu tháng sau) dạng datetime có múi giờ"""
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(month, time.min), tz),
+        timezone.make_aware(datetime.combine(_next_month(month), time.min), tz),
+    )
+
+
+def _absolute_path(file_path):
+    return os.path.join(settings.MEDIA_ROOT, file_path)
+
+
+def _sort_key(row):
+    return (row['created_at'], row['id'])
+
+
+def _encode(row):
+    return json.dumps({
+        key: (str(value) if isinstance(value, Decimal) else
+              value.isoformat() if isinstance(value, datetime) else value)
+        for key, value in row.items()
+    }, ensure_ascii=False)
+
+
+def _decode(line):
+    row = json.loads(line)
+    row['created_at'] = parse_datetime(row['created_at'])
+    row['quantity'] = Decimal(row['quantity'])
+    for field in ('unit_cost', 'cost_of_goods'):
+        if row.get(field) is not None:
+            row[field] = Decimal(row[field])
+    return row
+
+
+def read_archive(archive):
+    """Đọc lần lượt các dòng của một tháng đã lưu trữ, mới nhất trước"""
+    with gzip.open(_absolute_path(archive.file_path), 'rt', encoding='utf-8') as handle:
+        for line in handle:
+            yield _decode(line)
+
+
+def _write_archive(file_path, rows):
+    path = _absolute_path(file_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as handle:
+        for row in rows:
+            handle.write(_encode(row))
+            handle.write('\n')
+    os.replace(tmp_path, path)
+
+
+def _add_rollups(month, movements):
+    """Cộng tổng của các biến động sắp xóa vào StockMovementRollup của tháng"""
+    totals = movements.order_by().values('warehouse_id', 'product_id', 'movement_type').annotate(
+        total=Sum('quantity'), count=Count('id')
+    )
+    existing = {
+        (r.warehouse_id, r.product_id, r.movement_type): r
+        for r in StockMovementRollup.objects.select_for_update().filter(month=month)
+    }
+    to_create, to_update = [], []
+    for row in totals:
+        key = (row['warehouse_id'], row['product_id'], row['movement_type'])
+        rollup = existing.get(key)
+        if rollup is None:
+            to_create.append(StockMovementRollup(
+                month=month,
+                warehouse_id=row['warehouse_id'],
+                product_id=row['product_id'],
+                movement_type=row['movement_type'],
+                total_quantity=row['total'],
+                movement_count=row['count'],
+            ))
+        else:
+            rollup.total_quantity += row['total']
+            rollup.movement_count += row['count']
+            to_update.append(rollup)
+    StockMovementRollup.objects.bulk_create(to_create, batch_size=1000)
+    StockMovementRollup.objects.bulk_update(to_update, ['total_quantity', 'movement_count'], batch_size=1000)
+
+
+def archive_month(month):
+    """
+    Chuyển mọi biến động của một tháng sang file lưu trữ. Tháng đã có file thì
+    gộp thêm (bỏ trùng theo id, phòng lần chạy trước bị rollback sau khi đã ghi file).
+    Trả về số biến động đã chuyển.
+    """
+    start, end = month_bounds(month)
+    movements = StockMovement.objects.filter(created_at__gte=start, created_at__lt=end)
+    with transaction.atomic():
+        rows = list(movements.order_by('-created_at', '-id').values(*ARCHIVE_FIELDS))
+        if not rows:
+            return 0
+        ids = [row['id'] for row in rows]
+        archive = StockMovementArchive.objects.select_for_update().filter(month=month).first()
+        if archive is None:
+            archive = StockMovementArchive(month=month, file_path=f'{ARCHIVE_DIR}/{month:%Y-%m}.jsonl.gz')
+        elif os.path.exists(_absolute_path(archive.file_path)):
+            moved = set(ids)
+            rows.extend(row for row in read_archive(archive) if row['id'] not in moved)
+            rows.sort(key=_sort_key, reverse=True)
+        _write_archive(archive.file_path, rows)
+
+        _add_rollups(month, movements)
+        for i in range(0, len(ids), DELETE_BATCH_SIZE):
+            StockMovement.objects.filter(id__in=ids[i:i + DELETE_BATCH_SIZE]).delete()
+
+        archive.row_count = len(rows)
+        archive.min_id = min(row['id'] for row in rows)
+        archive.max_id = max(row['id'] for row in rows)
+        archive.save()
+    return len(ids)
+
+
+def archive_movements(horizon_days=None, now=None):
+    """
+    Lưu trữ mọi tháng kết thúc trước mốc (now - horizon_days). Tháng chứa mốc
+    được giữ nguyên trong bảng chính. Trả về [(tháng, số biến động đã chuyển)].
+    """
+    if horizon_days is None:
+        horizon_days = getattr(settings, 'STOCK_MOVEMENT_ARCHIVE_DAYS', 365)
+    now = now or timezone.now()
+    cutoff_month = month_start(now - timedelta(days=horizon_days))
+    oldest = StockMovement.objects.filter(
+        created_at__lt=month_bounds(cutoff_month)[0]
+    ).aggregate(first=Min('created_at'))['first']
+
+    results = []
+    month = month_start(oldest) if oldest else cutoff_month
+    while month < cutoff_month:
+        count = archive_month(month)
+        if count:
+            results.append((month, count))
+        month = _next_month(month)
+    return results
+
+
+def iter_archived_movements(before=None, warehouse_id=None, product_id=None, movement_type=None):
+    """
+    Duyệt các biến động đã lưu trữ, mới nhất trước, chỉ lấy dòng có
+    (created_at, id) nhỏ hơn before (nếu có) và khớp các bộ lọc.
+    """
+    archives = StockMovementArchive.objects.order_by('-month')
+    if before is not None:
+        archives = archives.filter(month__lte=month_start(before[0]))
+    for archive in archives:
+        for row in read_archive(archive):
+            if before is not None and _sort_key(row) >= before:
+                continue
+            if warehouse_id and row['warehouse_id'] != int(warehouse_id):
+                continue
+            if product_id and row['product_id'] != int(product_id):
+                continue
+            if movement_type and row['movement_type'] != movement_type:
+                continue
+            yield row
+
+
+def load_archived_movements(rows):
+    """
+    Dựng StockMovement (không lưu) từ các dòng lưu trữ, gắn sẵn kho, sản phẩm và
+    người tạo bằng ba truy vấn. Bỏ qua dòng có kho hoặc sản phẩm đã bị xóa.
+    """
+    rows = list(rows)
+    warehouses = Warehouse.objects.in_bulk({row['warehouse_id'] for row in rows})
+    products = Product.objects.in_bulk({row['product_id'] for row in rows})
+    users = User.objects.in_bulk({row['created_by_id'] for row in rows if row['created_by_id']})
+    movements = []
+    for row in rows:
+        if row['warehouse_id'] not in warehouses or row['product_id'] not in products:
+            continue
+        movement = StockMovement(**row)
+        movement.warehouse = warehouses[row['warehouse_id']]
+        movement.product = products[row['product_id']]
+        movement.created_by = users.get(row['created_by_id'])
+        movements.append(movement)
+    return movements
+
+
+def archived_count(warehouse_id=None, product_id=None, movement_type=None):
+    """Số biến động đã lưu trữ khớp bộ lọc, lấy từ tổng hợp theo tháng"""
+    rollups = StockMovementRollup.objects.all()
+    if warehouse_id:
+        rollups = rollups.filter(warehouse_id=warehouse_id)
+    if product_id:
+        rollups = rollups.filter(product_id=product_id)
+    if movement_type:
+        rollups = rollups.filter(movement_type=movement_type)
+    return rollups.aggregate(total=Sum('movement_count'))['total'] or 0
+
+
+def archived_totals(warehouse_id, after, until, product_ids=None):
+    """
+    Tổng số lượng đã lưu trữ của một kho theo (product_id, movement_type) cho
+    after < created_at <= until (after=None: từ đầu). Tháng nằm trọn trong
+    khoảng lấy từ tổng hợp, tháng bị cắt ngang mới phải đọc file.
+    """
+    totals = {}
+
+    def add(key, quantity):
+        totals[key] = totals.get(key, Decimal('0')) + quantity
+
+    archives = StockMovementArchive.objects.filter(month__lte=month_start(until))
+    if after is not None:
+        archives = archives.filter(month__gte=month_start(after))
+    full_months, partial = [], []
+    for archive in archives:
+        start, end = month_bounds(archive.month)
+        if (after is None or after < start) and end <= until:
+            full_months.append(archive.month)
+        else:
+            partial.append(archive)
+
+    if full_months:
+        rollups = StockMovementRollup.objects.filter(warehouse_id=warehouse_id, month__in=full_months)
+        if product_ids:
+            rollups = rollups.filter(product_id__in=product_ids)
+        for row in rollups.values('product_id', 'movement_type').annotate(total=Sum('total_quantity')):
+            add((row['product_id'], row['movement_type']), row['total'])
+
+    warehouse_id = int(warehouse_id)
+    product_ids = {int(pid) for pid in product_ids or ()}
+    for archive in partial:
+        for row in read_archive(archive):
+            if row['warehouse_id'] != warehouse_id or (product_ids and row['product_id'] not in product_ids):
+                continue
+            if row['created_at'] > until or (after is not None and row['created_at'] <= after):
+                continue
+            add((row['product_id'], row['movement_type']), row['quantity'])
+    return totals
@@ -0,0 +1,86 @@
+"""
+Kiểm tra sức chứa kho khi nhập hàng.
+
+Warehouse.capacity tính bằng tấn, còn tồn kho tính theo đơn vị của từng sản
+phẩm; Product.weight_per_unit quy đổi một đơn vị ra tấn. Sổ cái duy trì tổng
+khối lượng đang chứa (WarehouseStockSummary.used_tonnage) cùng transaction với
+mỗi biến động, nên mỗi lần kiểm tra chỉ đọc một dòng tổng hợp thay vì cộng
+lại toàn bộ tồn kho của kho.
+
+WAREHOUSE_CAPACITY_POLICY = 'reject' thì từ chối phiếu làm kho vượt sức chứa,
+'warn' thì vẫn ghi và trả về cảnh báo. Kho có capacity = 0 không bị giới hạn.
+
+Với 'reject', phiếu nhập được kiểm tra trước khi ghi (precheck_capacity: dòng tổng
+hợp cộng số lượng x weight_per_unit), để phiếu vượt sức chứa không được lưu; sổ cái
+vẫn kiểm tra lại sau khi cộng, trong cùng transaction, để chặn hai phiếu chen nhau.
+"""
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+
+from products.models import Product
+from .models import Warehouse, WarehouseStockSummary
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0')
+
+# Các loại phiếu nhập hàng vào kho cần kiểm tra sức chứa
+CAPACITY_CHECKED_TYPES = ('inbound', 'in')
+
+
+class CapacityExceededError(Exception):
+    """Nhập thêm hàng sẽ làm kho vượt sức chứa"""
+
+
+def capacity_policy():
+    return getattr(settings, 'WAREHOUSE_CAPACITY_POLICY', 'reject')
+
+
+def product_weights(product_ids):
+    """{product_id: số tấn trên một đơn vị tính}"""
+    return dict(Product.objects.filter(id__in=list(product_ids)).values_list('id', 'weight_per_unit'))
+
+
+def tonnage_of(quantities, weights=None):
+    """Tổng khối lượng (tấn) của {product_id: số lượng}"""
+    if weights is None:
+        weights = product_weights(quantities)
+    return sum((Decimal(str(quantity)) * weights.get(pid, ZERO) for pid, quantity in quantities.items()), ZERO)
+
+
+def check_capacity(warehouse_id, added_tonnage=ZERO):
+    """
+    So khối lượng đang chứa (cộng thêm added_tonnage) với sức chứa của kho.
+    Vượt sức chứa thì raise CapacityExceededError (policy 'reject') hoặc trả về
+    chuỗi cảnh báo (policy 'warn'); không vượt thì trả về None.
+    """
+    row = WarehouseStockSummary.objects.filter(warehouse_id=warehouse_id).values_list(
+        'used_tonnage', 'warehouse__capacity', 'warehouse__name'
+    ).first()
+    if row is None:
+        row = (ZERO,) + Warehouse.objects.filter(pk=warehouse_id).values_list('capacity', 'name').get()
+    used, capacity, name = row
+    projected = used + added_tonnage
+    if not capacity or projected <= capacity:
+        return None
+
+    message = (f'Kho {name} vượt sức chứa: {projected.quantize(Decimal("0.001"))} / '
+               f'{capacity} tấn')
+    if capacity_policy() == 'reject':
+        raise CapacityExceededError(message)
+    logger.warning(message)
+    return message
+
+
+def precheck_capacity(warehouse_id, quantities, weights=None):
+    """
+    Kiểm tra trước khi ghi các phiếu nhập {product_id: số lượng} vào kho (policy 'reject'):
+    raise CapacityExceededError nếu kho sẽ vượt sức chứa. Policy 'warn' để sổ cái cảnh báo.
+    """
+    if capacity_policy() != 'reject':
+        return
+    quantities = {pid: quantity for pid, quantity in quantities.items() if quantity and quantity > 0}
+    if quantities:
+        check_capacity(warehouse_id, tonnage_of(quantities, weights))
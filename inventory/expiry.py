@@ -0,0 +1,52 @@
+"""
+Quét lô hết hạn: chuyển phần còn lại của các lô quá hạn thành phiếu 'expired'.
+
+Chỉ đọc các lô còn hàng có expiry_date trước hôm nay (theo index trên
+expiry_date), mỗi kho xử lý trong một transaction: khóa các dòng tồn kho theo
+cùng thứ tự như sổ cái, đọc lại lô rồi ghi mọi phiếu bằng một lần bulk_create.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .ledger import apply_movements
+from .lots import LOT_REFERENCE
+from .models import InventoryLot, InventoryStock, StockMovement
+
+
+def expire_lots(today=None, user=None):
+    """Ghi phiếu 'expired' cho mọi lô quá hạn. Trả về {warehouse_id: số phiếu}"""
+    today = today or timezone.localdate()
+    expired = InventoryLot.objects.filter(expiry_date__lt=today, quantity__gt=0)
+    products_by_warehouse = defaultdict(set)
+    for warehouse_id, product_id in expired.values_list('warehouse_id', 'product_id').distinct():
+        products_by_warehouse[warehouse_id].add(product_id)
+
+    results = {}
+    for warehouse_id in sorted(products_by_warehouse):
+        product_ids = sorted(products_by_warehouse[warehouse_id])
+        with transaction.atomic():
+            # Khóa tồn kho trước (cùng thứ tự với sổ cái) để lô không đổi trong lúc ghi phiếu
+            list(InventoryStock.objects.select_for_update().filter(
+                warehouse_id=warehouse_id, product_id__in=product_ids
+            ).order_by('product_id').values_list('id'))
+            lots = expired.filter(warehouse_id=warehouse_id, product_id__in=product_ids).order_by('expiry_date', 'id')
+            movements = [
+                StockMovement(
+                    warehouse_id=warehouse_id,
+                    product_id=lot.product_id,
+                    movement_type='expired',
+                    quantity=lot.quantity,
+                    reference_type=LOT_REFERENCE,
+                    reference_id=lot.id,
+                    notes=f'Lô nhập {lot.received_date:%d/%m/%Y} hết hạn {lot.expiry_date:%d/%m/%Y}',
+                    created_by=user,
+                )
+                for lot in lots
+            ]
+            # bulk_create không phát post_save nên tự cộng vào sổ cái trước khi ghi
+            apply_movements(warehouse_id, movements)
+            StockMovement.objects.bulk_create(movements, batch_size=1000)
+        results[warehouse_id] = len(movements)
+    return results
@@ -0,0 +1,245 @@
+"""
+Sổ cái tồn kho: ghi biến động vào InventoryStock bằng phép cộng phía database.
+
+Mỗi biến động được cộng bằng câu UPDATE phía database
+(quantity = GREATEST(quantity + delta, 0)), nên hai phiếu cho cùng
+kho/sản phẩm commit đồng thời không làm mất cập nhật của nhau.
+
+Phiếu chỉ làm tăng tồn (nhập, điều chỉnh tăng) không khóa trước: câu UPDATE
+cộng thẳng, số lượng cũ suy ra từ số đọc lại ngay sau đó (dòng lúc này do chính
+transaction giữ nên số đọc được là của riêng nó), vì phép cộng dương không bị
+kẹp về 0. Phiếu có delta âm thì số bị kẹp phụ thuộc tồn hiện tại, còn giá vốn
+xuất và lô xuất theo FEFO cần đúng số lượng trước khi trừ, nên chỉ khi đó các
+dòng liên quan mới được khóa trước (SELECT ... FOR UPDATE theo thứ tự product_id,
+tránh deadlock). Khóa chỉ trên từng dòng kho/sản phẩm: phiếu của các sản phẩm
+khác trong cùng kho không phải chờ nhau.
+
+Tổng hợp theo kho (kể cả giá trị tồn) được cộng bằng một câu UPDATE F() duy nhất
+ở cuối, không khóa trước dòng tổng hợp, nên dòng này chỉ bị giữ từ câu UPDATE đó
+tới lúc commit.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .aggregates import bump_stock_summary_version, record_stock_changes
+from .capacity import CAPACITY_CHECKED_TYPES, check_capacity, product_weights
+from .models import InventoryStock, LowStockEvent, StockMovement
+from .lots import update_lots
+from .valuation import value_movements
+
+# Dấu của từng loại biến động khi cộng vào tồn kho
+MOVEMENT_SIGNS = {
+    'inbound': 1,
+    'in': 1,
+    'outbound': -1,
+    'out': -1,
+    'adjustment': 1,  # quantity có thể âm hoặc dương
+    'transfer': -1,   # chuyển đi khỏi kho này
+    'damaged': -1,
+    'expired': -1,
+}
+
+ZERO = Decimal('0')
+
+
+def movement_delta(movement_type, quantity):
+    """Lượng thay đổi tồn kho (có dấu) của một biến động"""
+    sign = MOVEMENT_SIGNS.get(movement_type, 0)
+    return Decimal(str(quantity)) * sign
+
+
+def _create_rows(warehouse_id, product_ids):
+    """
+    Tạo các dòng tồn kho còn thiếu, trả về tập product_id do chính transaction này tạo
+    (dòng transaction khác vừa tạo trước thì đã được tính vào tổng hợp của kho).
+    """
+    def new_rows(pids):
+        return [InventoryStock(warehouse_id=warehouse_id, product_id=pid, quantity=ZERO) for pid in pids]
+
+    try:
+        with transaction.atomic():
+            InventoryStock.objects.bulk_create(new_rows(product_ids))
+        return set(product_ids)
+    except IntegrityError:
+        pass
+    # Có transaction khác tạo cùng dòng: tạo lại từng dòng để biết dòng nào là của mình
+    created = set()
+    for pid in product_ids:
+        try:
+            with transaction.atomic():
+                InventoryStock.objects.bulk_create(new_rows([pid]))
+            created.add(pid)
+        except IntegrityError:
+            pass
+    return created
+
+
+STOCK_FIELDS = ('product_id', 'id', 'quantity', 'min_stock_level', 'low_stock', 'average_cost', 'stock_value')
+
+
+def _lock_rows(warehouse_id, product_ids):
+    """
+    Khóa các dòng tồn kho theo thứ tự product_id (tránh deadlock), tạo dòng còn thiếu.
+    Trả về (trạng thái trước khi cộng, tập product_id của các dòng vừa tạo).
+    """
+    locked = InventoryStock.objects.select_for_update().filter(warehouse_id=warehouse_id).order_by('product_id')
+    rows = {row['product_id']: row for row in locked.filter(product_id__in=product_ids).values(*STOCK_FIELDS)}
+    missing = [pid for pid in product_ids if pid not in rows]
+    created = set()
+    if missing:
+        created = _create_rows(warehouse_id, missing)
+        rows.update({row['product_id']: row for row in locked.filter(product_id__in=missing).values(*STOCK_FIELDS)})
+    return rows, created
+
+
+def _update_low_stock_flags(warehouse_id, changes):
+    """Đổi cờ low_stock của các dòng vừa vượt ngưỡng và ghi LowStockEvent cho từng lần chuyển"""
+    became_low, recovered, events = [], [], []
+    for pid, change in changes.items():
+        is_low = change['new'] <= change['min_stock_level']
+        if is_low == change['low_stock']:
+            continue
+        (became_low if is_low else recovered).append(change['stock_id'])
+        events.append(LowStockEvent(
+            stock_id=change['stock_id'],
+            warehouse_id=warehouse_id,
+            product_id=pid,
+            is_low=is_low,
+            quantity=change['new'],
+            min_stock_level=change['min_stock_level'],
+        ))
+    if became_low:
+        InventoryStock.objects.filter(pk__in=became_low).update(low_stock=True)
+    if recovered:
+        InventoryStock.objects.filter(pk__in=recovered).update(low_stock=False)
+    if events:
+        LowStockEvent.objects.bulk_create(events)
+
+
+def _apply_deltas(warehouse_id, deltas):
+    """
+    Cộng các delta {product_id: delta} (khác 0) vào tồn kho, chưa cập nhật tổng hợp
+    của kho. Gọi bên trong transaction; trả về trạng thái cũ/mới của từng dòng.
+    """
+    product_ids = sorted(deltas)
+    may_clamp = any(delta < 0 for delta in deltas.values())
+    if may_clamp:
+        before, created = _lock_rows(warehouse_id, product_ids)
+    else:
+        existing = set(InventoryStock.objects.filter(
+            warehouse_id=warehouse_id, product_id__in=product_ids
+        ).values_list('product_id', flat=True))
+        missing = [pid for pid in product_ids if pid not in existing]
+        created = _create_rows(warehouse_id, missing) if missing else set()
+    weights = product_weights(deltas)
+    if len(deltas) == 1:
+        delta_expr = Value(next(iter(deltas.values())), output_field=DecimalField())
+    else:
+        delta_expr = Case(
+            *[When(product_id=pid, then=Value(d, output_field=DecimalField())) for pid, d in deltas.items()],
+            default=Value(ZERO, output_field=DecimalField()),
+            output_field=DecimalField(),
+        )
+    InventoryStock.objects.filter(
+        warehouse_id=warehouse_id, product_id__in=product_ids
+    ).update(
+        quantity=Greatest(F('quantity') + delta_expr, Value(ZERO, output_field=DecimalField())),
+        last_updated=timezone.now(),
+    )
+    if not may_clamp:
+        # Dòng vừa được câu UPDATE khóa: đọc lại số mới, delta dương không bị kẹp nên số cũ = mới - delta
+        before = {
+            row['product_id']: dict(row, quantity=row['quantity'] - deltas[row['product_id']])
+            for row in InventoryStock.objects.filter(
+                warehouse_id=warehouse_id, product_id__in=product_ids
+            ).values(*STOCK_FIELDS)
+        }
+
+    # Các dòng đang bị khóa nên giá trị mới tính ở đây trùng với database
+    changes = {
+        pid: {
+            'stock_id': row['id'],
+            'old': row['quantity'],
+            'new': max(row['quantity'] + deltas[pid], ZERO),
+            'min_stock_level': row['min_stock_level'],
+            'low_stock': row['low_stock'],
+            'average_cost': row['average_cost'],
+            'stock_value': row['stock_value'],
+            'weight_per_unit': weights.get(pid, ZERO),
+            'created': pid in created,
+        }
+        for pid, row in before.items()
+    }
+    _update_low_stock_flags(warehouse_id, changes)
+    return changes
+
+
+def apply_deltas(warehouse_id, deltas):
+    """
+    Cộng nhiều delta {product_id: delta} vào tồn kho của một kho, không để âm.
+
+    Các dòng được cộng bằng một câu UPDATE gom nhóm (CASE theo product_id) phía
+    database, nên số truy vấn không phụ thuộc số sản phẩm; chỉ khi có delta âm
+    các dòng mới được khóa trước trong một truy vấn. Tổng hợp theo kho được cộng
+    sau cùng trong cùng transaction.
+    """
+    deltas = {pid: Decimal(str(d)) for pid, d in deltas.items() if d}
+    if not deltas:
+        return {}
+    with transaction.atomic():
+        changes = _apply_deltas(warehouse_id, deltas)
+        record_stock_changes(warehouse_id, changes.values())
+        transaction.on_commit(bump_stock_summary_version)
+    return changes
+
+
+def apply_delta(warehouse_id, product_id, delta):
+    """Cộng delta vào tồn kho (warehouse, product), không để âm"""
+    return apply_deltas(warehouse_id, {product_id: delta})
+
+
+def apply_movements(warehouse_id, movements, enforce_capacity=True):
+    """
+    Áp dụng các StockMovement của một kho vào tồn kho, giá vốn và lô hàng.
+    Phiếu chưa lưu (trước bulk_create) được gán sẵn cost_of_goods để ghi cùng lúc tạo.
+
+    Phiếu nhập làm tăng khối lượng trong kho được kiểm tra sức chứa ngay sau câu
+    UPDATE cộng tổng hợp của kho (dòng tổng hợp lúc này do transaction này giữ nên
+    không có phiếu nào chen vào): vượt sức chứa thì raise CapacityExceededError và
+    rollback toàn bộ, hoặc gán movement.capacity_warning nếu chỉ cảnh báo
+    (xem inventory/capacity.py).
+    """
+    entries = [(movement, movement_delta(movement.movement_type, movement.quantity)) for movement in movements]
+    deltas = {}
+    for movement, delta in entries:
+        deltas[movement.product_id] = deltas.get(movement.product_id, ZERO) + delta
+    deltas = {pid: delta for pid, delta in deltas.items() if delta}
+    if not deltas:
+        return {}
+    with transaction.atomic():
+        changes = _apply_deltas(warehouse_id, deltas)
+        value_delta = value_movements(warehouse_id, entries, changes)
+        update_lots(warehouse_id, entries, changes)
+        record_stock_changes(warehouse_id, changes.values(), value_delta)
+        transaction.on_commit(bump_stock_summary_version)
+        if enforce_capacity and any(
+            delta > 0 and movement.movement_type in CAPACITY_CHECKED_TYPES for movement, delta in entries
+        ):
+            added = sum(((c['new'] - c['old']) * c['weight_per_unit'] for c in changes.values()), ZERO)
+            warning = check_capacity(warehouse_id) if added > 0 else None
+            for movement, _ in entries:
+                movement.capacity_warning = warning
+    return changes
+
+
+def apply_movement(movement):
+    """Áp dụng một StockMovement đã lưu vào tồn kho"""
+    with transaction.atomic():
+        apply_movements(movement.warehouse_id, [movement])
+        if movement.cost_of_goods is not None:
+            StockMovement.objects.filter(pk=movement.pk).update(cost_of_goods=movement.cost_of_goods)
+
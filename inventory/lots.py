@@ -0,0 +1,117 @@
+"""
+Theo dõi lô hàng (InventoryLot) theo từng biến động.
+
+Phiếu làm tăng tồn tạo một lô mới, hạn sử dụng = ngày nhập + shelf_life_days
+của sản phẩm. Phiếu làm giảm tồn lấy từ lô hết hạn sớm nhất trước (FEFO);
+phiếu tham chiếu một lô cụ thể (reference_type='inventory_lot') lấy từ lô đó
+trước. Phiếu nhập có thể mang sẵn hạn (thuộc tính lot_expiry_date, ví dụ hàng
+chuyển kho giữ hạn của lô gốc); phiếu xuất được gán consumed_expiry là hạn sớm
+nhất của các lô đã lấy. Sổ cái gọi update_lots() trong cùng transaction, sau khi đã khóa các
+dòng tồn kho, nên chỉ cần đọc các lô còn hàng của những sản phẩm liên quan.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from products.models import Product
+from .models import InventoryLot
+
+LOT_REFERENCE = 'inventory_lot'
+
+
+def fefo_key(lot):
+    """Thứ tự lấy hàng: lô hết hạn sớm trước, lô không có hạn sau cùng, cùng hạn thì lô nhập trước"""
+    return (lot.expiry_date is None, lot.expiry_date, lot.id is None, lot.id or 0)
+
+
+def open_lots(warehouse_id, product_ids):
+    """Các lô còn hàng theo thứ tự FEFO, gom theo product_id"""
+    lots = defaultdict(list)
+    for lot in InventoryLot.objects.filter(warehouse_id=warehouse_id, product_id__in=product_ids, quantity__gt=0):
+        lots[lot.product_id].append(lot)
+    for product_lots in lots.values():
+        product_lots.sort(key=fefo_key)
+    return lots
+
+
+def _consume(lots, quantity, lot_id=None):
+    """Trừ quantity khỏi các lô (lô lot_id trước nếu có, rồi FEFO). Trả về hạn sớm nhất của phần đã lấy"""
+    ordered = sorted(lots, key=lambda lot: lot.id != lot_id) if lot_id else lots
+    earliest = None
+    for lot in ordered:
+        if quantity <= 0:
+            break
+        take = min(lot.quantity, quantity)
+        if take <= 0:
+            continue
+        lot.quantity -= take
+        quantity -= take
+        if lot.expiry_date and (earliest is None or lot.expiry_date < earliest):
+            earliest = lot.expiry_date
+    return earliest
+
+
+def update_lots(warehouse_id, entries, changes):
+    """
+    Cập nhật lô hàng cho các phiếu [(movement, delta)] của một kho.
+    `changes` là kết quả của ledger.apply_deltas cho cùng các sản phẩm.
+    """
+    by_product = defaultdict(list)
+    for movement, delta in entries:
+        if delta and movement.product_id in changes:
+            by_product[movement.product_id].append((movement, delta))
+    if not by_product:
+        return
+
+    today = timezone.localdate()
+    lots = open_lots(warehouse_id, list(by_product))
+    loaded = {lot.pk: lot.quantity for product_lots in lots.values() for lot in product_lots}
+    receiving = [pid for pid, items in by_product.items() if any(delta > 0 for _, delta in items)]
+    shelf_life = dict(Product.objects.filter(id__in=receiving).values_list('id', 'shelf_life_days')) if receiving else {}
+
+    for pid, items in by_product.items():
+        product_lots = lots[pid]
+        on_hand = changes[pid]['old']
+        for movement, delta in items:
+            if delta > 0:
+                days = shelf_life.get(pid)
+                expiry_date = getattr(movement, 'lot_expiry_date', None)
+                if expiry_date is None and days:
+                    expiry_date = today + timedelta(days=days)
+                product_lots.append(InventoryLot(
+                    warehouse_id=warehouse_id,
+                    product_id=pid,
+                    received_date=today,
+                    expiry_date=expiry_date,
+                    initial_quantity=delta,
+                    quantity=delta,
+                ))
+                product_lots.sort(key=fefo_key)
+                on_hand += delta
+            else:
+                issue = min(-delta, on_hand)
+                lot_id = movement.reference_id if movement.reference_type == LOT_REFERENCE else None
+                movement.consumed_expiry = _consume(product_lots, issue, lot_id)
+                on_hand -= issue
+        # Sổ cái kẹp tồn về 0 theo tổng delta: các lô không được giữ nhiều hơn tồn thực
+        excess = sum(lot.quantity for lot in product_lots) - changes[pid]['new']
+        if excess > 0:
+            _consume(product_lots, excess)
+
+    to_create, to_update, to_delete = [], [], []
+    for product_lots in lots.values():
+        for lot in product_lots:
+            if lot.pk is None:
+                if lot.quantity > 0:
+                    to_create.append(lot)
+            elif lot.quantity <= 0:
+                to_delete.append(lot.pk)
+            elif lot.quantity != loaded[lot.pk]:
+                to_update.append(lot)
+    if to_create:
+        InventoryLot.objects.bulk_create(to_create)
+    if to_update:
+        InventoryLot.objects.bulk_update(to_update, ['quantity'])
+    if to_delete:
+        InventoryLot.objects.filter(pk__in=to_delete).delete()
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from inventory.archive import archive_movements
+
+
+class Command(BaseCommand):
+    help = 'Chuyển biến động tồn kho cũ sang file lưu trữ theo tháng (chạy định kỳ bằng cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Lưu trữ các tháng cũ hơn số ngày này, mặc định STOCK_MOVEMENT_ARCHIVE_DAYS')
+
+    def handle(self, *args, **options):
+        results = archive_movements(options['days'])
+        for month, count in results:
+            self.stdout.write(f'{month:%Y-%m}: đã lưu trữ {count} biến động')
+        total = sum(count for _, count in results)
+        self.stdout.write(self.style.SUCCESS(f'Đã lưu trữ {total} biến động'))
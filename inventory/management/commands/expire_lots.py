@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from inventory.expiry import expire_lots
+
+
+class Command(BaseCommand):
+    help = 'Chuyển các lô hàng quá hạn thành phiếu hàng hết hạn (chạy hằng ngày bằng cron)'
+
+    def handle(self, *args, **options):
+        results = expire_lots()
+        for warehouse_id, count in results.items():
+            self.stdout.write(f'Kho {warehouse_id}: {count} lô hết hạn')
+        self.stdout.write(self.style.SUCCESS(f'Đã ghi {sum(results.values())} phiếu hàng hết hạn'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from inventory.aggregates import rebuild_warehouse_summary
+from inventory.models import Warehouse
+
+
+class Command(BaseCommand):
+    help = 'Tính lại bảng tổng hợp tồn kho theo kho từ InventoryStock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warehouse', type=int, action='append', dest='warehouses',
+                            help='ID kho cần tính lại (có thể lặp lại), mặc định tất cả kho')
+
+    def handle(self, *args, **options):
+        warehouses = Warehouse.objects.all()
+        if options['warehouses']:
+            warehouses = warehouses.filter(id__in=options['warehouses'])
+        count = 0
+        for warehouse_id in warehouses.values_list('id', flat=True):
+            rebuild_warehouse_summary(warehouse_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Đã tính lại tổng hợp cho {count} kho'))
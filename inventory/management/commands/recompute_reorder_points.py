@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from inventory.forecasting import recompute_stock_levels
+
+
+class Command(BaseCommand):
+    help = 'Tính lại mức tồn tối thiểu/tối đa từ nhu cầu xuất kho (chạy hằng đêm bằng cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warehouse', type=int, action='append', dest='warehouses',
+                            help='ID kho cần tính (có thể lặp lại), mặc định tất cả kho')
+        parser.add_argument('--window-days', type=int, default=None,
+                            help='Số ngày lịch sử xuất kho, mặc định REORDER_WINDOW_DAYS')
+        parser.add_argument('--lead-time-days', type=float, default=None,
+                            help='Thời gian chờ hàng (ngày), mặc định REORDER_LEAD_TIME_DAYS')
+        parser.add_argument('--service-level-z', type=float, default=None,
+                            help='Hệ số z của mức phục vụ, mặc định REORDER_SERVICE_LEVEL_Z')
+        parser.add_argument('--review-days', type=float, default=None,
+                            help='Chu kỳ đặt hàng (ngày), mặc định REORDER_REVIEW_DAYS')
+
+    def handle(self, *args, **options):
+        count = recompute_stock_levels(
+            warehouse_ids=options['warehouses'],
+            window_days=options['window_days'],
+            lead_time_days=options['lead_time_days'],
+            service_level_z=options['service_level_z'],
+            review_days=options['review_days'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Đã cập nhật mức tồn cho {count} dòng tồn kho'))
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory.models import InventorySnapshot
+from inventory.snapshots import take_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Chụp tồn kho hiện tại để tra cứu tồn kho theo thời điểm (chạy định kỳ bằng cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warehouse', type=int, action='append', dest='warehouses',
+                            help='ID kho cần chụp (có thể lặp lại), mặc định tất cả kho')
+        parser.add_argument('--keep-days', type=int, default=None,
+                            help='Xóa các ảnh chụp cũ hơn số ngày này')
+
+    def handle(self, *args, **options):
+        count = take_snapshot(options['warehouses'])
+        self.stdout.write(self.style.SUCCESS(f'Đã chụp {count} dòng tồn kho'))
+
+        if options['keep_days'] is not None:
+            cutoff = timezone.now() - timedelta(days=options['keep_days'])
+            deleted, _ = InventorySnapshot.objects.filter(as_of__lt=cutoff).delete()
+            self.stdout.write(f'Đã xóa {deleted} dòng ảnh chụp trước {cutoff:%Y-%m-%d}')
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_auto_20250823_1606'),
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField(verbose_name='Thời điểm chụp')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Số lượng tồn')),
+                ('reserved_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Số lượng đặt trước')),
+            ],
+            options={
+                'verbose_name': 'Ảnh chụp tồn kho',
+                'verbose_name_plural': 'Ảnh chụp tồn kho',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['warehouse', 'created_at'], name='inventory_s_warehou_f752ce_idx'),
+        ),
+        migrations.AddField(
+            model_name='inventorysnapshot',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product', verbose_name='Sản phẩm'),
+        ),
+        migrations.AddField(
+            model_name='inventorysnapshot',
+            name='warehouse',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='inventory.warehouse', verbose_name='Kho'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorysnapshot',
+            index=models.Index(fields=['warehouse', 'as_of'], name='inventory_i_warehou_73fbf3_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='inventorysnapshot',
+            unique_together={('warehouse', 'product', 'as_of')},
+        ),
+    ]
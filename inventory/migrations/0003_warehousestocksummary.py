@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_summaries(apps, schema_editor):
+    Warehouse = apps.get_model('inventory', 'Warehouse')
+    InventoryStock = apps.get_model('inventory', 'InventoryStock')
+    WarehouseStockSummary = apps.get_model('inventory', 'WarehouseStockSummary')
+    rows = InventoryStock.objects.values('warehouse_id').annotate(
+        sku_count=models.Count('id', filter=models.Q(quantity__gt=0)),
+        total_quantity=models.Sum('quantity'),
+        low_stock_count=models.Count('id', filter=models.Q(quantity__lte=models.F('min_stock_level'))),
+    ).order_by()
+    totals = {row.pop('warehouse_id'): row for row in rows}
+    WarehouseStockSummary.objects.bulk_create([
+        WarehouseStockSummary(warehouse_id=warehouse_id, **totals.get(warehouse_id, {}))
+        for warehouse_id in Warehouse.objects.values_list('id', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_inventorysnapshot_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WarehouseStockSummary',
+            fields=[
+                ('warehouse', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_summary', serialize=False, to='inventory.warehouse', verbose_name='Kho')),
+                ('sku_count', models.PositiveIntegerField(default=0, verbose_name='Số mặt hàng còn tồn')),
+                ('total_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Tổng số lượng tồn')),
+                ('low_stock_count', models.PositiveIntegerField(default=0, verbose_name='Số mặt hàng tồn thấp')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Cập nhật cuối')),
+            ],
+            options={
+                'verbose_name': 'Tổng hợp tồn kho theo kho',
+                'verbose_name_plural': 'Tổng hợp tồn kho theo kho',
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
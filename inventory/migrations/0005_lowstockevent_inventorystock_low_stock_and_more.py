@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def set_low_stock_flags(apps, schema_editor):
+    InventoryStock = apps.get_model('inventory', 'InventoryStock')
+    low = models.Q(quantity__lte=models.F('min_stock_level'))
+    InventoryStock.objects.filter(low).update(low_stock=True)
+    InventoryStock.objects.exclude(low).update(low_stock=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_auto_20250823_1606'),
+        ('inventory', '0004_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LowStockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_low', models.BooleanField(verbose_name='Tồn thấp')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Số lượng tồn')),
+                ('min_stock_level', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Mức tồn kho tối thiểu')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Thời gian')),
+            ],
+            options={
+                'verbose_name': 'Sự kiện tồn kho thấp',
+                'verbose_name_plural': 'Sự kiện tồn kho thấp',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='inventorystock',
+            name='low_stock',
+            field=models.BooleanField(default=True, verbose_name='Tồn kho thấp'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorystock',
+            index=models.Index(fields=['low_stock', 'warehouse'], name='inventory_i_low_sto_d7e9bc_idx'),
+        ),
+        migrations.AddField(
+            model_name='lowstockevent',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product', verbose_name='Sản phẩm'),
+        ),
+        migrations.AddField(
+            model_name='lowstockevent',
+            name='stock',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='low_stock_events', to='inventory.inventorystock', verbose_name='Tồn kho'),
+        ),
+        migrations.AddField(
+            model_name='lowstockevent',
+            name='warehouse',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.warehouse', verbose_name='Kho'),
+        ),
+        migrations.AddIndex(
+            model_name='lowstockevent',
+            index=models.Index(fields=['warehouse', 'id'], name='inventory_l_warehou_2a72ad_idx'),
+        ),
+        migrations.RunPython(set_low_stock_flags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_auto_20250823_1606'),
+        ('inventory', '0006_remove_stockmovement_inventory_s_warehou_f752ce_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovementArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True, verbose_name='Tháng')),
+                ('file_path', models.CharField(max_length=255, verbose_name='Đường dẫn file')),
+                ('row_count', models.PositiveIntegerField(default=0, verbose_name='Số dòng')),
+                ('min_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID nhỏ nhất')),
+                ('max_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID lớn nhất')),
+                ('archived_at', models.DateTimeField(auto_now=True, verbose_name='Ngày lưu trữ')),
+            ],
+            options={
+                'verbose_name': 'Lưu trữ biến động',
+                'verbose_name_plural': 'Lưu trữ biến động',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Tháng')),
+                ('movement_type', models.CharField(choices=[('inbound', 'Nhập kho'), ('outbound', 'Xuất kho'), ('transfer', 'Chuyển kho'), ('adjustment', 'Điều chỉnh'), ('damaged', 'Hàng hỏng'), ('expired', 'Hàng hết hạn')], max_length=20, verbose_name='Loại biến động')),
+                ('total_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Tổng số lượng')),
+                ('movement_count', models.PositiveIntegerField(default=0, verbose_name='Số phiếu')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product', verbose_name='Sản phẩm')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movement_rollups', to='inventory.warehouse', verbose_name='Kho')),
+            ],
+            options={
+                'verbose_name': 'Tổng hợp biến động theo tháng',
+                'verbose_name_plural': 'Tổng hợp biến động theo tháng',
+                'indexes': [models.Index(fields=['warehouse', 'month'], name='inventory_s_warehou_810c98_idx')],
+                'unique_together': {('month', 'warehouse', 'product', 'movement_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def value_existing_stock(apps, schema_editor):
+    # Tồn kho hiện có được định giá theo giá vốn của sản phẩm như cách tính cũ
+    InventoryStock = apps.get_model('inventory', 'InventoryStock')
+    Product = apps.get_model('products', 'Product')
+    WarehouseStockSummary = apps.get_model('inventory', 'WarehouseStockSummary')
+    cost_price = Product.objects.filter(pk=models.OuterRef('product_id')).values('cost_price')[:1]
+    InventoryStock.objects.update(average_cost=models.Subquery(cost_price))
+    InventoryStock.objects.update(stock_value=models.F('quantity') * models.F('average_cost'))
+    totals = InventoryStock.objects.values('warehouse_id').annotate(total=models.Sum('stock_value'))
+    for row in totals:
+        WarehouseStockSummary.objects.filter(warehouse_id=row['warehouse_id']).update(total_value=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_auto_20250823_1606'),
+        ('inventory', '0007_stockmovementarchive_stockmovementrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorystock',
+            name='average_cost',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=14, verbose_name='Giá vốn bình quân'),
+        ),
+        migrations.AddField(
+            model_name='inventorystock',
+            name='stock_value',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Giá trị tồn'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='cost_of_goods',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=16, null=True, verbose_name='Giá vốn xuất'),
+        ),
+        migrations.AddField(
+            model_name='warehousestocksummary',
+            name='total_value',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Tổng giá trị tồn'),
+        ),
+        migrations.CreateModel(
+            name='StockCostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit_cost', models.DecimalField(decimal_places=4, max_digits=14, verbose_name='Đơn giá')),
+                ('original_quantity', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Số lượng nhập')),
+                ('remaining_quantity', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Số lượng còn lại')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.inventorystock', verbose_name='Tồn kho')),
+            ],
+            options={
+                'verbose_name': 'Lớp giá vốn',
+                'verbose_name_plural': 'Lớp giá vốn',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['stock', 'remaining_quantity'], name='inventory_s_stock_i_ac4f9b_idx')],
+            },
+        ),
+        migrations.RunPython(value_existing_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+from datetime import timedelta
+from django.utils import timezone
+
+
+def create_opening_lots(apps, schema_editor):
+    # Tồn kho hiện có thành một lô, tính như nhập vào lần cập nhật cuối
+    InventoryStock = apps.get_model('inventory', 'InventoryStock')
+    InventoryLot = apps.get_model('inventory', 'InventoryLot')
+    lots = []
+    stocks = InventoryStock.objects.filter(quantity__gt=0).values_list(
+        'warehouse_id', 'product_id', 'quantity', 'last_updated', 'product__shelf_life_days'
+    )
+    for warehouse_id, product_id, quantity, last_updated, shelf_life_days in stocks.iterator(chunk_size=2000):
+        received = timezone.localtime(last_updated).date()
+        lots.append(InventoryLot(
+            warehouse_id=warehouse_id,
+            product_id=product_id,
+            received_date=received,
+            expiry_date=received + timedelta(days=shelf_life_days) if shelf_life_days else None,
+            initial_quantity=quantity,
+            quantity=quantity,
+        ))
+    InventoryLot.objects.bulk_create(lots, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_auto_20250823_1606'),
+        ('inventory', '0008_inventorystock_average_cost_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('received_date', models.DateField(verbose_name='Ngày nhập')),
+                ('expiry_date', models.DateField(blank=True, null=True, verbose_name='Hạn sử dụng')),
+                ('initial_quantity', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Số lượng nhập')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Số lượng còn lại')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product', verbose_name='Sản phẩm')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='inventory.warehouse', verbose_name='Kho')),
+            ],
+            options={
+                'verbose_name': 'Lô hàng',
+                'verbose_name_plural': 'Lô hàng',
+                'ordering': ['expiry_date', 'id'],
+                'indexes': [models.Index(fields=['warehouse', 'product', 'expiry_date'], name='inventory_i_warehou_8fb8e0_idx'), models.Index(fields=['expiry_date'], name='inventory_i_expiry__c7c157_idx')],
+            },
+        ),
+        migrations.RunPython(create_opening_lots, migrations.RunPython.noop),
+    ]
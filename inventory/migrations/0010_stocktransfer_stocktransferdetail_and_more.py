@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:11
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_auto_20250823_1606'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('inventory', '0009_inventorylot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20, unique=True, verbose_name='Mã phiếu chuyển')),
+                ('status', models.CharField(choices=[('draft', 'Nháp'), ('in_transit', 'Đang vận chuyển'), ('received', 'Đã nhận'), ('cancelled', 'Hủy')], default='draft', max_length=20, verbose_name='Trạng thái')),
+                ('notes', models.TextField(blank=True, verbose_name='Ghi chú')),
+                ('dispatched_at', models.DateTimeField(blank=True, null=True, verbose_name='Ngày xuất')),
+                ('received_at', models.DateTimeField(blank=True, null=True, verbose_name='Ngày nhận')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Người tạo')),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incoming_transfers', to='inventory.warehouse', verbose_name='Kho đích')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outgoing_transfers', to='inventory.warehouse', verbose_name='Kho nguồn')),
+            ],
+            options={
+                'verbose_name': 'Chuyển kho',
+                'verbose_name_plural': 'Chuyển kho',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockTransferDetail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Số lượng chuyển')),
+                ('received_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Số lượng nhận')),
+                ('unit_cost', models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True, verbose_name='Giá vốn khi xuất')),
+                ('expiry_date', models.DateField(blank=True, null=True, verbose_name='Hạn sử dụng sớm nhất khi xuất')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product', verbose_name='Sản phẩm')),
+                ('transfer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='details', to='inventory.stocktransfer', verbose_name='Phiếu chuyển')),
+            ],
+            options={
+                'verbose_name': 'Chi tiết chuyển kho',
+                'verbose_name_plural': 'Chi tiết chuyển kho',
+                'unique_together': {('transfer', 'product')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stocktransfer',
+            index=models.Index(fields=['status', 'source', 'destination'], name='inventory_s_status_25f603_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:22
+
+from django.db import migrations, models
+
+
+def sum_used_tonnage(apps, schema_editor):
+    InventoryStock = apps.get_model('inventory', 'InventoryStock')
+    WarehouseStockSummary = apps.get_model('inventory', 'WarehouseStockSummary')
+    totals = InventoryStock.objects.values('warehouse_id').annotate(
+        total=models.Sum(models.F('quantity') * models.F('product__weight_per_unit'), output_field=models.DecimalField())
+    )
+    for row in totals:
+        WarehouseStockSummary.objects.filter(warehouse_id=row['warehouse_id']).update(used_tonnage=row['total'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_weight_per_unit'),
+        ('inventory', '0010_stocktransfer_stocktransferdetail_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warehousestocksummary',
+            name='used_tonnage',
+            field=models.DecimalField(decimal_places=8, default=0, max_digits=20, verbose_name='Khối lượng đang chứa (tấn)'),
+        ),
+        migrations.RunPython(sum_used_tonnage, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,12 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from products.models import Product
 from farmers.models import Farmer
 from customers.models import Customer
 from accounts.models import User
+from orders.models import Order, OrderDetail
+from utils.sequences import allocate_number
 
 class Warehouse(models.Model):
     """Kho hàng"""
@@ -23,6 +26,37 @@ class Warehouse(models.Model):
     def __str__(self):
         return f"{self.name} ({self.code})"
 
+class WarehouseStockSummary(models.Model):
+    """Tổng hợp tồn kho theo kho, được sổ cái cập nhật cùng transaction với mỗi biến động"""
+    warehouse = models.OneToOneField(Warehouse, on_delete=models.CASCADE, primary_key=True,
+                                     related_name='stock_summary', verbose_name="Kho")
+    sku_count = models.PositiveIntegerField(default=0, verbose_name="Số mặt hàng còn tồn")
+    total_quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Tổng số lượng tồn")
+    low_stock_count = models.PositiveIntegerField(default=0, verbose_name="Số mặt hàng tồn thấp")
+    total_value = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Tổng giá trị tồn")
+    # Tổng quantity * product.weight_per_unit, cùng đơn vị với Warehouse.capacity
+    used_tonnage = models.DecimalField(max_digits=20, decimal_places=8, default=0, verbose_name="Khối lượng đang chứa (tấn)")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Cập nhật cuối")
+    
+    class Meta:
+        verbose_name = "Tổng hợp tồn kho theo kho"
+        verbose_name_plural = "Tổng hợp tồn kho theo kho"
+        
+    def __str__(self):
+        return f"{self.warehouse_id}: {self.sku_count} mặt hàng, {self.total_quantity}"
+        
+    @property
+    def used_capacity(self):
+        """Sức chứa đã dùng (tấn)"""
+        return self.used_tonnage
+        
+    @property
+    def utilization(self):
+        """Tỷ lệ sử dụng sức chứa (%)"""
+        if self.warehouse.capacity > 0:
+            return self.used_capacity / self.warehouse.capacity * 100
+        return 0
+
 class InventoryStock(models.Model):
     """Tồn kho"""
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, verbose_name="Kho")
@@ -31,16 +65,44 @@ class InventoryStock(models.Model):
     reserved_quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Số lượng đặt trước")
     min_stock_level = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Mức tồn kho tối thiểu")
     max_stock_level = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Mức tồn kho tối đa")
+    # Lưu sẵn quantity <= min_stock_level, chỉ đổi khi vượt ngưỡng (xem LowStockEvent)
+    low_stock = models.BooleanField(default=True, verbose_name="Tồn kho thấp")
+    # Giá vốn do sổ cái duy trì theo từng biến động (xem inventory/valuation.py)
+    average_cost = models.DecimalField(max_digits=14, decimal_places=4, default=0, verbose_name="Giá vốn bình quân")
+    stock_value = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="Giá trị tồn")
     last_updated = models.DateTimeField(auto_now=True, verbose_name="Cập nhật cuối")
     
     class Meta:
         verbose_name = "Tồn kho"
         verbose_name_plural = "Tồn kho"
         unique_together = ['warehouse', 'product']
+        indexes = [
+            models.Index(fields=['low_stock', 'warehouse']),
+        ]
         
     def __str__(self):
         return f"{self.warehouse.name} - {self.product.name}: {self.quantity}"
         
+    def save(self, *args, **kwargs):
+        # Sửa tay (form/admin): định giá lại theo giá vốn bình quân, cập nhật cờ tồn thấp
+        # và ghi sự kiện nếu vượt ngưỡng
+        if not self.average_cost:
+            self.average_cost = self.product.cost_price
+        self.stock_value = self.quantity * self.average_cost
+        is_low = self.quantity <= self.min_stock_level
+        changed = is_low != self.low_stock if self.pk else is_low
+        self.low_stock = is_low
+        super().save(*args, **kwargs)
+        if changed:
+            LowStockEvent.objects.create(
+                stock=self,
+                warehouse_id=self.warehouse_id,
+                product_id=self.product_id,
+                is_low=is_low,
+                quantity=self.quantity,
+                min_stock_level=self.min_stock_level,
+            )
+        
     @property
     def available_quantity(self):
         """Số lượng có thể bán"""
@@ -51,6 +113,43 @@ class InventoryStock(models.Model):
         """Kiểm tra tồn kho thấp"""
         return self.quantity <= self.min_stock_level
 
+class StockReservation(models.Model):
+    """Phần tồn kho đang giữ cho một dòng đơn bán đã xác nhận"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_reservations', verbose_name="Đơn hàng")
+    order_detail = models.ForeignKey(OrderDetail, on_delete=models.CASCADE, related_name='reservations', verbose_name="Chi tiết đơn hàng")
+    stock = models.ForeignKey(InventoryStock, on_delete=models.CASCADE, related_name='reservations', verbose_name="Tồn kho")
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Số lượng giữ")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Ngày tạo")
+    
+    class Meta:
+        verbose_name = "Giữ hàng"
+        verbose_name_plural = "Giữ hàng"
+        
+    def __str__(self):
+        return f"{self.order.order_number} - {self.stock}: {self.quantity}"
+
+class LowStockEvent(models.Model):
+    """Sự kiện một dòng tồn kho vượt ngưỡng tồn thấp (vào hoặc ra), đọc theo con trỏ id"""
+    stock = models.ForeignKey(InventoryStock, on_delete=models.CASCADE, related_name='low_stock_events', verbose_name="Tồn kho")
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, verbose_name="Kho")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="Sản phẩm")
+    is_low = models.BooleanField(verbose_name="Tồn thấp")
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Số lượng tồn")
+    min_stock_level = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Mức tồn kho tối thiểu")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Thời gian")
+    
+    class Meta:
+        verbose_name = "Sự kiện tồn kho thấp"
+        verbose_name_plural = "Sự kiện tồn kho thấp"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['warehouse', 'id']),
+        ]
+        
+    def __str__(self):
+        state = "tồn thấp" if self.is_low else "đủ hàng"
+        return f"{self.warehouse_id}/{self.product_id}: {state} ({self.quantity})"
+
 class StockMovement(models.Model):
     """Biến động tồn kho"""
     MOVEMENT_TYPE_CHOICES = [
@@ -67,6 +166,7 @@ class StockMovement(models.Model):
     movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPE_CHOICES, verbose_name="Loại biến động")
     quantity = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Số lượng")
     unit_cost = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name="Đơn giá")
+    cost_of_goods = models.DecimalField(max_digits=16, decimal_places=2, null=True, blank=True, verbose_name="Giá vốn xuất")
     reference_type = models.CharField(max_length=50, blank=True, verbose_name="Loại tham chiếu")
     reference_id = models.PositiveIntegerField(blank=True, null=True, verbose_name="ID tham chiếu")
     notes = models.TextField(blank=True, verbose_name="Ghi chú")
@@ -77,10 +177,192 @@ class StockMovement(models.Model):
         verbose_name = "Biến động tồn kho"
         verbose_name_plural = "Biến động tồn kho"
         ordering = ['-created_at']
+        # Khớp các bộ lọc của API danh sách, kết thúc bằng (created_at, id) để đọc theo con trỏ
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['warehouse', 'created_at', 'id']),
+            models.Index(fields=['warehouse', 'product', 'created_at', 'id']),
+            models.Index(fields=['warehouse', 'movement_type', 'created_at', 'id']),
+            models.Index(fields=['product', 'created_at', 'id']),
+            models.Index(fields=['movement_type', 'created_at', 'id']),
+        ]
         
     def __str__(self):
         return f"{self.warehouse.name} - {self.product.name}: {self.get_movement_type_display()} {self.quantity}"
 
+    def _precheck_capacity(self):
+        from .capacity import CAPACITY_CHECKED_TYPES, precheck_capacity
+        if self.movement_type in CAPACITY_CHECKED_TYPES and self.warehouse_id and self.product_id:
+            precheck_capacity(self.warehouse_id, {self.product_id: self.quantity})
+
+    def clean(self):
+        from .capacity import CapacityExceededError
+        super().clean()
+        if self._state.adding and self.quantity is not None:
+            try:
+                self._precheck_capacity()
+            except CapacityExceededError as e:
+                raise ValidationError(str(e))
+
+    def save(self, *args, **kwargs):
+        # Phiếu mới: kiểm tra sức chứa trước khi ghi, ghi phiếu và cộng sổ cái (post_save)
+        # trong cùng một transaction để phiếu bị từ chối không còn lại trong lịch sử
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            self._precheck_capacity()
+            super().save(*args, **kwargs)
+
+class InventoryLot(models.Model):
+    """Lô hàng đang còn trong kho: mỗi lần nhập là một lô với hạn sử dụng riêng (lô đã hết được xóa)"""
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='lots', verbose_name="Kho")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="Sản phẩm")
+    received_date = models.DateField(verbose_name="Ngày nhập")
+    expiry_date = models.DateField(null=True, blank=True, verbose_name="Hạn sử dụng")
+    initial_quantity = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Số lượng nhập")
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Số lượng còn lại")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Ngày tạo")
+    
+    class Meta:
+        verbose_name = "Lô hàng"
+        verbose_name_plural = "Lô hàng"
+        ordering = ['expiry_date', 'id']
+        indexes = [
+            models.Index(fields=['warehouse', 'product', 'expiry_date']),
+            models.Index(fields=['expiry_date']),
+        ]
+        
+    def __str__(self):
+        return f"{self.warehouse.name} - {self.product.name} (HSD {self.expiry_date or '-'}): {self.quantity}"
+
+class StockCostLayer(models.Model):
+    """Lớp giá vốn FIFO: phần còn lại của một lần nhập theo đơn giá nhập"""
+    stock = models.ForeignKey(InventoryStock, on_delete=models.CASCADE, related_name='cost_layers', verbose_name="Tồn kho")
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4, verbose_name="Đơn giá")
+    original_quantity = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Số lượng nhập")
+    remaining_quantity = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Số lượng còn lại")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Ngày tạo")
+    
+    class Meta:
+        verbose_name = "Lớp giá vốn"
+        verbose_name_plural = "Lớp giá vốn"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['stock', 'remaining_quantity']),
+        ]
+        
+    def __str__(self):
+        return f"{self.stock} @ {self.unit_cost}: {self.remaining_quantity}/{self.original_quantity}"
+
+class InventorySnapshot(models.Model):
+    """Ảnh chụp tồn kho định kỳ, dùng làm điểm bắt đầu khi tra cứu tồn kho quá khứ"""
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='snapshots', verbose_name="Kho")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="Sản phẩm")
+    as_of = models.DateTimeField(verbose_name="Thời điểm chụp")
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Số lượng tồn")
+    reserved_quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Số lượng đặt trước")
+    
+    class Meta:
+        verbose_name = "Ảnh chụp tồn kho"
+        verbose_name_plural = "Ảnh chụp tồn kho"
+        unique_together = ['warehouse', 'product', 'as_of']
+        indexes = [
+            models.Index(fields=['warehouse', 'as_of']),
+        ]
+        
+    def __str__(self):
+        return f"{self.warehouse.name} - {self.product.name} @ {self.as_of:%Y-%m-%d %H:%M}: {self.quantity}"
+
+class StockMovementArchive(models.Model):
+    """Một tháng biến động đã chuyển khỏi bảng chính sang file JSONL nén dưới MEDIA_ROOT"""
+    month = models.DateField(unique=True, verbose_name="Tháng")
+    file_path = models.CharField(max_length=255, verbose_name="Đường dẫn file")
+    row_count = models.PositiveIntegerField(default=0, verbose_name="Số dòng")
+    min_id = models.BigIntegerField(null=True, blank=True, verbose_name="ID nhỏ nhất")
+    max_id = models.BigIntegerField(null=True, blank=True, verbose_name="ID lớn nhất")
+    archived_at = models.DateTimeField(auto_now=True, verbose_name="Ngày lưu trữ")
+    
+    class Meta:
+        verbose_name = "Lưu trữ biến động"
+        verbose_name_plural = "Lưu trữ biến động"
+        ordering = ['-month']
+        
+    def __str__(self):
+        return f"{self.month:%Y-%m}: {self.row_count} dòng"
+
+class StockMovementRollup(models.Model):
+    """Tổng biến động theo tháng của (kho, sản phẩm, loại) cho các tháng đã lưu trữ"""
+    month = models.DateField(verbose_name="Tháng")
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='movement_rollups', verbose_name="Kho")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="Sản phẩm")
+    movement_type = models.CharField(max_length=20, choices=StockMovement.MOVEMENT_TYPE_CHOICES, verbose_name="Loại biến động")
+    total_quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Tổng số lượng")
+    movement_count = models.PositiveIntegerField(default=0, verbose_name="Số phiếu")
+    
+    class Meta:
+        verbose_name = "Tổng hợp biến động theo tháng"
+        verbose_name_plural = "Tổng hợp biến động theo tháng"
+        unique_together = ['month', 'warehouse', 'product', 'movement_type']
+        indexes = [
+            models.Index(fields=['warehouse', 'month']),
+        ]
+        
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.warehouse.name} - {self.product.name}: {self.get_movement_type_display()} {self.total_quantity}"
+
+class StockTransfer(models.Model):
+    """Phiếu chuyển kho hai giai đoạn: xuất khỏi kho nguồn rồi nhận vào kho đích"""
+    STATUS_CHOICES = [
+        ('draft', 'Nháp'),
+        ('in_transit', 'Đang vận chuyển'),
+        ('received', 'Đã nhận'),
+        ('cancelled', 'Hủy'),
+    ]
+    
+    code = models.CharField(max_length=20, unique=True, verbose_name="Mã phiếu chuyển")
+    source = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='outgoing_transfers', verbose_name="Kho nguồn")
+    destination = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='incoming_transfers', verbose_name="Kho đích")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft', verbose_name="Trạng thái")
+    notes = models.TextField(blank=True, verbose_name="Ghi chú")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="Người tạo")
+    dispatched_at = models.DateTimeField(null=True, blank=True, verbose_name="Ngày xuất")
+    received_at = models.DateTimeField(null=True, blank=True, verbose_name="Ngày nhận")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Ngày tạo")
+    
+    class Meta:
+        verbose_name = "Chuyển kho"
+        verbose_name_plural = "Chuyển kho"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'source', 'destination']),
+        ]
+        
+    def __str__(self):
+        return f"{self.code}: {self.source.name} → {self.destination.name}"
+        
+    def save(self, *args, **kwargs):
+        if not self.code:
+            # Tự động tạo mã phiếu chuyển từ bộ đếm theo ngày, an toàn khi tạo đồng thời
+            self.code = allocate_number('CK')
+        super().save(*args, **kwargs)
+
+class StockTransferDetail(models.Model):
+    """Chi tiết phiếu chuyển kho"""
+    transfer = models.ForeignKey(StockTransfer, on_delete=models.CASCADE, related_name='details', verbose_name="Phiếu chuyển")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="Sản phẩm")
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)], verbose_name="Số lượng chuyển")
+    received_quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Số lượng nhận")
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True, verbose_name="Giá vốn khi xuất")
+    expiry_date = models.DateField(null=True, blank=True, verbose_name="Hạn sử dụng sớm nhất khi xuất")
+    
+    class Meta:
+        verbose_name = "Chi tiết chuyển kho"
+        verbose_name_plural = "Chi tiết chuyển kho"
+        unique_together = ['transfer', 'product']
+        
+    def __str__(self):
+        return f"{self.transfer.code} - {self.product.name}: {self.quantity}"
+
 class StockTaking(models.Model):
     """Kiểm kê tồn kho"""
     STATUS_CHOICES = [
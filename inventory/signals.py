@@ -1,7 +1,12 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 from django.db import transaction
-from .models import StockMovement, InventoryStock
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from orders.models import Order
+from products.models import Product, Unit
+from .models import StockMovement, InventoryStock, Warehouse, WarehouseStockSummary
+from .ledger import apply_movement
+from .aggregates import bump_product_catalog_version, bump_stock_summary_version, rebuild_warehouse_summary
+from .allocation import CONSUMING_STATUSES, RELEASING_STATUSES, consume_order, reserve_order, release_order
 
 @receiver(post_save, sender=StockMovement)
 def update_inventory_stock(sender, instance, created, **kwargs):
@@ -9,31 +14,94 @@ def update_inventory_stock(sender, instance, created, **kwargs):
     Tự động cập nhật tồn kho khi có movement
     """
     if created:
-        with transaction.atomic():
-            # Lấy hoặc tạo inventory stock
-            stock, stock_created = InventoryStock.objects.get_or_create(
-                warehouse=instance.warehouse,
-                product=instance.product,
-                defaults={'quantity': 0}
-            )
-            
-            # Cập nhật số lượng dựa trên loại movement
-            if instance.movement_type in ['inbound', 'in']:
-                stock.quantity += instance.quantity
-            elif instance.movement_type in ['outbound', 'out']:
-                stock.quantity -= instance.quantity
-            elif instance.movement_type == 'adjustment':
-                # Với adjustment, quantity có thể âm hoặc dương
-                stock.quantity += instance.quantity
-            elif instance.movement_type == 'transfer':
-                # Transfer out từ kho này
-                stock.quantity -= instance.quantity
-            elif instance.movement_type in ['damaged', 'expired']:
-                # Hàng hỏng/hết hạn - giảm tồn
-                stock.quantity -= instance.quantity
-            
-            # Đảm bảo quantity không âm
-            if stock.quantity < 0:
-                stock.quantity = 0
-                
-            stock.save()
+        # Cộng/trừ trực tiếp trên database, tránh đọc-sửa-ghi bị mất cập nhật
+        apply_movement(instance)
+
+@receiver(post_save, sender=InventoryStock)
+@receiver(post_delete, sender=InventoryStock)
+def refresh_warehouse_summary(sender, instance, **kwargs):
+    """
+    Sửa/xóa tồn kho bằng tay (không qua sổ cái) thì tính lại tổng hợp của kho
+    """
+    transaction.on_commit(bump_stock_summary_version)
+    origin = kwargs.get('origin')
+    if getattr(origin, 'model', type(origin)) is Warehouse:
+        # Đang xóa cả kho (instance hoặc queryset), tổng hợp sẽ bị xóa theo
+        return
+    rebuild_warehouse_summary(instance.warehouse_id)
+
+@receiver(post_save, sender=Warehouse)
+def create_warehouse_summary(sender, instance, created, **kwargs):
+    """
+    Kho mới có sẵn dòng tổng hợp (toàn số 0) để sổ cái chỉ cần cộng dồn
+    """
+    if created:
+        WarehouseStockSummary.objects.get_or_create(warehouse=instance)
+
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+def refresh_stock_list_summary(sender, **kwargs):
+    """
+    Thêm/xóa kho làm đổi số kho trong khối tổng hợp của danh sách tồn kho
+    """
+    transaction.on_commit(bump_stock_summary_version)
+
+@receiver(pre_save, sender=Product)
+def remember_product_weight(sender, instance, raw=False, **kwargs):
+    """
+    Ghi nhớ khối lượng đơn vị cũ để biết có cần tính lại khối lượng đang chứa của các kho
+    """
+    instance._previous_weight = (
+        Product.objects.filter(pk=instance.pk).values_list('weight_per_unit', flat=True).first()
+        if instance.pk and not raw else None
+    )
+
+@receiver(post_save, sender=Product)
+def rebase_warehouse_tonnage(sender, instance, created, **kwargs):
+    """
+    Đổi weight_per_unit thì used_tonnage cộng dồn theo khối lượng cũ không còn đúng:
+    tính lại tổng hợp của các kho đang giữ sản phẩm
+    """
+    previous = getattr(instance, '_previous_weight', None)
+    if created or previous is None or previous == instance.weight_per_unit:
+        return
+    warehouse_ids = InventoryStock.objects.filter(product=instance).values_list('warehouse_id', flat=True)
+    for warehouse_id in sorted(set(warehouse_ids)):
+        rebuild_warehouse_summary(warehouse_id)
+    transaction.on_commit(bump_stock_summary_version)
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Unit)
+@receiver(post_delete, sender=Unit)
+def refresh_product_catalog(sender, **kwargs):
+    """
+    Sửa sản phẩm hoặc đơn vị tính làm đổi danh mục sản phẩm trên form tạo đơn hàng
+    """
+    transaction.on_commit(bump_product_catalog_version)
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    """
+    Ghi nhớ trạng thái cũ để biết đơn vừa chuyển trạng thái
+    """
+    instance._previous_status = (
+        Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+        if instance.pk else None
+    )
+
+@receiver(post_save, sender=Order)
+def reserve_stock_for_order(sender, instance, **kwargs):
+    """
+    Đơn bán chuyển sang 'confirmed' thì giữ hàng, 'shipped'/'completed' thì xuất kho phần
+    đang giữ, 'cancelled'/'returned' thì trả lại
+    """
+    previous = getattr(instance, '_previous_status', None)
+    if previous == instance.status:
+        return
+    if instance.status == 'confirmed':
+        reserve_order(instance)
+    elif instance.status in CONSUMING_STATUSES:
+        consume_order(instance, instance.updated_by)
+    elif instance.status in RELEASING_STATUSES:
+        release_order(instance)
@@ -0,0 +1,136 @@
+"""
+Nhập phiếu đếm kiểm kê (XLSX/CSV) và chốt kiểm kê.
+
+Phiếu đếm được đọc từng dòng (openpyxl read-only hoặc csv), số lượng hệ thống
+của cả kho được chụp bằng một truy vấn, chi tiết được ghi bằng bulk_create và
+chênh lệch tính bằng một câu UPDATE. Khi chốt, mọi phiếu điều chỉnh được tạo
+trong một lần bulk_create và cộng vào tồn kho qua sổ cái.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from products.models import Product
+from utils.spreadsheets import SpreadsheetError, column_map, is_blank, iter_rows
+from .ledger import apply_movements
+from .models import InventoryStock, StockMovement, StockTaking, StockTakingDetail
+
+HEADER_ALIASES = {
+    'product_code': 'product_code',
+    'code': 'product_code',
+    'mã sản phẩm': 'product_code',
+    'actual_quantity': 'actual_quantity',
+    'quantity': 'actual_quantity',
+    'số lượng thực tế': 'actual_quantity',
+    'notes': 'notes',
+    'ghi chú': 'notes',
+}
+
+MAX_REPORTED_ERRORS = 200
+
+
+class CountSheetError(SpreadsheetError):
+    """Phiếu đếm không đọc được hoặc đợt kiểm kê không còn nhận thay đổi"""
+
+
+def import_count_sheet(stock_taking, uploaded_file):
+    """
+    Nạp phiếu đếm vào StockTakingDetail của đợt kiểm kê.
+    Dòng đã có (cùng sản phẩm) được ghi đè. Trả về (số dòng đã nạp, danh sách lỗi theo dòng).
+    """
+    if stock_taking.status in ('completed', 'cancelled'):
+        raise CountSheetError(f'Đợt kiểm kê đã {stock_taking.get_status_display().lower()}')
+    rows = iter_rows(uploaded_file)
+    columns = column_map(next(rows, None), HEADER_ALIASES, ('product_code', 'actual_quantity'))
+
+    counted = {}
+    errors = []
+    for line_number, row in enumerate(rows, start=2):
+        if is_blank(row):
+            continue
+        try:
+            code = str(row[columns['product_code']]).strip()
+            actual = Decimal(str(row[columns['actual_quantity']]).strip())
+        except (IndexError, InvalidOperation):
+            errors.append({'row': line_number, 'error': 'Thiếu mã sản phẩm hoặc số lượng không hợp lệ'})
+            continue
+        if actual < 0:
+            errors.append({'row': line_number, 'error': 'Số lượng thực tế không được âm'})
+            continue
+        notes = ''
+        if 'notes' in columns and columns['notes'] < len(row) and row[columns['notes']] is not None:
+            notes = str(row[columns['notes']])
+        # Mã lặp lại trong phiếu: cộng dồn (đếm nhiều vị trí)
+        if code in counted:
+            counted[code]['actual'] += actual
+        else:
+            counted[code] = {'row': line_number, 'actual': actual, 'notes': notes}
+
+    # Một truy vấn cho sản phẩm, một truy vấn chụp số lượng hệ thống của cả kho
+    products = dict(Product.objects.filter(code__in=list(counted)).values_list('code', 'id'))
+    system = dict(
+        InventoryStock.objects.filter(warehouse_id=stock_taking.warehouse_id).values_list('product_id', 'quantity')
+    )
+
+    details = []
+    for code, item in counted.items():
+        product_id = products.get(code)
+        if product_id is None:
+            errors.append({'row': item['row'], 'error': f'Không tìm thấy sản phẩm mã {code}'})
+            continue
+        details.append(StockTakingDetail(
+            stock_taking=stock_taking,
+            product_id=product_id,
+            system_quantity=system.get(product_id, Decimal('0')),
+            actual_quantity=item['actual'],
+            notes=item['notes'],
+        ))
+
+    with transaction.atomic():
+        stock_taking.details.filter(product_id__in=[d.product_id for d in details]).delete()
+        StockTakingDetail.objects.bulk_create(details, batch_size=1000)
+        # bulk_create bỏ qua save(), tính chênh lệch cho cả đợt bằng một câu UPDATE
+        stock_taking.details.update(variance=F('actual_quantity') - F('system_quantity'))
+        if stock_taking.status == 'draft':
+            stock_taking.status = 'in_progress'
+            stock_taking.save(update_fields=['status'])
+
+    errors.sort(key=lambda e: e['row'])
+    return len(details), errors[:MAX_REPORTED_ERRORS]
+
+
+def complete_stock_taking(stock_taking, user=None):
+    """
+    Chốt kiểm kê: tạo một phiếu điều chỉnh cho mỗi dòng có chênh lệch trong một lần
+    bulk_create và cộng chênh lệch vào tồn kho. Trả về số phiếu điều chỉnh.
+    """
+    with transaction.atomic():
+        locked = StockTaking.objects.select_for_update().get(pk=stock_taking.pk)
+        if locked.status in ('completed', 'cancelled'):
+            raise CountSheetError(f'Đợt kiểm kê đã {locked.get_status_display().lower()}')
+        variances = list(
+            stock_taking.details.exclude(variance=0).values_list('product_id', 'variance')
+        )
+        movements = [
+            StockMovement(
+                warehouse_id=stock_taking.warehouse_id,
+                product_id=product_id,
+                movement_type='adjustment',
+                quantity=variance,
+                reference_type='stock_taking',
+                reference_id=stock_taking.pk,
+                notes=f'Điều chỉnh theo kiểm kê {stock_taking.code}',
+                created_by=user,
+            )
+            for product_id, variance in variances
+        ]
+        # bulk_create không phát post_save nên tự cộng vào sổ cái (kèm giá vốn) trước khi ghi
+        apply_movements(stock_taking.warehouse_id, movements)
+        StockMovement.objects.bulk_create(movements, batch_size=1000)
+
+        stock_taking.status = 'completed'
+        stock_taking.end_date = timezone.now()
+        stock_taking.save(update_fields=['status', 'end_date'])
+    return len(variances)
@@ -1,3 +1,205 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.models import Order, OrderDetail
+from products.models import Category, Product, Unit
+from .aggregates import rebuild_warehouse_summary
+from .allocation import InsufficientStockError, consume_order, release_order, reserve_order
+from .capacity import CapacityExceededError
+from .ledger import apply_delta, apply_movements
+from .models import InventoryLot, InventoryStock, StockMovement, StockReservation, Warehouse, WarehouseStockSummary
+
+SUMMARY_FIELDS = ('sku_count', 'total_quantity', 'low_stock_count', 'total_value', 'used_tonnage')
+
+
+def create_product(code, **kwargs):
+    category, _ = Category.objects.get_or_create(name='Trái cây')
+    unit, _ = Unit.objects.get_or_create(name='Kilogram', defaults={'symbol': 'kg'})
+    fields = {
+        'name': f'Sản phẩm {code}',
+        'category': category,
+        'unit': unit,
+        'origin': 'domestic',
+        'quality_grade': 'A',
+        'cost_price': Decimal('10000'),
+        'selling_price': Decimal('15000'),
+        'shelf_life_days': 14,
+    }
+    fields.update(kwargs)
+    return Product.objects.create(code=code, **fields)
+
+
+def create_warehouse(code, capacity=Decimal('100000')):
+    return Warehouse.objects.create(name=f'Kho {code}', code=code, address='Hà Nội', capacity=capacity)
+
+
+def stock_of(warehouse, product):
+    return InventoryStock.objects.get(warehouse=warehouse, product=product)
+
+
+def summary_values(warehouse):
+    return WarehouseStockSummary.objects.filter(warehouse=warehouse).values(*SUMMARY_FIELDS).get()
+
+
+class LedgerTests(TestCase):
+    """Sổ cái: kẹp tồn về 0 và giữ bảng tổng hợp khớp với InventoryStock"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = create_warehouse('K01')
+        cls.product = create_product('SP01', weight_per_unit=Decimal('0.001'))
+
+    def test_outbound_is_clamped_at_zero(self):
+        apply_delta(self.warehouse.id, self.product.id, Decimal('5'))
+        apply_delta(self.warehouse.id, self.product.id, Decimal('-8'))
+        self.assertEqual(stock_of(self.warehouse, self.product).quantity, 0)
+
+    def test_summary_matches_rebuild(self):
+        other = create_product('SP02')
+        apply_movements(self.warehouse.id, [
+            StockMovement(warehouse=self.warehouse, product=self.product, movement_type='inbound',
+                          quantity=Decimal('20'), unit_cost=Decimal('1000')),
+            StockMovement(warehouse=self.warehouse, product=other, movement_type='inbound',
+                          quantity=Decimal('3'), unit_cost=Decimal('2000')),
+        ])
+        apply_delta(self.warehouse.id, other.id, Decimal('-3'))
+        incremental = summary_values(self.warehouse)
+        rebuild_warehouse_summary(self.warehouse.id)
+        self.assertEqual(incremental, summary_values(self.warehouse))
+
+    def test_new_low_stock_row_counted_once(self):
+        InventoryStock.objects.create(warehouse=self.warehouse, product=self.product, min_stock_level=Decimal('10'))
+        rebuild_warehouse_summary(self.warehouse.id)
+        apply_delta(self.warehouse.id, self.product.id, Decimal('2'))
+        self.assertEqual(summary_values(self.warehouse)['low_stock_count'], 1)
+
+
+class CapacityTests(TestCase):
+    """Phiếu nhập vượt sức chứa bị từ chối mà không để lại phiếu nào"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = create_warehouse('K02', capacity=Decimal('10'))
+        cls.product = create_product('SP03', weight_per_unit=Decimal('0.001'))
+        cls.user = get_user_model().objects.create_user(username='thukho', password='x')
+
+    def test_create_over_capacity_leaves_no_movement(self):
+        with self.assertRaises(CapacityExceededError):
+            StockMovement.objects.create(warehouse=self.warehouse, product=self.product,
+                                         movement_type='inbound', quantity=Decimal('20000'))
+        self.assertFalse(StockMovement.objects.filter(warehouse=self.warehouse).exists())
+
+    def test_form_over_capacity_leaves_no_movement(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('inventory:movement_create'), {
+            'warehouse': self.warehouse.id, 'product': self.product.id, 'movement_type': 'inbound',
+            'quantity': '20000', 'unit_cost': '1', 'notes': '',
+        })
+        self.assertFalse(StockMovement.objects.filter(warehouse=self.warehouse).exists())
+        self.assertFalse(InventoryStock.objects.filter(warehouse=self.warehouse, quantity__gt=0).exists())
+
+    def test_weight_change_rebases_tonnage(self):
+        apply_delta(self.warehouse.id, self.product.id, Decimal('2000'))
+        self.product.weight_per_unit = Decimal('0.002')
+        self.product.save()
+        apply_delta(self.warehouse.id, self.product.id, Decimal('-2000'))
+        self.assertEqual(summary_values(self.warehouse)['used_tonnage'], 0)
+
+
+class LotTests(TestCase):
+    """Phiếu xuất lấy từ lô hết hạn sớm nhất trước (FEFO)"""
+
+    def test_outbound_consumes_earliest_expiry_first(self):
+        warehouse = create_warehouse('K03')
+        product = create_product('SP04')
+        today = timezone.localdate()
+        late = StockMovement(warehouse=warehouse, product=product, movement_type='inbound', quantity=Decimal('5'))
+        late.lot_expiry_date = today + timedelta(days=10)
+        early = StockMovement(warehouse=warehouse, product=product, movement_type='inbound', quantity=Decimal('5'))
+        early.lot_expiry_date = today + timedelta(days=2)
+        apply_movements(warehouse.id, [late, early])
+
+        outbound = StockMovement(warehouse=warehouse, product=product, movement_type='outbound', quantity=Decimal('7'))
+        apply_movements(warehouse.id, [outbound])
+
+        self.assertEqual(outbound.consumed_expiry, today + timedelta(days=2))
+        self.assertEqual(
+            list(InventoryLot.objects.filter(warehouse=warehouse).values_list('expiry_date', 'quantity')),
+            [(today + timedelta(days=10), Decimal('3'))],
+        )
+
+
+class ReservationTests(TestCase):
+    """Giữ hàng khi xác nhận, xuất kho khi giao, trả lại khi hủy"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = create_warehouse('K04')
+        cls.product = create_product('SP05')
+
+    def setUp(self):
+        apply_delta(self.warehouse.id, self.product.id, Decimal('10'))
+        self.order = Order.objects.create(order_type='sale', shipping_address='Hà Nội')
+        OrderDetail.objects.create(order=self.order, product=self.product, quantity=Decimal('4'),
+                                   unit_price=Decimal('15000'))
+
+    def test_reserve_then_consume(self):
+        reserve_order(self.order)
+        stock = stock_of(self.warehouse, self.product)
+        self.assertEqual((stock.quantity, stock.reserved_quantity), (Decimal('10'), Decimal('4')))
+
+        consume_order(self.order)
+        stock.refresh_from_db()
+        self.assertEqual((stock.quantity, stock.reserved_quantity), (Decimal('6'), Decimal('0')))
+        self.assertFalse(StockReservation.objects.filter(order=self.order).exists())
+
+    def test_release_returns_reserved(self):
+        reserve_order(self.order)
+        release_order(self.order)
+        stock = stock_of(self.warehouse, self.product)
+        self.assertEqual((stock.quantity, stock.reserved_quantity), (Decimal('10'), Decimal('0')))
+        self.assertFalse(StockReservation.objects.filter(order=self.order).exists())
+
+    def test_insufficient_stock_reserves_nothing(self):
+        missing = create_product('SP10')
+        OrderDetail.objects.create(order=self.order, product=missing, quantity=Decimal('1'),
+                                   unit_price=Decimal('15000'))
+        with self.assertRaises(InsufficientStockError):
+            reserve_order(self.order)
+        self.assertEqual(stock_of(self.warehouse, self.product).reserved_quantity, 0)
+
+
+class MovementBulkAPITests(TestCase):
+    """API tạo phiếu hàng loạt trả về đúng id của các phiếu đã ghi, kể cả khi CSDL không trả khóa chính"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # API ghi phiếu với created_by_id=1
+        get_user_model().objects.create_user(id=1, username='api', password='x')
+
+    def post_bulk(self, warehouse, products):
+        response = self.client.post(reverse('inventory:movement_api_create'), {
+            'movement_type': 'inbound', 'warehouse_id': warehouse.id, 'mode': 'bulk',
+            'items': [{'product_id': p.id, 'quantity': 3} for p in products],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        ids = [item['id'] for item in response.json()['data']['items']]
+        self.assertEqual(
+            list(StockMovement.objects.filter(pk__in=ids).order_by('id').values_list('product_id', flat=True)),
+            [p.id for p in products],
+        )
+
+    def test_bulk_returns_ids_of_created_rows(self):
+        self.post_bulk(create_warehouse('K05'), [create_product('SP06'), create_product('SP07')])
 
-# Create your tests here.
+    def test_bulk_reads_ids_back_without_returning(self):
+        products = [create_product('SP08'), create_product('SP09')]
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            self.post_bulk(create_warehouse('K06'), products)
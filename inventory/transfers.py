@@ -0,0 +1,192 @@
+"""
+Chuyển kho hai giai đoạn.
+
+Xuất (dispatch): ghi phiếu 'transfer' ở kho nguồn và lưu giá vốn, hạn sử dụng
+của phần xuất vào chi tiết phiếu. Nhận (receive): ghi phiếu 'inbound' ở kho
+đích theo đúng giá vốn và hạn đó. Hàng giữa hai giai đoạn là hàng đang vận
+chuyển, tra theo tuyến bằng in_transit_quantities(). Mỗi giai đoạn là một
+transaction: khóa phiếu, ghi mọi biến động bằng một lần bulk_create và cộng
+vào sổ cái theo lô, nên số truy vấn không phụ thuộc số mặt hàng.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .capacity import check_capacity, precheck_capacity, tonnage_of
+from .ledger import apply_movements
+from .models import InventoryStock, StockMovement, StockTransfer, StockTransferDetail
+
+TRANSFER_REFERENCE = 'stock_transfer'
+CENT = Decimal('0.01')
+
+
+class TransferError(Exception):
+    """Phiếu chuyển không hợp lệ hoặc không ở trạng thái cho phép"""
+
+
+def create_transfer(source_id, destination_id, lines, user=None, notes=''):
+    """Tạo phiếu chuyển nháp với lines = {product_id: quantity}"""
+    if int(source_id) == int(destination_id):
+        raise TransferError('Kho nguồn và kho đích phải khác nhau')
+    lines = {int(pid): Decimal(str(quantity)) for pid, quantity in lines.items()}
+    if not lines:
+        raise TransferError('Phiếu chuyển phải có ít nhất một sản phẩm')
+    if any(quantity <= 0 for quantity in lines.values()):
+        raise TransferError('Số lượng chuyển phải lớn hơn 0')
+    with transaction.atomic():
+        transfer = StockTransfer.objects.create(
+            source_id=source_id, destination_id=destination_id, notes=notes, created_by=user
+        )
+        StockTransferDetail.objects.bulk_create([
+            StockTransferDetail(transfer=transfer, product_id=pid, quantity=quantity)
+            for pid, quantity in lines.items()
+        ])
+    return transfer
+
+
+def _lock(transfer, *statuses):
+    locked = StockTransfer.objects.select_for_update().get(pk=transfer.pk)
+    if locked.status not in statuses:
+        raise TransferError(f'Phiếu chuyển {locked.code} đang ở trạng thái "{locked.get_status_display()}"')
+    return locked
+
+
+def _movements(transfer, warehouse_id, movement_type, quantities, details, user, notes):
+    return [
+        StockMovement(
+            warehouse_id=warehouse_id,
+            product_id=detail.product_id,
+            movement_type=movement_type,
+            quantity=quantities[detail.product_id],
+            unit_cost=detail.unit_cost.quantize(CENT) if detail.unit_cost is not None else None,
+            reference_type=TRANSFER_REFERENCE,
+            reference_id=transfer.pk,
+            notes=notes,
+            created_by=user,
+        )
+        for detail in details
+        if quantities.get(detail.product_id)
+    ]
+
+
+def _put_back(transfer, warehouse_id, quantities, details, user, notes, enforce_capacity=True):
+    """Ghi phiếu nhập giữ nguyên giá vốn và hạn sử dụng lúc xuất"""
+    movements = _movements(transfer, warehouse_id, 'inbound', quantities, details, user, notes)
+    expiry = {detail.product_id: detail.expiry_date for detail in details}
+    for movement in movements:
+        movement.lot_expiry_date = expiry[movement.product_id]
+    apply_movements(warehouse_id, movements, enforce_capacity=enforce_capacity)
+    StockMovement.objects.bulk_create(movements)
+    return movements
+
+
+def dispatch_transfer(transfer, user=None):
+    """
+    Xuất hàng khỏi kho nguồn. Không đủ hàng khả dụng (trừ phần đã giữ cho đơn) thì không xuất dòng nào.
+    Kho đích không còn đủ sức chứa cho cả phiếu thì từ chối (CapacityExceededError) hoặc gán
+    transfer.capacity_warning, tùy WAREHOUSE_CAPACITY_POLICY.
+    """
+    with transaction.atomic():
+        transfer = _lock(transfer, 'draft')
+        details = list(transfer.details.select_related('product').order_by('product_id'))
+        available = dict(
+            InventoryStock.objects.select_for_update().filter(
+                warehouse_id=transfer.source_id, product_id__in=[d.product_id for d in details]
+            ).order_by('product_id').annotate(
+                available=F('quantity') - F('reserved_quantity')
+            ).values_list('product_id', 'available')
+        )
+        short = [d for d in details if available.get(d.product_id, 0) < d.quantity]
+        if short:
+            raise TransferError('Không đủ tồn kho khả dụng: ' + ', '.join(
+                f'{d.product.name} (còn {available.get(d.product_id, 0)}, cần {d.quantity})' for d in short
+            ))
+
+        quantities = {d.product_id: d.quantity for d in details}
+        weights = {d.product_id: d.product.weight_per_unit for d in details}
+        warning = check_capacity(transfer.destination_id, tonnage_of(quantities, weights))
+        movements = _movements(
+            transfer, transfer.source_id, 'transfer', quantities, details, user,
+            f'Xuất chuyển kho {transfer.code}'
+        )
+        apply_movements(transfer.source_id, movements)
+        StockMovement.objects.bulk_create(movements)
+        for detail, movement in zip(details, movements):
+            if movement.cost_of_goods is not None:
+                detail.unit_cost = movement.cost_of_goods / detail.quantity
+            detail.expiry_date = getattr(movement, 'consumed_expiry', None)
+        StockTransferDetail.objects.bulk_update(details, ['unit_cost', 'expiry_date'])
+
+        transfer.status = 'in_transit'
+        transfer.dispatched_at = timezone.now()
+        transfer.save(update_fields=['status', 'dispatched_at'])
+    transfer.capacity_warning = warning
+    return transfer
+
+
+def receive_transfer(transfer, received=None, user=None):
+    """
+    Nhận hàng vào kho đích. received = {product_id: số lượng nhận}, mặc định nhận đủ;
+    phần thiếu được ghi nhận là hao hụt trên đường (received_quantity < quantity).
+    Kho đích vượt sức chứa thì từ chối hoặc gán transfer.capacity_warning như khi xuất.
+    """
+    with transaction.atomic():
+        transfer = _lock(transfer, 'in_transit')
+        details = list(transfer.details.order_by('product_id'))
+        received = {int(pid): Decimal(str(quantity)) for pid, quantity in (received or {}).items()}
+        for detail in details:
+            quantity = received.get(detail.product_id, detail.quantity)
+            if quantity < 0 or quantity > detail.quantity:
+                raise TransferError(f'Số lượng nhận của sản phẩm ID {detail.product_id} phải từ 0 đến {detail.quantity}')
+            detail.received_quantity = quantity
+
+        precheck_capacity(transfer.destination_id, {d.product_id: d.received_quantity for d in details})
+        movements = _put_back(
+            transfer, transfer.destination_id, {d.product_id: d.received_quantity for d in details}, details, user,
+            f'Nhận chuyển kho {transfer.code}'
+        )
+        StockTransferDetail.objects.bulk_update(details, ['received_quantity'])
+
+        transfer.status = 'received'
+        transfer.received_at = timezone.now()
+        transfer.save(update_fields=['status', 'received_at'])
+    transfer.capacity_warning = getattr(movements[0], 'capacity_warning', None) if movements else None
+    return transfer
+
+
+def cancel_transfer(transfer, user=None):
+    """Hủy phiếu chuyển; phiếu đang vận chuyển thì nhập trả lại kho nguồn"""
+    with transaction.atomic():
+        transfer = _lock(transfer, 'draft', 'in_transit')
+        if transfer.status == 'in_transit':
+            details = list(transfer.details.order_by('product_id'))
+            # Hàng quay về chỗ vừa xuất đi nên không chặn theo sức chứa
+            _put_back(
+                transfer, transfer.source_id, {d.product_id: d.quantity for d in details}, details, user,
+                f'Hủy chuyển kho {transfer.code}', enforce_capacity=False
+            )
+        transfer.status = 'cancelled'
+        transfer.save(update_fields=['status'])
+    return transfer
+
+
+def in_transit_quantities(source_id=None, destination_id=None, product_ids=None):
+    """Hàng đang vận chuyển theo tuyến: [{'source_id', 'destination_id', 'product_id', 'quantity'}]"""
+    details = StockTransferDetail.objects.filter(transfer__status='in_transit')
+    if source_id:
+        details = details.filter(transfer__source_id=source_id)
+    if destination_id:
+        details = details.filter(transfer__destination_id=destination_id)
+    if product_ids:
+        details = details.filter(product_id__in=product_ids)
+    return list(
+        details.values(
+            'product_id',
+            source_id=F('transfer__source_id'),
+            destination_id=F('transfer__destination_id'),
+        ).annotate(
+            quantity=Sum('quantity')
+        ).order_by('source_id', 'destination_id', 'product_id')
+    )
@@ -32,4 +32,12 @@ urlpatterns = [
     path('api/movements/create/', views.StockMovementAPICreateView.as_view(), name='movement_api_create'),
     path('api/movements/list/', views.StockMovementAPIListView.as_view(), name='movement_api_list'),
     path('api/movements/<int:movement_id>/', views.StockMovementAPIDetailView.as_view(), name='movement_api_detail'),
+    path('api/stock/as-of/', views.StockAsOfAPIView.as_view(), name='stock_api_as_of'),
+    path('api/stock-taking/<int:pk>/import/', views.StockTakingImportAPIView.as_view(), name='stock_taking_api_import'),
+    path('api/stock-taking/<int:pk>/complete/', views.StockTakingCompleteAPIView.as_view(), name='stock_taking_api_complete'),
+    path('api/transfers/create/', views.StockTransferAPICreateView.as_view(), name='transfer_api_create'),
+    path('api/transfers/in-transit/', views.StockInTransitAPIView.as_view(), name='transfer_api_in_transit'),
+    path('api/transfers/<int:pk>/<str:action>/', views.StockTransferAPIActionView.as_view(), name='transfer_api_action'),
+    path('api/lots/', views.InventoryLotAPIListView.as_view(), name='lot_api_list'),
+    path('api/low-stock-events/', views.LowStockEventAPIListView.as_view(), name='low_stock_event_api_list'),
 ]
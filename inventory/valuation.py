@@ -0,0 +1,132 @@
+"""
+Định giá tồn kho theo từng biến động.
+
+Mỗi dòng InventoryStock giữ sẵn giá vốn bình quân và giá trị tồn; với phương
+pháp FIFO còn có các lớp giá vốn (StockCostLayer). Sổ cái gọi value_movements()
+ngay sau khi cộng số lượng, trong cùng transaction và khi các dòng tồn kho còn
+đang bị khóa, nên giá trị tồn và giá vốn xuất của từng phiếu là số đọc sẵn;
+phần chênh lệch tổng giá trị của kho được trả về để sổ cái cộng cùng câu UPDATE
+tổng hợp.
+
+Phiếu nhập không có đơn giá (hoặc đơn giá 0) được tính theo giá vốn bình quân
+hiện tại, chưa có thì theo giá vốn của sản phẩm.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+
+from products.models import Product
+from .models import InventoryStock, StockCostLayer
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+COST_PLACES = Decimal('0.0001')
+
+
+def valuation_method():
+    return getattr(settings, 'INVENTORY_VALUATION_METHOD', 'average')
+
+
+class _CostState:
+    """Giá trị tồn của một dòng tồn kho trong lúc đi qua các phiếu"""
+
+    def __init__(self, change, layers, fallback_cost):
+        self.quantity = change['old']
+        self.value = change['stock_value']
+        self.average = change['average_cost'] or fallback_cost
+        self.layers = layers
+
+    def receive(self, quantity, unit_cost):
+        self.quantity += quantity
+        self.value += (quantity * unit_cost).quantize(CENT)
+        if self.layers is not None:
+            self.layers.append(StockCostLayer(
+                unit_cost=unit_cost, original_quantity=quantity, remaining_quantity=quantity
+            ))
+        self.average = (self.value / self.quantity).quantize(COST_PLACES)
+
+    def issue(self, quantity):
+        """Xuất quantity (không quá tồn), trả về giá vốn của phần xuất"""
+        quantity = min(quantity, self.quantity)
+        if quantity <= 0:
+            return ZERO
+        if self.layers is None or quantity == self.quantity:
+            cost = self.value if quantity == self.quantity else quantity * self.average
+            if self.layers is not None:
+                for layer in self.layers:
+                    layer.remaining_quantity = ZERO
+        else:
+            cost, need = ZERO, quantity
+            for layer in self.layers:
+                if not need:
+                    break
+                take = min(layer.remaining_quantity, need)
+                layer.remaining_quantity -= take
+                cost += take * layer.unit_cost
+                need -= take
+            # Lớp giá vốn thiếu (tồn có trước khi dùng FIFO): phần còn lại theo bình quân
+            cost += need * self.average
+        cost = min(cost.quantize(CENT), self.value)
+        self.quantity -= quantity
+        self.value -= cost
+        if self.quantity > 0:
+            self.average = (self.value / self.quantity).quantize(COST_PLACES)
+        return cost
+
+
+def value_movements(warehouse_id, entries, changes):
+    """
+    Cập nhật giá vốn cho các phiếu [(movement, delta)] của một kho.
+    `changes` là kết quả của ledger.apply_deltas cho cùng các sản phẩm.
+    Gán movement.cost_of_goods cho các phiếu làm giảm tồn (chưa lưu xuống database).
+    Trả về phần chênh lệch tổng giá trị tồn của kho.
+    """
+    by_product = defaultdict(list)
+    for movement, delta in entries:
+        if delta and movement.product_id in changes:
+            by_product[movement.product_id].append((movement, delta))
+    if not by_product:
+        return ZERO
+
+    fifo = valuation_method() == 'fifo'
+    layers = defaultdict(list)
+    if fifo:
+        stock_ids = [changes[pid]['stock_id'] for pid in by_product]
+        for layer in StockCostLayer.objects.filter(stock_id__in=stock_ids, remaining_quantity__gt=0).order_by('id'):
+            layers[layer.stock_id].append(layer)
+    missing_cost = [pid for pid in by_product if not changes[pid]['average_cost']]
+    fallback = dict(Product.objects.filter(id__in=missing_cost).values_list('id', 'cost_price')) if missing_cost else {}
+
+    stocks, new_layers, touched_layers = [], [], []
+    value_delta = ZERO
+    for pid, items in by_product.items():
+        change = changes[pid]
+        existing = layers[change['stock_id']] if fifo else None
+        state = _CostState(change, list(existing) if fifo else None, fallback.get(pid) or ZERO)
+        for movement, delta in items:
+            if delta > 0:
+                state.receive(delta, movement.unit_cost or state.average)
+            else:
+                movement.cost_of_goods = state.issue(-delta)
+        # Sổ cái kẹp tồn về 0 theo tổng delta, phần chênh còn lại coi như hao hụt
+        if state.quantity > change['new']:
+            state.issue(state.quantity - change['new'])
+
+        value_delta += state.value - change['stock_value']
+        stocks.append(InventoryStock(
+            id=change['stock_id'], average_cost=state.average, stock_value=state.value
+        ))
+        if fifo:
+            touched_layers.extend(layer for layer in existing)
+            for layer in state.layers[len(existing):]:
+                if layer.remaining_quantity > 0:
+                    layer.stock_id = change['stock_id']
+                    new_layers.append(layer)
+
+    InventoryStock.objects.bulk_update(stocks, ['average_cost', 'stock_value'])
+    if touched_layers:
+        StockCostLayer.objects.bulk_update(touched_layers, ['remaining_quantity'])
+    if new_layers:
+        StockCostLayer.objects.bulk_create(new_layers)
+    return value_delta
@@ -3,15 +3,33 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView, D
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.http import JsonResponse
-from django.db.models import Count, Sum, F, Q
+from django.db.models import Count, Sum, F, Q, Value, DecimalField
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.urls import reverse_lazy
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from django.db import transaction
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from itertools import islice
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+import base64
 import json
-from .models import InventoryStock, Warehouse, StockMovement, StockTaking
+from .models import InventoryStock, Warehouse, StockMovement, StockTaking, WarehouseStockSummary, LowStockEvent, InventoryLot, StockTransfer
+from .aggregates import stock_list_summary
+from .capacity import CAPACITY_CHECKED_TYPES, CapacityExceededError, precheck_capacity
+from .ledger import apply_movements
+from .lots import fefo_key
+from .transfers import (
+    TransferError, create_transfer, dispatch_transfer, receive_transfer, cancel_transfer, in_transit_quantities
+)
+from .archive import archived_count, iter_archived_movements, load_archived_movements
+from .snapshots import stock_as_of
+from .stock_taking import CountSheetError, import_count_sheet, complete_stock_taking
+from utils.spreadsheets import SpreadsheetError
 from products.models import Product
 
 User = get_user_model()
@@ -26,18 +44,28 @@ class StockListView(LoginRequiredMixin, ListView):
         return InventoryStock.objects.select_related(
             'product', 'warehouse', 'product__unit'
         ).annotate(
-            total_value=F('quantity') * F('product__cost_price')
+            total_value=F('stock_value')
         ).order_by('product__name')
     
+    def get_paginator(self, queryset, per_page, **kwargs):
+        paginator = super().get_paginator(queryset, per_page, **kwargs)
+        # Số dòng lấy từ khối tổng hợp đã cache, chuyển trang không phải COUNT(*) lại
+        paginator.count = self.summary['stock_rows']
+        return paginator
+    
+    def get(self, request, *args, **kwargs):
+        self.summary = stock_list_summary()
+        return super().get(request, *args, **kwargs)
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        stocks = self.get_queryset()
         
         context.update({
-            'total_products': stocks.values('product').distinct().count(),
-            'total_stock': stocks.aggregate(total=Sum('quantity'))['total'] or 0,
-            'low_stock_count': stocks.filter(quantity__lte=F('min_stock_level')).count(),
-            'warehouse_count': Warehouse.objects.count(),
+            'total_products': self.summary['total_products'],
+            'total_stock': self.summary['total_stock'],
+            'low_stock_count': self.summary['low_stock_count'],
+            'warehouse_count': self.summary['warehouse_count'],
+            'inventory_value': self.summary['inventory_value'],
         })
         return context
 
@@ -96,9 +124,11 @@ class WarehouseListView(LoginRequiredMixin, ListView):
     paginate_by = 10
     
     def get_queryset(self):
-        return Warehouse.objects.select_related('manager').annotate(
-            stock_count=Count('inventorystock'),
-            used_capacity=Sum('inventorystock__quantity', default=0)
+        # Đọc số liệu đã tổng hợp sẵn, không join sang InventoryStock
+        return Warehouse.objects.select_related('manager', 'stock_summary').annotate(
+            stock_count=Coalesce('stock_summary__sku_count', 0),
+            used_capacity=Coalesce('stock_summary__used_tonnage', Value(0), output_field=DecimalField()),
+            low_stock_count=Coalesce('stock_summary__low_stock_count', 0)
         ).all()
 
 class WarehouseDetailView(LoginRequiredMixin, DetailView):
@@ -181,7 +211,9 @@ class MovementCreateView(LoginRequiredMixin, CreateView):
     def form_valid(self, form):
         try:
             form.instance.created_by = self.request.user
-            response = super().form_valid(form)
+            # Ghi phiếu và cộng tồn kho (signal) cùng một transaction: lỗi thì không còn phiếu nào
+            with transaction.atomic():
+                response = super().form_valid(form)
             
             # Signal sẽ tự động update stock
             messages.success(self.request, f'Tạo phiếu {form.instance.get_movement_type_display()} thành công!')
@@ -191,6 +223,12 @@ class MovementCreateView(LoginRequiredMixin, CreateView):
             messages.error(self.request, f'Lỗi tạo phiếu xuất nhập kho: {str(e)}')
             return self.form_invalid(form)
 
+    def form_invalid(self, form):
+        # Lỗi của cả phiếu (ví dụ vượt sức chứa kho) hiện qua messages, template chỉ hiện từng trường
+        for error in form.non_field_errors():
+            messages.error(self.request, f'Lỗi tạo phiếu xuất nhập kho: {error}')
+        return super().form_invalid(form)
+
 class StockTakingListView(LoginRequiredMixin, ListView):
     model = StockTaking
     template_name = 'inventory/stock_taking.html'
@@ -202,6 +240,13 @@ class StockTakingListView(LoginRequiredMixin, ListView):
             'warehouse', 'created_by'
         ).all().order_by('-created_at')
 
+def _warehouse_summary(warehouse):
+    """Tổng hợp tồn kho đã tính sẵn của kho (chưa có thì coi như kho trống)"""
+    try:
+        return warehouse.stock_summary
+    except WarehouseStockSummary.DoesNotExist:
+        return WarehouseStockSummary(warehouse=warehouse)
+
 # Warehouse API Views
 @method_decorator(csrf_exempt, name='dispatch')
 class WarehouseAPICreateView(View):
@@ -288,14 +333,10 @@ class WarehouseAPICreateView(View):
 class WarehouseAPIDetailView(View):
     def get(self, request, pk):
         try:
-            warehouse = Warehouse.objects.select_related('manager').get(pk=pk)
+            warehouse = Warehouse.objects.select_related('manager', 'stock_summary').get(pk=pk)
             
             # Get stock summary for this warehouse
-            stock_summary = InventoryStock.objects.filter(warehouse=warehouse).aggregate(
-                total_products=Count('product'),
-                total_quantity=Sum('quantity'),
-                low_stock_items=Count('id', filter=Q(quantity__lte=F('min_stock_level')))
-            )
+            stock_summary = _warehouse_summary(warehouse)
             
             return JsonResponse({
                 'success': True,
@@ -311,9 +352,12 @@ class WarehouseAPIDetailView(View):
                     'is_active': warehouse.is_active,
                     'created_at': warehouse.created_at.isoformat(),
                     'stock_summary': {
-                        'total_products': stock_summary['total_products'] or 0,
-                        'total_quantity': float(stock_summary['total_quantity'] or 0),
-                        'low_stock_items': stock_summary['low_stock_items'] or 0
+                        'total_products': stock_summary.sku_count,
+                        'total_quantity': float(stock_summary.total_quantity),
+                        'low_stock_items': stock_summary.low_stock_count,
+                        'total_value': float(stock_summary.total_value),
+                        'used_tonnage': float(stock_summary.used_tonnage),
+                        'utilization': float(stock_summary.utilization)
                     }
                 }
             })
@@ -331,7 +375,7 @@ class WarehouseAPIDetailView(View):
 class WarehouseAPIListView(View):
     def get(self, request):
         try:
-            warehouses = Warehouse.objects.select_related('manager').filter(is_active=True).order_by('name')
+            warehouses = Warehouse.objects.select_related('manager', 'stock_summary').filter(is_active=True).order_by('name')
             
             # Search functionality
             search = request.GET.get('search')
@@ -345,10 +389,7 @@ class WarehouseAPIListView(View):
             data = []
             for warehouse in warehouses:
                 # Get basic stock stats
-                stock_stats = InventoryStock.objects.filter(warehouse=warehouse).aggregate(
-                    total_products=Count('product'),
-                    total_quantity=Sum('quantity')
-                )
+                stock_stats = _warehouse_summary(warehouse)
                 
                 data.append({
                     'id': warehouse.id,
@@ -359,8 +400,12 @@ class WarehouseAPIListView(View):
                     'capacity': float(warehouse.capacity),
                     'is_active': warehouse.is_active,
                     'stock_summary': {
-                        'total_products': stock_stats['total_products'] or 0,
-                        'total_quantity': float(stock_stats['total_quantity'] or 0)
+                        'total_products': stock_stats.sku_count,
+                        'total_quantity': float(stock_stats.total_quantity),
+                        'low_stock_items': stock_stats.low_stock_count,
+                        'total_value': float(stock_stats.total_value),
+                        'used_tonnage': float(stock_stats.used_tonnage),
+                        'utilization': float(stock_stats.utilization)
                     }
                 })
             
@@ -409,6 +454,9 @@ class StockMovementAPICreateView(View):
                     'error': 'Kho không tồn tại'
                 }, status=400)
             
+            if data.get('mode') == 'bulk':
+                return self.post_bulk(data, warehouse)
+
             with transaction.atomic():
                 # Create movements for each item
                 movements = []
@@ -422,7 +470,19 @@ class StockMovementAPICreateView(View):
                         unit_cost = float(item_data.get('unit_cost', 0))
                         total_cost = quantity * unit_cost
                         
-                        # Create stock movement
+                        if data['movement_type'] == 'outbound':
+                            stock = InventoryStock.objects.select_for_update().filter(
+                                warehouse=warehouse, product=product
+                            ).first()
+                            current = stock.quantity if stock else 0
+                            if current < quantity:
+                                transaction.set_rollback(True)
+                                return JsonResponse({
+                                    'success': False,
+                                    'error': f'Không đủ tồn kho cho sản phẩm {product.name}. Tồn: {current}, Xuất: {quantity}'
+                                }, status=400)
+
+                        # Create stock movement (signal sẽ tự động cập nhật tồn kho)
                         movement = StockMovement.objects.create(
                             warehouse=warehouse,
                             product=product,
@@ -438,27 +498,6 @@ class StockMovementAPICreateView(View):
                         movements.append(movement)
                         total_value += total_cost
                         
-                        # Update stock levels
-                        stock, created = InventoryStock.objects.get_or_create(
-                            warehouse=warehouse,
-                            product=product,
-                            defaults={'quantity': 0}
-                        )
-                        
-                        if data['movement_type'] == 'inbound':
-                            stock.quantity += quantity
-                        elif data['movement_type'] == 'outbound':
-                            if stock.quantity < quantity:
-                                return JsonResponse({
-                                    'success': False,
-                                    'error': f'Không đủ tồn kho cho sản phẩm {product.name}. Tồn: {stock.quantity}, Xuất: {quantity}'
-                                }, status=400)
-                            stock.quantity -= quantity
-                        elif data['movement_type'] == 'adjustment':
-                            stock.quantity = quantity
-                        
-                        stock.save()
-                        
                         items_data.append({
                             'id': movement.id,
                             'product': {
@@ -500,6 +539,7 @@ class StockMovementAPICreateView(View):
                         'total_items': len(items_data),
                         'total_value': total_value,
                         'created_at': movements[0].created_at.isoformat() if movements else None,
+                        'capacity_warning': getattr(movements[-1], 'capacity_warning', None) if movements else None,
                         'items': items_data
                     }
                 })
@@ -509,12 +549,154 @@ class StockMovementAPICreateView(View):
                 'success': False,
                 'error': 'Dữ liệu JSON không hợp lệ'
             }, status=400)
+        except CapacityExceededError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
         except Exception as e:
             return JsonResponse({
                 'success': False,
                 'error': f'Lỗi server: {str(e)}'
             }, status=500)
 
+    def post_bulk(self, data, warehouse):
+        """
+        Chế độ nhập hàng loạt (mode=bulk): số truy vấn cố định dù phiếu có bao nhiêu dòng.
+        Dòng lỗi được báo riêng trong kết quả, các dòng hợp lệ vẫn được ghi.
+        """
+        movement_type = data['movement_type']
+        lines = []
+        for index, item_data in enumerate(data['items']):
+            try:
+                line = {
+                    'line': index,
+                    'product_id': int(item_data['product_id']),
+                    'quantity': Decimal(str(item_data['quantity'])),
+                    'unit_cost': Decimal(str(item_data.get('unit_cost', 0))),
+                    'notes': item_data.get('notes', ''),
+                }
+            except (KeyError, TypeError, ValueError, InvalidOperation):
+                lines.append({'line': index, 'error': 'Dữ liệu dòng không hợp lệ'})
+                continue
+            if line['quantity'] <= 0 and movement_type != 'adjustment':
+                line['error'] = 'Số lượng phải lớn hơn 0'
+            lines.append(line)
+
+        # Một truy vấn cho toàn bộ sản phẩm
+        products = Product.objects.in_bulk({line['product_id'] for line in lines if 'product_id' in line})
+        for line in lines:
+            if 'error' not in line and line['product_id'] not in products:
+                line['error'] = f'Sản phẩm ID {line["product_id"]} không tồn tại'
+
+        with transaction.atomic():
+            if movement_type == 'outbound':
+                # Khóa các dòng tồn kho liên quan trong một truy vấn rồi kiểm tra theo thứ tự dòng
+                available = dict(InventoryStock.objects.select_for_update().filter(
+                    warehouse=warehouse,
+                    product_id__in=[line['product_id'] for line in lines if 'error' not in line]
+                ).values_list('product_id', 'quantity'))
+                for line in lines:
+                    if 'error' in line:
+                        continue
+                    current = available.get(line['product_id'], 0)
+                    if current < line['quantity']:
+                        line['error'] = (f'Không đủ tồn kho cho sản phẩm {products[line["product_id"]].name}. '
+                                         f'Tồn: {current}, Xuất: {line["quantity"]}')
+                    else:
+                        available[line['product_id']] = current - line['quantity']
+
+            accepted = [line for line in lines if 'error' not in line]
+            movements = [
+                StockMovement(
+                    warehouse=warehouse,
+                    product=products[line['product_id']],
+                    movement_type=movement_type,
+                    quantity=line['quantity'],
+                    unit_cost=line['unit_cost'],
+                    reference_type=data.get('reference_type', 'manual'),
+                    reference_id=data.get('reference_id'),
+                    notes=line['notes'],
+                    created_by_id=1  # Replace with request.user.id when auth is implemented
+                )
+                for line in accepted
+            ]
+
+            if movement_type in CAPACITY_CHECKED_TYPES:
+                inbound = {}
+                for line in accepted:
+                    inbound[line['product_id']] = inbound.get(line['product_id'], 0) + line['quantity']
+                precheck_capacity(warehouse.id, inbound, {
+                    pid: products[pid].weight_per_unit for pid in inbound
+                })
+
+            # bulk_create không phát post_save: cộng tồn kho và giá vốn trước, rồi ghi phiếu
+            # (kèm cost_of_goods) trong một lần
+            apply_movements(warehouse.id, movements)
+            movements = StockMovement.objects.bulk_create(movements)
+            if movements and movements[0].pk is None:
+                # MySQL không trả khóa chính sau bulk_create: đọc lại theo (sản phẩm, thời điểm tạo),
+                # auto_now_add gán riêng cho từng phiếu; các phiếu trùng khóa nhận id theo thứ tự ghi
+                ids = {}
+                for pk, product_id, created_at in StockMovement.objects.filter(
+                    warehouse=warehouse,
+                    movement_type=movement_type,
+                    created_at__in={movement.created_at for movement in movements},
+                ).order_by('id').values_list('id', 'product_id', 'created_at'):
+                    ids.setdefault((product_id, created_at), []).append(pk)
+                for movement in movements:
+                    pending = ids.get((movement.product_id, movement.created_at))
+                    movement.pk = pending.pop(0) if pending else None
+
+        items_data = []
+        total_value = Decimal('0')
+        results = iter(movements)
+        for line in lines:
+            if 'error' in line:
+                items_data.append({'line': line['line'], 'success': False, 'error': line['error']})
+                continue
+            movement = next(results)
+            product = products[line['product_id']]
+            total_cost = line['quantity'] * line['unit_cost']
+            total_value += total_cost
+            items_data.append({
+                'line': line['line'],
+                'success': True,
+                'id': movement.id,
+                'product': {
+                    'id': product.id,
+                    'name': product.name,
+                    'code': product.code
+                },
+                'quantity': float(line['quantity']),
+                'unit_cost': float(line['unit_cost']),
+                'total_cost': float(total_cost),
+                'notes': movement.notes,
+                'created_at': movement.created_at.isoformat()
+            })
+
+        return JsonResponse({
+            'success': bool(movements),
+            'message': 'Tạo phiếu xuất nhập kho thành công' if movements else 'Không có dòng hợp lệ',
+            'data': {
+                'warehouse': {
+                    'id': warehouse.id,
+                    'name': warehouse.name,
+                    'code': warehouse.code
+                },
+                'movement_type': movement_type,
+                'movement_type_display': dict(StockMovement.MOVEMENT_TYPE_CHOICES)[movement_type],
+                'reference_type': data.get('reference_type', 'manual'),
+                'reference_id': data.get('reference_id'),
+                'total_items': len(movements),
+                'failed_items': len(lines) - len(movements),
+                'total_value': float(total_value),
+                'created_at': movements[0].created_at.isoformat() if movements else None,
+                'capacity_warning': getattr(movements[0], 'capacity_warning', None) if movements else None,
+                'items': items_data
+            }
+        }, status=200 if movements else 400)
+
 # Stock Movement Detail API View
 @method_decorator(csrf_exempt, name='dispatch')
 class StockMovementAPIDetailView(View):
@@ -563,16 +745,65 @@ class StockMovementAPIDetailView(View):
             }, status=500)
 
 # Stock Movement List API View
+MOVEMENT_COUNT_CAP = 10000
+
+def _encode_movement_cursor(movement):
+    raw = f'{movement.created_at.isoformat()}|{movement.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_movement_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, movement_id = raw.rsplit('|', 1)
+        created_at = parse_datetime(created_at)
+        movement_id = int(movement_id)
+    except (ValueError, UnicodeDecodeError):
+        created_at = None
+    if created_at is None:
+        raise ValueError('cursor không hợp lệ')
+    return created_at, movement_id
+
+def _movement_total(queryset, mode, filtered):
+    """
+    Tổng số biến động theo ?count: 'exact' đếm đủ, 'estimate' lấy ước lượng
+    (thống kê bảng trên MySQL khi không lọc, nếu không thì đếm tối đa MOVEMENT_COUNT_CAP dòng),
+    'none' bỏ qua. Trả về (tổng, có phải số chính xác không).
+    """
+    if mode == 'exact':
+        return queryset.count(), True
+    if mode != 'estimate':
+        return None, False
+    if not filtered and connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [StockMovement._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] is not None:
+            return int(row[0]), False
+    capped = queryset.order_by()[:MOVEMENT_COUNT_CAP].count()
+    return capped, capped < MOVEMENT_COUNT_CAP
+
 @method_decorator(csrf_exempt, name='dispatch')
 class StockMovementAPIListView(View):
+    """
+    Danh sách biến động. Truyền ?cursor (rỗng cho trang đầu) để đọc theo con trỏ
+    (created_at, id): trang sâu tốn như trang đầu, mặc định không đếm tổng và
+    đọc liền mạch sang biến động đã lưu trữ. Không có ?cursor thì phân trang
+    theo ?page như cũ, chỉ trên dữ liệu chưa lưu trữ.
+    """
+    
     def get(self, request):
         try:
             # Get query parameters
             movement_type = request.GET.get('movement_type')
             warehouse_id = request.GET.get('warehouse_id')
             product_id = request.GET.get('product_id')
-            page = int(request.GET.get('page', 1))
             per_page = min(int(request.GET.get('per_page', 10)), 100)
+            cursor = request.GET.get('cursor')
+            count_mode = request.GET.get('count', 'exact' if cursor is None else 'none')
             
             # Build queryset
             queryset = StockMovement.objects.select_related(
@@ -585,13 +816,54 @@ class StockMovementAPIListView(View):
                 queryset = queryset.filter(warehouse_id=warehouse_id)
             if product_id:
                 queryset = queryset.filter(product_id=product_id)
+            filtered = bool(movement_type or warehouse_id or product_id)
+            total, total_is_exact = _movement_total(queryset, count_mode, filtered)
             
-            queryset = queryset.order_by('-created_at')
+            # id làm khóa phụ để thứ tự ổn định khi trùng created_at
+            queryset = queryset.order_by('-created_at', '-id')
             
-            # Pagination
-            from django.core.paginator import Paginator
-            paginator = Paginator(queryset, per_page)
-            movements = paginator.get_page(page)
+            if cursor is not None:
+                before = None
+                if cursor:
+                    before = _decode_movement_cursor(cursor)
+                    created_at, movement_id = before
+                    queryset = queryset.filter(
+                        Q(created_at__lt=created_at) |
+                        Q(created_at=created_at, id__lt=movement_id)
+                    )
+                movements = list(queryset[:per_page + 1])
+                if len(movements) <= per_page:
+                    # Hết dữ liệu nóng thì đọc tiếp sang các tháng đã lưu trữ (luôn cũ hơn)
+                    archived = islice(iter_archived_movements(
+                        before, warehouse_id, product_id, movement_type
+                    ), per_page + 1 - len(movements))
+                    movements += load_archived_movements(archived)
+                if total is not None:
+                    total += archived_count(warehouse_id, product_id, movement_type)
+                has_next = len(movements) > per_page
+                movements = movements[:per_page]
+                pagination = {
+                    'per_page': per_page,
+                    'next_cursor': _encode_movement_cursor(movements[-1]) if has_next else None,
+                    'has_next': has_next,
+                    'total_items': total,
+                    'total_is_exact': total_is_exact
+                }
+            else:
+                page = max(int(request.GET.get('page', 1)), 1)
+                offset = (page - 1) * per_page
+                movements = list(queryset[offset:offset + per_page + 1])
+                has_next = len(movements) > per_page
+                movements = movements[:per_page]
+                pagination = {
+                    'current_page': page,
+                    'per_page': per_page,
+                    'total_pages': max(-(-total // per_page), 1) if total_is_exact else None,
+                    'total_items': total,
+                    'total_is_exact': total_is_exact,
+                    'has_next': has_next,
+                    'has_previous': page > 1
+                }
             
             data = []
             for movement in movements:
@@ -621,16 +893,456 @@ class StockMovementAPIListView(View):
             return JsonResponse({
                 'success': True,
                 'data': data,
-                'pagination': {
-                    'current_page': page,
-                    'per_page': per_page,
-                    'total_pages': paginator.num_pages,
-                    'total_items': paginator.count,
-                    'has_next': movements.has_next(),
-                    'has_previous': movements.has_previous()
+                'pagination': pagination
+            })
+            
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Dữ liệu không hợp lệ: {str(e)}'
+            }, status=400)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Lỗi server: {str(e)}'
+            }, status=500)
+
+# Stock Taking API Views
+@method_decorator(csrf_exempt, name='dispatch')
+class StockTakingImportAPIView(View):
+    """Nạp phiếu đếm (file .xlsx/.csv, trường 'file') vào một đợt kiểm kê"""
+    
+    def post(self, request, pk):
+        try:
+            stock_taking = StockTaking.objects.get(pk=pk)
+            uploaded_file = request.FILES.get('file')
+            if not uploaded_file:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Trường file là bắt buộc'
+                }, status=400)
+            
+            imported, errors = import_count_sheet(stock_taking, uploaded_file)
+            totals = stock_taking.details.aggregate(
+                total_lines=Count('id'),
+                variance_lines=Count('id', filter=~Q(variance=0)),
+                total_variance=Sum('variance')
+            )
+            
+            return JsonResponse({
+                'success': True,
+                'message': f'Đã nạp {imported} dòng kiểm kê',
+                'data': {
+                    'stock_taking_id': stock_taking.id,
+                    'status': stock_taking.status,
+                    'imported': imported,
+                    'total_lines': totals['total_lines'],
+                    'variance_lines': totals['variance_lines'],
+                    'total_variance': float(totals['total_variance'] or 0),
+                    'errors': errors
+                }
+            })
+            
+        except StockTaking.DoesNotExist:
+            return JsonResponse({
+                'success': False,
+                'error': 'Đợt kiểm kê không tồn tại'
+            }, status=404)
+        except SpreadsheetError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Lỗi server: {str(e)}'
+            }, status=500)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class StockTakingCompleteAPIView(View):
+    """Chốt kiểm kê: tạo phiếu điều chỉnh cho mọi dòng chênh lệch"""
+    
+    def post(self, request, pk):
+        try:
+            stock_taking = StockTaking.objects.get(pk=pk)
+            user = request.user if request.user.is_authenticated else None
+            adjustments = complete_stock_taking(stock_taking, user)
+            
+            return JsonResponse({
+                'success': True,
+                'message': 'Chốt kiểm kê thành công',
+                'data': {
+                    'stock_taking_id': stock_taking.id,
+                    'status': stock_taking.status,
+                    'end_date': stock_taking.end_date.isoformat(),
+                    'adjustments': adjustments
                 }
             })
             
+        except StockTaking.DoesNotExist:
+            return JsonResponse({
+                'success': False,
+                'error': 'Đợt kiểm kê không tồn tại'
+            }, status=404)
+        except CountSheetError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Lỗi server: {str(e)}'
+            }, status=500)
+
+# Stock Transfer API Views
+def _transfer_data(transfer):
+    return {
+        'id': transfer.id,
+        'code': transfer.code,
+        'status': transfer.status,
+        'status_display': transfer.get_status_display(),
+        'source_id': transfer.source_id,
+        'destination_id': transfer.destination_id,
+        'dispatched_at': transfer.dispatched_at.isoformat() if transfer.dispatched_at else None,
+        'received_at': transfer.received_at.isoformat() if transfer.received_at else None,
+        'items': [{
+            'product_id': detail.product_id,
+            'quantity': float(detail.quantity),
+            'received_quantity': float(detail.received_quantity),
+            'unit_cost': float(detail.unit_cost) if detail.unit_cost is not None else None,
+            'expiry_date': detail.expiry_date.isoformat() if detail.expiry_date else None
+        } for detail in transfer.details.order_by('product_id')],
+        'capacity_warning': getattr(transfer, 'capacity_warning', None)
+    }
+
+@method_decorator(csrf_exempt, name='dispatch')
+class StockTransferAPICreateView(View):
+    """Tạo phiếu chuyển kho; truyền "dispatch": true để xuất hàng ngay"""
+    
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+            for field in ['source_id', 'destination_id', 'items']:
+                if not data.get(field):
+                    return JsonResponse({
+                        'success': False,
+                        'error': f'Trường {field} là bắt buộc'
+                    }, status=400)
+            
+            lines = {}
+            for item in data['items']:
+                product_id = int(item['product_id'])
+                lines[product_id] = lines.get(product_id, Decimal('0')) + Decimal(str(item['quantity']))
+            missing = set(lines) - set(Product.objects.filter(id__in=list(lines)).values_list('id', flat=True))
+            if missing:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'Sản phẩm ID {", ".join(map(str, sorted(missing)))} không tồn tại'
+                }, status=400)
+            if Warehouse.objects.filter(id__in=[data['source_id'], data['destination_id']]).count() != 2:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Kho nguồn hoặc kho đích không tồn tại'
+                }, status=400)
+            
+            user = request.user if request.user.is_authenticated else None
+            with transaction.atomic():
+                transfer = create_transfer(data['source_id'], data['destination_id'], lines, user, data.get('notes', ''))
+                if data.get('dispatch'):
+                    transfer = dispatch_transfer(transfer, user)
+            
+            return JsonResponse({
+                'success': True,
+                'message': 'Tạo phiếu chuyển kho thành công',
+                'data': _transfer_data(transfer)
+            }, status=201)
+            
+        except (TransferError, CapacityExceededError) as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            return JsonResponse({
+                'success': False,
+                'error': 'Dữ liệu không hợp lệ'
+            }, status=400)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Lỗi server: {str(e)}'
+            }, status=500)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class StockTransferAPIActionView(View):
+    """Xuất (dispatch), nhận (receive, kèm "items" nếu nhận thiếu) hoặc hủy (cancel) phiếu chuyển kho"""
+    
+    def post(self, request, pk, action):
+        try:
+            transfer = StockTransfer.objects.get(pk=pk)
+            user = request.user if request.user.is_authenticated else None
+            if action == 'dispatch':
+                transfer = dispatch_transfer(transfer, user)
+            elif action == 'receive':
+                data = json.loads(request.body) if request.body else {}
+                received = {
+                    int(item['product_id']): Decimal(str(item['received_quantity']))
+                    for item in data.get('items', [])
+                }
+                transfer = receive_transfer(transfer, received, user)
+            elif action == 'cancel':
+                transfer = cancel_transfer(transfer, user)
+            else:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'Thao tác {action} không hợp lệ'
+                }, status=400)
+            
+            return JsonResponse({
+                'success': True,
+                'data': _transfer_data(transfer)
+            })
+            
+        except StockTransfer.DoesNotExist:
+            return JsonResponse({
+                'success': False,
+                'error': 'Phiếu chuyển kho không tồn tại'
+            }, status=404)
+        except (TransferError, CapacityExceededError) as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            return JsonResponse({
+                'success': False,
+                'error': 'Dữ liệu không hợp lệ'
+            }, status=400)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Lỗi server: {str(e)}'
+            }, status=500)
+
+class StockInTransitAPIView(View):
+    """Hàng đang vận chuyển theo tuyến (?source_id, ?destination_id, ?product_id lặp lại được)"""
+    
+    def get(self, request):
+        try:
+            product_ids = [int(pid) for pid in request.GET.getlist('product_id')]
+            rows = in_transit_quantities(
+                request.GET.get('source_id'), request.GET.get('destination_id'), product_ids
+            )
+            return JsonResponse({
+                'success': True,
+                'data': [{
+                    'source_id': row['source_id'],
+                    'destination_id': row['destination_id'],
+                    'product_id': row['product_id'],
+                    'quantity': float(row['quantity'])
+                } for row in rows]
+            })
+            
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Dữ liệu không hợp lệ: {str(e)}'
+            }, status=400)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Lỗi server: {str(e)}'
+            }, status=500)
+
+# Inventory Lot API View
+class InventoryLotAPIListView(View):
+    """Các lô còn hàng của một kho theo thứ tự lấy hàng FEFO (?product_id, ?expiring_within=<số ngày>)"""
+    
+    def get(self, request):
+        try:
+            warehouse_id = request.GET.get('warehouse_id')
+            if not warehouse_id:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Trường warehouse_id là bắt buộc'
+                }, status=400)
+            
+            lots = InventoryLot.objects.select_related('product').filter(
+                warehouse_id=int(warehouse_id), quantity__gt=0
+            )
+            product_id = request.GET.get('product_id')
+            if product_id:
+                lots = lots.filter(product_id=int(product_id))
+            expiring_within = request.GET.get('expiring_within')
+            if expiring_within:
+                lots = lots.filter(
+                    expiry_date__lte=timezone.localdate() + timedelta(days=int(expiring_within))
+                )
+            lots = sorted(lots, key=fefo_key)
+            
+            today = timezone.localdate()
+            data = [{
+                'id': lot.id,
+                'product': {
+                    'id': lot.product.id,
+                    'name': lot.product.name,
+                    'code': lot.product.code
+                },
+                'received_date': lot.received_date.isoformat(),
+                'expiry_date': lot.expiry_date.isoformat() if lot.expiry_date else None,
+                'days_to_expiry': (lot.expiry_date - today).days if lot.expiry_date else None,
+                'initial_quantity': float(lot.initial_quantity),
+                'quantity': float(lot.quantity)
+            } for lot in lots]
+            
+            return JsonResponse({
+                'success': True,
+                'data': data
+            })
+            
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Dữ liệu không hợp lệ: {str(e)}'
+            }, status=400)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Lỗi server: {str(e)}'
+            }, status=500)
+
+# Low Stock Event API View
+class LowStockEventAPIListView(View):
+    """Dòng sự kiện tồn kho thấp, đọc tiếp theo con trỏ ?after=<id cuối đã đọc>"""
+    
+    def get(self, request):
+        try:
+            after = int(request.GET.get('after', 0))
+            limit = min(int(request.GET.get('limit', 100)), 500)
+            
+            events = LowStockEvent.objects.select_related('warehouse', 'product').filter(id__gt=after)
+            warehouse_id = request.GET.get('warehouse_id')
+            if warehouse_id:
+                events = events.filter(warehouse_id=warehouse_id)
+            if request.GET.get('is_low') in ('0', '1'):
+                events = events.filter(is_low=request.GET['is_low'] == '1')
+            events = list(events.order_by('id')[:limit + 1])
+            
+            has_more = len(events) > limit
+            events = events[:limit]
+            data = [{
+                'id': event.id,
+                'is_low': event.is_low,
+                'warehouse': {
+                    'id': event.warehouse.id,
+                    'name': event.warehouse.name,
+                    'code': event.warehouse.code
+                },
+                'product': {
+                    'id': event.product.id,
+                    'name': event.product.name,
+                    'code': event.product.code
+                },
+                'quantity': float(event.quantity),
+                'min_stock_level': float(event.min_stock_level),
+                'created_at': event.created_at.isoformat()
+            } for event in events]
+            
+            return JsonResponse({
+                'success': True,
+                'data': data,
+                'next_cursor': events[-1].id if events else after,
+                'has_more': has_more
+            })
+            
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Dữ liệu không hợp lệ: {str(e)}'
+            }, status=400)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Lỗi server: {str(e)}'
+            }, status=500)
+
+# Stock As-Of API View
+class StockAsOfAPIView(View):
+    """Tồn kho của một kho tại một thời điểm trong quá khứ (ảnh chụp gần nhất + biến động sau đó)"""
+    
+    def get(self, request):
+        try:
+            warehouse_id = request.GET.get('warehouse_id')
+            if not warehouse_id:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Trường warehouse_id là bắt buộc'
+                }, status=400)
+            
+            # ?at=<ISO datetime> hoặc ?date=YYYY-MM-DD (tính đến cuối ngày)
+            at = None
+            if request.GET.get('at'):
+                at = parse_datetime(request.GET['at'])
+            elif request.GET.get('date'):
+                day = parse_date(request.GET['date'])
+                if day:
+                    at = datetime.combine(day, time.max)
+            else:
+                at = timezone.now()
+            if at is None:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Thời điểm không hợp lệ'
+                }, status=400)
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+            
+            warehouse = Warehouse.objects.get(id=warehouse_id)
+            product_ids = [int(pid) for pid in request.GET.getlist('product_id')]
+            stock, base_at = stock_as_of(warehouse.id, at, product_ids or None)
+            products = Product.objects.in_bulk(list(stock))
+            
+            data = []
+            for product_id, row in stock.items():
+                product = products.get(product_id)
+                if product is None:
+                    continue
+                data.append({
+                    'product': {
+                        'id': product.id,
+                        'name': product.name,
+                        'code': product.code
+                    },
+                    'quantity': float(row['quantity']),
+                    'reserved_quantity': float(row['reserved_quantity'])
+                })
+            data.sort(key=lambda item: item['product']['name'])
+            
+            return JsonResponse({
+                'success': True,
+                'warehouse': {
+                    'id': warehouse.id,
+                    'name': warehouse.name,
+                    'code': warehouse.code
+                },
+                'as_of': at.isoformat(),
+                'snapshot_at': base_at.isoformat() if base_at else None,
+                'count': len(data),
+                'data': data
+            })
+            
+        except Warehouse.DoesNotExist:
+            return JsonResponse({
+                'success': False,
+                'error': 'Kho không tồn tại'
+            }, status=404)
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Dữ liệu không hợp lệ: {str(e)}'
+            }, status=400)
         except Exception as e:
             return JsonResponse({
                 'success': False,
@@ -0,0 +1,293 @@
+"""
+Nhập đơn hàng hàng loạt từ file XLSX/CSV.
+
+Mỗi dòng của file là một dòng hàng; các dòng liền nhau cùng mã tham chiếu
+(order_ref) tạo thành một đơn, nên các dòng của một đơn phải nằm liền nhau: dòng
+có mã tham chiếu của một đơn đã đọc xong bị báo lỗi, không tạo đơn thứ hai. File
+được đọc từng dòng (utils/spreadsheets.py), đối tác và sản phẩm được kiểm tra trên
+bảng tra trong bộ nhớ dựng bằng một truy vấn mỗi loại, và chỉ giữ tối đa
+MAX_REPORTED_ERRORS lỗi (các lỗi sau chỉ được đếm).
+
+Mã tham chiếu đã đọc được nhớ dưới dạng digest 8 byte (khoảng 100 byte mỗi đơn),
+tối đa MAX_TRACKED_REFS đơn; file nhiều đơn hơn thì các đơn sau đó chỉ được kiểm
+tra trùng trong cùng lô ghi.
+
+Đơn hợp lệ được gom thành từng lô: số đơn hàng lấy bằng một câu UPDATE bộ đếm
+cho cả lô, đơn và dòng chi tiết được ghi bằng bulk_create trong một transaction.
+Đơn có dòng lỗi bị bỏ qua cả đơn; lỗi được báo theo số dòng của file.
+bulk_create không phát post_save nên chỉ mục tìm kiếm của lô được dựng trực tiếp.
+"""
+import datetime
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from customers.models import Customer
+from farmers.models import Farmer
+from products.models import Product
+from utils.sequences import allocate_numbers
+from utils.spreadsheets import cell, column_map, is_blank, iter_rows
+from .lines import set_order_totals
+from .models import Order, OrderDetail
+from .pricing import to_cents
+from .search import index_orders
+
+HEADER_ALIASES = {
+    'order_ref': 'order_ref',
+    'mã tham chiếu': 'order_ref',
+    'mã đơn': 'order_ref',
+    'order_type': 'order_type',
+    'loại đơn': 'order_type',
+    'partner_code': 'partner_code',
+    'mã đối tác': 'partner_code',
+    'product_code': 'product_code',
+    'mã sản phẩm': 'product_code',
+    'quantity': 'quantity',
+    'số lượng': 'quantity',
+    'unit_price': 'unit_price',
+    'đơn giá': 'unit_price',
+    'discount_rate': 'discount_rate',
+    'giảm giá (%)': 'discount_rate',
+    'delivery_date': 'delivery_date',
+    'ngày giao hàng': 'delivery_date',
+    'shipping_address': 'shipping_address',
+    'địa chỉ giao hàng': 'shipping_address',
+    'shipping_cost': 'shipping_cost',
+    'phí vận chuyển': 'shipping_cost',
+    'notes': 'notes',
+    'ghi chú': 'notes',
+}
+REQUIRED_COLUMNS = ('order_ref', 'partner_code', 'product_code', 'quantity')
+
+IMPORT_BATCH_SIZE = 500  # số đơn mỗi lô ghi
+MAX_REPORTED_ERRORS = 200
+MAX_TRACKED_REFS = 200000
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+
+class ImportRowError(Exception):
+    """Dòng không hợp lệ, thông báo được đưa vào báo cáo lỗi"""
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _decimal(value, label, default=None):
+    if _text(value) == '':
+        if default is None:
+            raise ImportRowError(f'Thiếu {label}')
+        return default
+    try:
+        result = Decimal(_text(value))
+    except InvalidOperation:
+        raise ImportRowError(f'{label.capitalize()} không hợp lệ: {value}')
+    if result < 0:
+        raise ImportRowError(f'{label.capitalize()} không được âm')
+    return result
+
+
+def _date(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(_text(value), date_format).date()
+        except ValueError:
+            continue
+    raise ImportRowError(f'Ngày giao hàng không hợp lệ: {value}')
+
+
+class _Lookups:
+    """Bảng tra mã -> bản ghi của sản phẩm, khách hàng, nông dân đang hoạt động (một truy vấn mỗi bảng)"""
+
+    def __init__(self):
+        self.products = {
+            code: (product_id, selling_price, tax_rate)
+            for code, product_id, selling_price, tax_rate in Product.objects.filter(is_active=True).values_list(
+                'code', 'id', 'selling_price', 'tax_rate'
+            )
+        }
+        self.partners = {
+            'sale': {
+                code: (partner_id, address) for code, partner_id, address in
+                Customer.objects.filter(is_active=True).values_list('customer_code', 'id', 'address')
+            },
+            'purchase': {
+                code: (partner_id, address) for code, partner_id, address in
+                Farmer.objects.filter(is_active=True).values_list('farmer_code', 'id', 'address')
+            },
+        }
+
+
+def _ref_digest(ref):
+    return hashlib.blake2b(ref.encode('utf-8'), digest_size=8).digest()
+
+
+def _build_order(rows, columns, lookups):
+    """
+    Dựng một đơn (chưa lưu) và các dòng chi tiết từ các dòng cùng mã tham chiếu.
+    Trả về (order, details, errors); order là None nếu có dòng lỗi.
+    """
+    first_line, first = rows[0]
+    errors = []
+    order_type = _text(cell(first, columns, 'order_type')).lower() or 'sale'
+    partner_code = _text(cell(first, columns, 'partner_code'))
+    order = details = None
+    try:
+        if order_type not in lookups.partners:
+            raise ImportRowError(f'Loại đơn không hợp lệ: {order_type}')
+        partner = lookups.partners[order_type].get(partner_code)
+        if partner is None:
+            label = 'khách hàng' if order_type == 'sale' else 'nông dân'
+            raise ImportRowError(f'Không tìm thấy {label} mã {partner_code}')
+        order = Order(
+            order_type=order_type,
+            delivery_date=_date(cell(first, columns, 'delivery_date')),
+            shipping_address=_text(cell(first, columns, 'shipping_address')) or partner[1],
+            shipping_cost=to_cents(_decimal(cell(first, columns, 'shipping_cost'), 'phí vận chuyển', Decimal('0'))),
+            notes=_text(cell(first, columns, 'notes')),
+        )
+        if order_type == 'sale':
+            order.customer_id = partner[0]
+        else:
+            order.farmer_id = partner[0]
+    except ImportRowError as e:
+        errors.append({'row': first_line, 'error': str(e)})
+
+    lines = {}
+    for line_number, row in rows:
+        try:
+            if _text(cell(row, columns, 'partner_code')) != partner_code:
+                raise ImportRowError('Mã đối tác khác với dòng đầu của đơn')
+            code = _text(cell(row, columns, 'product_code'))
+            product = lookups.products.get(code)
+            if product is None:
+                raise ImportRowError(f'Không tìm thấy sản phẩm mã {code}')
+            quantity = _decimal(cell(row, columns, 'quantity'), 'số lượng')
+            if not quantity:
+                raise ImportRowError('Số lượng phải lớn hơn 0')
+            unit_price = _decimal(cell(row, columns, 'unit_price'), 'đơn giá', product[1])
+            discount_rate = _decimal(cell(row, columns, 'discount_rate'), 'giảm giá', Decimal('0'))
+        except ImportRowError as e:
+            errors.append({'row': line_number, 'error': str(e)})
+            continue
+        detail = lines.get(product[0])
+        if detail is not None:
+            # Sản phẩm lặp lại trong đơn: cộng số lượng, giữ đơn giá của dòng đầu
+            detail.quantity += to_cents(quantity)
+            continue
+        lines[product[0]] = OrderDetail(
+            product_id=product[0],
+            quantity=to_cents(quantity),
+            unit_price=to_cents(unit_price),
+            discount_rate=discount_rate,
+            tax_rate=product[2],
+        )
+
+    if errors:
+        return None, None, errors
+    details = list(lines.values())
+    set_order_totals(order, details)
+    return order, details, errors
+
+
+def _write_batch(batch, user):
+    """Ghi một lô [(order, details)]: số đơn, bulk_create đơn rồi dòng chi tiết, dựng chỉ mục tìm kiếm"""
+    with transaction.atomic():
+        by_prefix = {}
+        for order, _ in batch:
+            by_prefix.setdefault(Order.number_prefix(order.order_type), []).append(order)
+        for prefix, orders in by_prefix.items():
+            for order, number in zip(orders, allocate_numbers(prefix, len(orders))):
+                order.order_number = number
+                order.created_by = user
+        Order.objects.bulk_create([order for order, _ in batch])
+        # MySQL không trả khóa chính sau bulk_create, đọc lại theo số đơn hàng
+        ids = dict(Order.objects.filter(order_number__in=[order.order_number for order, _ in batch]).values_list(
+            'order_number', 'id'
+        ))
+        details = []
+        for order, order_details in batch:
+            order.id = ids[order.order_number]
+            for detail in order_details:
+                detail.order_id = order.id
+            details.extend(order_details)
+        OrderDetail.objects.bulk_create(details, batch_size=1000)
+        index_orders(ids.values())
+    return len(details)
+
+
+def import_orders(uploaded_file, user=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Nhập đơn hàng từ file tải lên.
+    Trả về {'orders', 'lines', 'rejected_orders', 'error_count', 'errors': [{'row', 'error'}]};
+    errors chỉ gồm tối đa MAX_REPORTED_ERRORS lỗi đầu tiên.
+    """
+    rows = iter_rows(uploaded_file)
+    columns = column_map(next(rows, None), HEADER_ALIASES, REQUIRED_COLUMNS)
+    lookups = _Lookups()
+
+    result = {'orders': 0, 'lines': 0, 'rejected_orders': 0, 'error_count': 0, 'errors': []}
+    batch = []
+    group_ref, group = None, []
+    closed_refs = set()  # digest mã tham chiếu của các đơn đã đọc xong, tối đa MAX_TRACKED_REFS
+    batch_refs = set()   # mã tham chiếu của lô đang gom
+
+    def report(errors):
+        result['error_count'] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(result['errors'])
+        if room > 0:
+            result['errors'].extend(errors[:room])
+
+    def is_closed(ref):
+        return ref in batch_refs or _ref_digest(ref) in closed_refs
+
+    def finish_group():
+        if not group:
+            return
+        batch_refs.add(group_ref)
+        if len(closed_refs) < MAX_TRACKED_REFS:
+            closed_refs.add(_ref_digest(group_ref))
+        order, details, errors = _build_order(group, columns, lookups)
+        if order is None:
+            result['rejected_orders'] += 1
+            report(errors)
+            return
+        order.internal_notes = f'Nhập từ file {uploaded_file.name}, mã tham chiếu {group_ref}'
+        batch.append((order, details))
+        if len(batch) >= batch_size:
+            flush()
+
+    def flush():
+        if batch:
+            result['lines'] += _write_batch(batch, user)
+            result['orders'] += len(batch)
+            batch.clear()
+            batch_refs.clear()
+
+    for line_number, row in enumerate(rows, start=2):
+        if is_blank(row):
+            continue
+        ref = _text(cell(row, columns, 'order_ref'))
+        if not ref:
+            report([{'row': line_number, 'error': 'Thiếu mã tham chiếu đơn hàng'}])
+            continue
+        if ref != group_ref:
+            finish_group()
+            group_ref, group = None, []
+            if is_closed(ref):
+                report([{'row': line_number, 'error': f'Các dòng của đơn {ref} phải nằm liền nhau'}])
+                continue
+            group_ref = ref
+        group.append((line_number, row))
+    finish_group()
+    flush()
+
+    result['errors'].sort(key=lambda e: e['row'])
+    return result
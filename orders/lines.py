@@ -0,0 +1,63 @@
+"""
+Dựng và ghi các dòng chi tiết đơn hàng theo lô.
+
+Sản phẩm của mọi dòng được đọc bằng một truy vấn; số lượng, thành tiền và tổng
+đơn tính bằng Decimal qua orders/pricing.py (thuế suất lấy từ sản phẩm); các
+dòng được ghi bằng một lần bulk_create sau khi đơn đã có khóa chính.
+"""
+from decimal import Decimal
+
+from products.models import Product
+from .models import OrderDetail
+from .pricing import ZERO, price_order, to_cents
+
+
+def build_order_details(items):
+    """
+    items = [{'product_id', 'quantity', 'unit_price', 'discount_rate'}], unit_price None thì lấy
+    giá bán, discount_rate (%) không bắt buộc.
+    Trả về (các OrderDetail chưa gắn đơn, các product_id không tồn tại).
+    Mỗi sản phẩm chỉ có một dòng chi tiết: các dòng trùng sản phẩm được cộng số lượng
+    và giữ đơn giá của dòng đầu tiên.
+    """
+    products = Product.objects.only('id', 'selling_price', 'tax_rate').in_bulk({item['product_id'] for item in items})
+    details, missing = {}, []
+    for item in items:
+        product = products.get(item['product_id'])
+        if product is None:
+            missing.append(item['product_id'])
+            continue
+        quantity = to_cents(item['quantity'])
+        detail = details.get(product.id)
+        if detail is not None:
+            detail.quantity += quantity
+            continue
+        unit_price = item.get('unit_price')
+        details[product.id] = OrderDetail(
+            product=product,
+            quantity=quantity,
+            unit_price=product.selling_price if unit_price is None else to_cents(unit_price),
+            discount_rate=Decimal(str(item.get('discount_rate') or 0)),
+            tax_rate=product.tax_rate,
+        )
+    return list(details.values()), missing
+
+
+def set_order_totals(order, details, discount_percent=None, discount_amount=None):
+    """
+    Tính giá các dòng và gán subtotal, tax_amount, discount_amount, total_amount của đơn (chưa lưu).
+    Giảm giá cấp đơn là discount_amount, hoặc discount_percent (%) của subtotal.
+    """
+    order.discount_amount = ZERO
+    price_order(order, details)
+    if discount_amount is None:
+        discount_amount = order.subtotal * Decimal(str(discount_percent or 0)) / 100
+    order.discount_amount = to_cents(discount_amount)
+    order.total_amount -= order.discount_amount
+
+
+def save_order_details(order, details):
+    """Ghi các dòng chi tiết của một đơn đã lưu bằng một lần bulk_create"""
+    for detail in details:
+        detail.order = order
+    return OrderDetail.objects.bulk_create(details)
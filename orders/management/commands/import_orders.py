@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.importer import IMPORT_BATCH_SIZE, import_orders
+from utils.spreadsheets import SpreadsheetError
+
+
+class Command(BaseCommand):
+    help = 'Nhập đơn hàng hàng loạt từ file .xlsx hoặc .csv (mỗi dòng một dòng hàng, gom theo mã tham chiếu)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Đường dẫn file .xlsx/.csv')
+        parser.add_argument('--user', help='Tên đăng nhập ghi vào người tạo đơn')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help=f'Số đơn mỗi lô ghi, mặc định {IMPORT_BATCH_SIZE}')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'Không tìm thấy người dùng {options["user"]}')
+        try:
+            with open(options['path'], 'rb') as uploaded_file:
+                result = import_orders(uploaded_file, user, batch_size=options['batch_size'])
+        except (OSError, SpreadsheetError) as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stderr.write(f'Dòng {error["row"]}: {error["error"]}')
+        if result['error_count'] > len(result['errors']):
+            self.stderr.write(f'... và {result["error_count"] - len(result["errors"])} lỗi khác')
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã nhập {result["orders"]} đơn hàng ({result["lines"]} dòng), bỏ qua {result["rejected_orders"]} đơn lỗi'
+        ))
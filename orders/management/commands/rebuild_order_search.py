@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import Order
+from orders.search import INDEX_BATCH_SIZE, index_order_queryset
+
+
+class Command(BaseCommand):
+    help = 'Dựng lại chỉ mục tìm kiếm của mọi đơn hàng (chạy sau khi thêm bảng chỉ mục hoặc nhập dữ liệu trực tiếp)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=INDEX_BATCH_SIZE,
+                            help=f'Số đơn mỗi lô, mặc định {INDEX_BATCH_SIZE}')
+
+    def handle(self, *args, **options):
+        count = index_order_queryset(Order.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Đã dựng lại chỉ mục tìm kiếm cho {count} đơn hàng'))
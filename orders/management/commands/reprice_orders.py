@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from orders.pricing import REPRICE_BATCH_SIZE, reprice_orders
+
+
+class Command(BaseCommand):
+    help = 'Tính lại thuế, thành tiền và tổng tiền của các đơn còn mở theo thuế suất hiện hành của sản phẩm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', dest='products',
+                            help='Chỉ tính lại các đơn có sản phẩm này (có thể lặp lại), mặc định mọi đơn còn mở')
+        parser.add_argument('--batch-size', type=int, default=REPRICE_BATCH_SIZE,
+                            help=f'Số đơn mỗi lô, mặc định {REPRICE_BATCH_SIZE}')
+
+    def handle(self, *args, **options):
+        count = reprice_orders(product_ids=options['products'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Đã tính lại giá cho {count} đơn hàng'))
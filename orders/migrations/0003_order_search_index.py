@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_alter_order_order_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSearchIndex',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='orders.order', verbose_name='Đơn hàng')),
+                ('order_number', models.CharField(db_index=True, max_length=50, verbose_name='Số đơn hàng')),
+                ('partner_name', models.CharField(blank=True, max_length=200, verbose_name='Tên đối tác')),
+                ('tracking_number', models.CharField(blank=True, db_index=True, max_length=100, verbose_name='Số vận đơn')),
+                ('phone', models.CharField(blank=True, db_index=True, max_length=20, verbose_name='Số điện thoại')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Cập nhật cuối')),
+            ],
+            options={
+                'verbose_name': 'Chỉ mục tìm kiếm đơn hàng',
+                'verbose_name_plural': 'Chỉ mục tìm kiếm đơn hàng',
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, verbose_name='Từ khóa')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='orders.order', verbose_name='Đơn hàng')),
+            ],
+            options={
+                'verbose_name': 'Từ khóa tìm kiếm đơn hàng',
+                'verbose_name_plural': 'Từ khóa tìm kiếm đơn hàng',
+                'indexes': [models.Index(fields=['token', 'order'], name='orders_orde_token_87308f_idx')],
+                'unique_together': {('order', 'token')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordertracking',
+            name='recorded_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Thời điểm ghi nhận vị trí'),
+        ),
+        migrations.AddIndex(
+            model_name='ordertracking',
+            index=models.Index(fields=['order', 'tracking_type', 'recorded_at'], name='orders_orde_order_i_34921e_idx'),
+        ),
+    ]
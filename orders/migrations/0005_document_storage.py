@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:38
+
+from django.db import migrations, models
+import utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_tracking_recorded_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderdocument',
+            name='file',
+            field=models.FileField(max_length=255, storage=utils.storage.get_document_storage, upload_to='order_documents/', verbose_name='File'),
+        ),
+    ]
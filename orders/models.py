@@ -4,6 +4,8 @@ from products.models import Product
 from farmers.models import Farmer
 from customers.models import Customer
 from accounts.models import User
+from utils.sequences import allocate_number
+from utils.storage import get_document_storage
 
 class Order(models.Model):
     """Đơn hàng"""
@@ -105,25 +107,23 @@ class Order(models.Model):
             return self.customer.name
         return "Không rõ"
         
+    NUMBER_PREFIXES = {
+        'purchase': 'PO',
+        'sale': 'SO', 
+        'export': 'EO',
+        'internal': 'IO'
+    }
+    
+    @classmethod
+    def number_prefix(cls, order_type):
+        return cls.NUMBER_PREFIXES.get(order_type, 'OR')
+        
     def save(self, *args, **kwargs):
         if not self.order_number:
             # Tự động tạo số đơn hàng
-            prefix_map = {
-                'purchase': 'PO',
-                'sale': 'SO', 
-                'export': 'EO',
-                'internal': 'IO'
-            }
-            prefix = prefix_map.get(self.order_type, 'OR')
-            last_order = Order.objects.filter(order_type=self.order_type).order_by('-id').first()
-            if last_order and last_order.order_number:
-                try:
-                    number = int(last_order.order_number.split('-')[-1]) + 1
-                except:
-                    number = 1
-            else:
-                number = 1
-            self.order_number = f"{prefix}-{number:06d}"
+            prefix = self.number_prefix(self.order_type)
+            # Bộ đếm theo (tiền tố, ngày), an toàn khi nhiều đơn được tạo đồng thời
+            self.order_number = allocate_number(prefix)
         super().save(*args, **kwargs)
 
 class OrderDetail(models.Model):
@@ -143,7 +143,8 @@ class OrderDetail(models.Model):
         unique_together = ['order', 'product']
         
     def save(self, *args, **kwargs):
-        self.total_price = self.quantity * self.unit_price
+        from .pricing import price_line
+        self.total_price = price_line(self.quantity, self.unit_price, self.discount_rate, self.tax_rate).total
         super().save(*args, **kwargs)
         
     def __str__(self):
@@ -184,6 +185,7 @@ class OrderTracking(models.Model):
     location = models.CharField(max_length=200, blank=True, verbose_name="Vị trí")
     latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True, verbose_name="Vĩ độ")
     longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True, verbose_name="Kinh độ")
+    recorded_at = models.DateTimeField(null=True, blank=True, verbose_name="Thời điểm ghi nhận vị trí")
     
     # Thông tin người thực hiện
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="Người tạo")
@@ -197,6 +199,9 @@ class OrderTracking(models.Model):
         verbose_name = "Theo dõi đơn hàng"
         verbose_name_plural = "Theo dõi đơn hàng"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['order', 'tracking_type', 'recorded_at']),
+        ]
         
     def __str__(self):
         return f"{self.order.order_number} - {self.title}"
@@ -215,7 +220,7 @@ class OrderDocument(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='documents')
     document_type = models.CharField(max_length=20, choices=DOCUMENT_TYPE_CHOICES, verbose_name="Loại tài liệu")
     title = models.CharField(max_length=200, verbose_name="Tiêu đề")
-    file = models.FileField(upload_to='order_documents/', verbose_name="File")
+    file = models.FileField(upload_to='order_documents/', storage=get_document_storage, max_length=255, verbose_name="File")
     notes = models.TextField(blank=True, verbose_name="Ghi chú")
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="Người tải lên")
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name="Ngày tải lên")
@@ -226,3 +231,36 @@ class OrderDocument(models.Model):
         
     def __str__(self):
         return f"{self.order.order_number} - {self.title}"
+
+class OrderSearchIndex(models.Model):
+    """Dữ liệu tìm kiếm đã chuẩn hóa của đơn hàng (không dấu, chữ thường), xem orders/search.py"""
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True,
+                                 related_name='search_index', verbose_name="Đơn hàng")
+    order_number = models.CharField(max_length=50, db_index=True, verbose_name="Số đơn hàng")
+    partner_name = models.CharField(max_length=200, blank=True, verbose_name="Tên đối tác")
+    tracking_number = models.CharField(max_length=100, blank=True, db_index=True, verbose_name="Số vận đơn")
+    phone = models.CharField(max_length=20, blank=True, db_index=True, verbose_name="Số điện thoại")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Cập nhật cuối")
+    
+    class Meta:
+        verbose_name = "Chỉ mục tìm kiếm đơn hàng"
+        verbose_name_plural = "Chỉ mục tìm kiếm đơn hàng"
+        
+    def __str__(self):
+        return f"{self.order_number} - {self.partner_name}"
+
+class OrderSearchToken(models.Model):
+    """Từ khóa tìm kiếm của đơn hàng, tra theo tiền tố trên chỉ mục (token, order)"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='search_tokens', verbose_name="Đơn hàng")
+    token = models.CharField(max_length=64, verbose_name="Từ khóa")
+    
+    class Meta:
+        verbose_name = "Từ khóa tìm kiếm đơn hàng"
+        verbose_name_plural = "Từ khóa tìm kiếm đơn hàng"
+        unique_together = ['order', 'token']
+        indexes = [
+            models.Index(fields=['token', 'order']),
+        ]
+        
+    def __str__(self):
+        return f"{self.order_id}: {self.token}"
@@ -0,0 +1,165 @@
+"""
+Nhận vị trí GPS của xe giao hàng theo lô.
+
+Mỗi lô gồm nhiều điểm (order_id, latitude, longitude, recorded_at). Điểm của từng
+đơn được sắp theo thời gian và lọc bớt: chỉ giữ điểm cách điểm đã giữ trước đó ít
+nhất TRACKING_MIN_DISTANCE_M mét, hoặc sau ít nhất TRACKING_MAX_INTERVAL_SECONDS
+giây; điểm cũ hơn vị trí đã biết bị bỏ. Các điểm được giữ của cả lô ghi bằng một
+lần bulk_create OrderTracking (location_update).
+
+Vị trí mới nhất của mỗi đơn được giữ trong cache (cũng là mốc để lọc lô sau), nên
+trang theo dõi đọc vị trí hiện tại mà không truy vấn lịch sử; chỉ khi cache trống
+mới đọc dòng location_update cuối cùng.
+"""
+import math
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Order, OrderTracking
+
+POSITION_KEY = 'orders:position:{}'
+POSITION_TIMEOUT = 60 * 60 * 24
+MAX_PINGS_PER_BATCH = 5000
+EARTH_RADIUS_M = 6371000
+
+
+class PingError(Exception):
+    """Điểm GPS không hợp lệ"""
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """Khoảng cách (mét) giữa hai tọa độ theo công thức haversine"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _coordinate(value, label, limit):
+    try:
+        result = Decimal(str(value)).quantize(Decimal('0.00000001'))
+    except (InvalidOperation, TypeError, ValueError):
+        raise PingError(f'{label} không hợp lệ')
+    if not -limit <= result <= limit:
+        raise PingError(f'{label} phải trong khoảng [-{limit}, {limit}]')
+    return result
+
+
+def parse_ping(data, now=None):
+    """dict của client -> dict đã chuẩn hóa; recorded_at không có thì lấy thời điểm nhận"""
+    try:
+        order_id = int(data['order_id'])
+    except (KeyError, TypeError, ValueError):
+        raise PingError('order_id không hợp lệ')
+    recorded_at = now or timezone.now()
+    if data.get('recorded_at'):
+        recorded_at = parse_datetime(str(data['recorded_at']))
+        if recorded_at is None:
+            raise PingError('recorded_at không hợp lệ')
+        if timezone.is_naive(recorded_at):
+            recorded_at = timezone.make_aware(recorded_at)
+    return {
+        'order_id': order_id,
+        'latitude': _coordinate(data.get('latitude'), 'Vĩ độ', 90),
+        'longitude': _coordinate(data.get('longitude'), 'Kinh độ', 180),
+        'recorded_at': recorded_at,
+        'location': str(data.get('location') or '')[:200],
+    }
+
+
+def _cached_position(position):
+    return {
+        'latitude': str(position['latitude']),
+        'longitude': str(position['longitude']),
+        'recorded_at': position['recorded_at'].isoformat(),
+        'location': position['location'],
+    }
+
+
+def _should_keep(last, ping, min_distance, max_interval):
+    if last is None:
+        return True
+    last_time = datetime.fromisoformat(last['recorded_at'])
+    if ping['recorded_at'] <= last_time:
+        return False
+    if (ping['recorded_at'] - last_time).total_seconds() >= max_interval:
+        return True
+    return distance_m(
+        float(last['latitude']), float(last['longitude']), float(ping['latitude']), float(ping['longitude'])
+    ) >= min_distance
+
+
+def ingest_pings(pings, user=None):
+    """
+    Lọc và lưu một lô điểm GPS.
+    Trả về {'received', 'stored', 'dropped', 'errors': [{'index', 'error'}]}.
+    """
+    if len(pings) > MAX_PINGS_PER_BATCH:
+        raise PingError(f'Mỗi lô tối đa {MAX_PINGS_PER_BATCH} điểm')
+    now = timezone.now()
+    errors, parsed = [], []
+    for index, data in enumerate(pings):
+        try:
+            parsed.append((index, parse_ping(data, now)))
+        except PingError as e:
+            errors.append({'index': index, 'error': str(e)})
+
+    existing = set(Order.objects.filter(id__in={ping['order_id'] for _, ping in parsed}).values_list('id', flat=True))
+    for index, ping in parsed:
+        if ping['order_id'] not in existing:
+            errors.append({'index': index, 'error': f'Đơn hàng ID {ping["order_id"]} không tồn tại'})
+    parsed = [ping for _, ping in parsed if ping['order_id'] in existing]
+
+    min_distance = getattr(settings, 'TRACKING_MIN_DISTANCE_M', 50)
+    max_interval = getattr(settings, 'TRACKING_MAX_INTERVAL_SECONDS', 300)
+    latest = cache.get_many([POSITION_KEY.format(order_id) for order_id in existing])
+    kept, changed = [], {}
+    for ping in sorted(parsed, key=lambda p: (p['order_id'], p['recorded_at'])):
+        key = POSITION_KEY.format(ping['order_id'])
+        if _should_keep(latest.get(key), ping, min_distance, max_interval):
+            latest[key] = changed[key] = _cached_position(ping)
+            kept.append(ping)
+
+    OrderTracking.objects.bulk_create([
+        OrderTracking(
+            order_id=ping['order_id'],
+            tracking_type='location_update',
+            title='Cập nhật vị trí',
+            description='',
+            location=ping['location'],
+            latitude=ping['latitude'],
+            longitude=ping['longitude'],
+            recorded_at=ping['recorded_at'],
+            created_by=user,
+            is_public=False,
+        )
+        for ping in kept
+    ], batch_size=1000)
+    cache.set_many(changed, POSITION_TIMEOUT)
+    return {
+        'received': len(pings),
+        'stored': len(kept),
+        'dropped': len(parsed) - len(kept),
+        'errors': sorted(errors, key=lambda e: e['index']),
+    }
+
+
+def latest_position(order_id):
+    """Vị trí mới nhất của đơn (dict) hoặc None; đọc cache, chỉ truy vấn khi cache trống"""
+    key = POSITION_KEY.format(order_id)
+    position = cache.get(key)
+    if position is None:
+        tracking = OrderTracking.objects.filter(
+            order_id=order_id, tracking_type='location_update', recorded_at__isnull=False
+        ).order_by('-recorded_at').values('latitude', 'longitude', 'recorded_at', 'location').first()
+        if tracking is None:
+            return None
+        position = _cached_position(tracking)
+        cache.set(key, position, POSITION_TIMEOUT)
+    return position
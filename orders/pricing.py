@@ -0,0 +1,104 @@
+"""
+Tính giá đơn hàng.
+
+Mỗi dòng: thành tiền gộp = số lượng * đơn giá, giảm giá theo discount_rate (%),
+thành tiền (total_price) = gộp - giảm giá, thuế = thành tiền * tax_rate (%).
+Mỗi đơn: subtotal = tổng thành tiền các dòng, tax_amount = tổng thuế các dòng,
+total_amount = subtotal + tax_amount + shipping_cost - discount_amount
+(discount_amount là giảm giá cấp đơn). Mọi số tiền làm tròn đến 0.01 theo
+từng dòng rồi mới cộng, nên tổng đơn luôn bằng tổng các dòng đã hiển thị.
+
+reprice_orders() tính lại hàng loạt các đơn còn mở khi thuế suất sản phẩm thay đổi.
+"""
+from collections import defaultdict, namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Order, OrderDetail
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0')
+HUNDRED = Decimal('100')
+
+# Đơn chưa giao có thể tính lại theo thuế suất mới
+REPRICEABLE_STATUSES = ('draft', 'confirmed', 'processing', 'picking', 'packed')
+REPRICE_BATCH_SIZE = 500
+
+LinePrice = namedtuple('LinePrice', 'gross discount total tax')
+OrderPrice = namedtuple('OrderPrice', 'subtotal tax_amount total_amount')
+
+
+def to_cents(value):
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def price_line(quantity, unit_price, discount_rate=ZERO, tax_rate=ZERO):
+    """Giá một dòng: (gộp, giảm giá, thành tiền trước thuế, thuế)"""
+    gross = to_cents(Decimal(str(quantity)) * Decimal(str(unit_price)))
+    discount = to_cents(gross * Decimal(str(discount_rate or 0)) / HUNDRED)
+    total = gross - discount
+    tax = to_cents(total * Decimal(str(tax_rate or 0)) / HUNDRED)
+    return LinePrice(gross, discount, total, tax)
+
+
+def price_order(order, details):
+    """
+    Tính giá các dòng và tổng đơn trong một lượt: gán detail.total_price và
+    order.subtotal, order.tax_amount, order.total_amount (chưa lưu).
+    """
+    subtotal = tax_amount = ZERO
+    for detail in details:
+        line = price_line(detail.quantity, detail.unit_price, detail.discount_rate, detail.tax_rate)
+        detail.total_price = line.total
+        subtotal += line.total
+        tax_amount += line.tax
+    order.subtotal = subtotal
+    order.tax_amount = tax_amount
+    order.total_amount = subtotal + tax_amount + (order.shipping_cost or ZERO) - (order.discount_amount or ZERO)
+    return OrderPrice(order.subtotal, order.tax_amount, order.total_amount)
+
+
+def reprice_orders(product_ids=None, order_ids=None, statuses=REPRICEABLE_STATUSES, batch_size=REPRICE_BATCH_SIZE):
+    """
+    Lấy lại thuế suất hiện hành của sản phẩm cho các dòng và tính lại giá các đơn còn mở.
+    product_ids: chỉ các đơn có sản phẩm này (ví dụ sản phẩm vừa đổi thuế suất).
+    Mỗi lô batch_size đơn: khóa đơn, đọc các dòng bằng một truy vấn, ghi bằng bulk_update.
+    Trả về số đơn có thay đổi.
+    """
+    orders = Order.objects.filter(status__in=statuses)
+    if order_ids:
+        orders = orders.filter(id__in=order_ids)
+    if product_ids:
+        orders = orders.filter(id__in=OrderDetail.objects.filter(product_id__in=product_ids).values('order_id'))
+    ids = list(orders.order_by('id').values_list('id', flat=True))
+
+    changed = 0
+    for i in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            batch = list(Order.objects.select_for_update().filter(id__in=ids[i:i + batch_size]).order_by('id').only(
+                'id', 'shipping_cost', 'discount_amount', 'subtotal', 'tax_amount', 'total_amount'
+            ))
+            lines = defaultdict(list)
+            for detail in OrderDetail.objects.filter(order_id__in=[order.id for order in batch]).only(
+                'id', 'order_id', 'quantity', 'unit_price', 'discount_rate', 'tax_rate', 'total_price'
+            ).annotate(product_tax_rate=F('product__tax_rate')).order_by('id'):
+                lines[detail.order_id].append(detail)
+
+            orders_to_update, details_to_update = [], []
+            for order in batch:
+                details = lines[order.id]
+                before = [(detail.tax_rate, detail.total_price) for detail in details]
+                for detail in details:
+                    detail.tax_rate = detail.product_tax_rate
+                old_price = (order.subtotal, order.tax_amount, order.total_amount)
+                if tuple(price_order(order, details)) != old_price:
+                    orders_to_update.append(order)
+                    changed += 1
+                details_to_update.extend(
+                    detail for detail, old in zip(details, before) if (detail.tax_rate, detail.total_price) != old
+                )
+            OrderDetail.objects.bulk_update(details_to_update, ['tax_rate', 'total_price'], batch_size=1000)
+            Order.objects.bulk_update(orders_to_update, ['subtotal', 'tax_amount', 'total_amount'], batch_size=1000)
+    return changed
@@ -0,0 +1,109 @@
+"""
+Tìm kiếm đơn hàng trên bảng chỉ mục đã chuẩn hóa.
+
+OrderSearchIndex giữ số đơn hàng, số vận đơn (dạng liền, không dấu), tên đối tác
+(không dấu, chữ thường) và số điện thoại (chỉ chữ số) của từng đơn.
+OrderSearchToken giữ các từ khóa của đơn: số đơn hàng và số vận đơn (cả dạng liền
+lẫn từng phần), từng từ của tên đối tác, số điện thoại của đối tác và người nhận.
+
+Mỗi từ của chuỗi tìm kiếm là một lần tra tiền tố trên chỉ mục (token, order), các
+từ kết hợp bằng AND, nên không phải quét bảng đơn hàng hay join sang nông dân /
+khách hàng. Chỉ mục được cập nhật bởi orders/signals.py; dữ liệu cũ được dựng lại
+bằng lệnh rebuild_order_search.
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from utils.text import compact_text, digits_only, fold_text
+from .models import Order, OrderSearchIndex, OrderSearchToken
+
+TOKEN_LENGTH = OrderSearchToken._meta.get_field('token').max_length
+INDEX_BATCH_SIZE = 1000
+MAX_TERMS = 5
+
+
+def _code_tokens(value):
+    """'SO-20261018-0001' -> {'so202610180001', 'so', '20261018', '0001'}"""
+    tokens = set(fold_text(value).split())
+    tokens.add(compact_text(value))
+    return tokens
+
+
+def _phone_tokens(value):
+    digits = digits_only(value)
+    tokens = {digits}
+    if digits.startswith('84'):
+        tokens.add('0' + digits[2:])
+    return tokens
+
+
+def build_search_entry(order):
+    """(OrderSearchIndex, các từ khóa) của một đơn, partner đã được select_related"""
+    if order.farmer_id:
+        partner_name, partner_phone = order.farmer.name, order.farmer.phone
+    elif order.customer_id:
+        partner_name, partner_phone = order.customer.full_name, order.customer.phone
+    else:
+        partner_name = partner_phone = ''
+    entry = OrderSearchIndex(
+        order=order,
+        order_number=compact_text(order.order_number),
+        partner_name=fold_text(partner_name),
+        tracking_number=compact_text(order.tracking_number),
+        phone=digits_only(partner_phone or order.shipping_phone),
+    )
+    tokens = set(entry.partner_name.split())
+    tokens |= _code_tokens(order.order_number)
+    tokens |= _code_tokens(order.tracking_number)
+    tokens |= _phone_tokens(partner_phone)
+    tokens |= _phone_tokens(order.shipping_phone)
+    return entry, {token[:TOKEN_LENGTH] for token in tokens if token}
+
+
+def index_orders(order_ids):
+    """Dựng lại chỉ mục tìm kiếm của các đơn: xóa dòng cũ và ghi lại bằng bulk_create"""
+    order_ids = list(order_ids)
+    if not order_ids:
+        return 0
+    orders = Order.objects.filter(id__in=order_ids).select_related('farmer', 'customer').only(
+        'id', 'order_number', 'tracking_number', 'shipping_phone', 'farmer', 'customer',
+        'farmer__name', 'farmer__phone', 'customer__full_name', 'customer__phone',
+    )
+    entries, tokens = [], []
+    for order in orders:
+        entry, order_tokens = build_search_entry(order)
+        entries.append(entry)
+        tokens.extend(OrderSearchToken(order_id=order.id, token=token) for token in order_tokens)
+
+    with transaction.atomic():
+        OrderSearchToken.objects.filter(order_id__in=order_ids).delete()
+        OrderSearchIndex.objects.filter(order_id__in=order_ids).delete()
+        OrderSearchIndex.objects.bulk_create(entries, batch_size=INDEX_BATCH_SIZE)
+        OrderSearchToken.objects.bulk_create(tokens, batch_size=INDEX_BATCH_SIZE)
+    return len(entries)
+
+
+def index_order_queryset(queryset, batch_size=INDEX_BATCH_SIZE):
+    """Dựng lại chỉ mục cho mọi đơn của queryset theo từng lô, trả về số đơn đã ghi"""
+    ids = list(queryset.order_by('id').values_list('id', flat=True))
+    return sum(index_orders(ids[i:i + batch_size]) for i in range(0, len(ids), batch_size))
+
+
+def search_orders(queryset, query):
+    """
+    Lọc queryset đơn hàng theo chuỗi tìm kiếm (không phân biệt dấu, hoa thường).
+    Mỗi từ phải là tiền tố của một từ khóa của đơn; chuỗi nhiều từ như số điện
+    thoại có khoảng trắng ('0901 234 567') cũng được so khớp ở dạng liền.
+    """
+    terms = fold_text(query).split()[:MAX_TERMS]
+    if not terms:
+        return queryset
+    # Từ khóa đã lưu ở dạng chữ thường; istartswith là LIKE 'x%' dùng được chỉ mục trên MySQL,
+    # còn startswith (LIKE BINARY) thì không
+    matched = Q()
+    for term in terms:
+        matched &= Q(id__in=OrderSearchToken.objects.filter(token__istartswith=term[:TOKEN_LENGTH]).values('order_id'))
+    if len(terms) > 1:
+        compact = compact_text(query)[:TOKEN_LENGTH]
+        matched |= Q(id__in=OrderSearchToken.objects.filter(token__istartswith=compact).values('order_id'))
+    return queryset.filter(matched)
@@ -0,0 +1,142 @@
+"""
+Dữ liệu JSON đầy đủ của một đơn hàng cho API chi tiết.
+
+order_aggregate_queryset() đọc đơn cùng nông dân/khách hàng bằng select_related
+và các dòng chi tiết (kèm sản phẩm), lịch sử trạng thái, thanh toán bằng
+prefetch_related: luôn 4 truy vấn, bất kể đơn có bao nhiêu dòng.
+
+order_etag() tính phiên bản của đơn bằng một truy vấn (updated_at của đơn và
+đối tác, cùng số lượng/thời điểm thay đổi của các bảng con), để API trả 304 cho
+đơn không đổi mà không phải đọc và dựng JSON.
+"""
+import hashlib
+
+from django.db.models import Count, IntegerField, Max, OuterRef, Prefetch, Subquery, Sum
+
+from payments.models import Payment
+from .models import Order, OrderDetail, OrderStatusHistory
+
+
+def order_aggregate_queryset():
+    return Order.objects.select_related('farmer', 'customer').prefetch_related(
+        Prefetch('details', queryset=OrderDetail.objects.select_related('product').order_by('id')),
+        Prefetch('status_history', queryset=OrderStatusHistory.objects.select_related('changed_by')),
+        Prefetch('payments', queryset=Payment.objects.order_by('payment_date', 'id')),
+    )
+
+
+def _child_aggregate(queryset, aggregate, output_field=None):
+    """Subquery giá trị tổng hợp của bảng con theo từng đơn"""
+    return Subquery(
+        queryset.filter(order=OuterRef('pk')).order_by().values('order').annotate(value=aggregate).values('value'),
+        output_field=output_field,
+    )
+
+
+def order_version(pk):
+    """Bộ giá trị đổi khi đơn, đối tác hoặc bảng con thay đổi; None nếu đơn không tồn tại"""
+    details = OrderDetail.objects.all()
+    history = OrderStatusHistory.objects.all()
+    payments = Payment.objects.all()
+    return Order.objects.filter(pk=pk).annotate(
+        details_count=_child_aggregate(details, Count('id'), IntegerField()),
+        details_max_id=_child_aggregate(details, Max('id')),
+        details_total=_child_aggregate(details, Sum('total_price')),
+        details_quantity=_child_aggregate(details, Sum('quantity')),
+        products_updated=_child_aggregate(details, Max('product__updated_at')),
+        history_count=_child_aggregate(history, Count('id'), IntegerField()),
+        history_changed=_child_aggregate(history, Max('changed_at')),
+        payments_count=_child_aggregate(payments, Count('id'), IntegerField()),
+        payments_updated=_child_aggregate(payments, Max('updated_at')),
+    ).values_list(
+        'updated_at', 'total_amount', 'farmer__updated_at', 'customer__updated_at',
+        'details_count', 'details_max_id', 'details_total', 'details_quantity', 'products_updated',
+        'history_count', 'history_changed', 'payments_count', 'payments_updated',
+    ).first()
+
+
+def order_etag(request, pk):
+    """etag_func cho django.views.decorators.http.condition"""
+    version = order_version(pk)
+    if version is None:
+        return None
+    return hashlib.md5(repr(version).encode()).hexdigest()
+
+
+def _decimal(value):
+    return float(value) if value is not None else None
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def serialize_partner(order):
+    if order.farmer_id:
+        return {'id': order.farmer.id, 'name': order.farmer.name, 'type': 'farmer', 'code': order.farmer.farmer_code}
+    if order.customer_id:
+        return {'id': order.customer.id, 'name': order.customer.full_name, 'type': 'customer',
+                'code': order.customer.customer_code}
+    return {'id': None, 'name': 'N/A', 'type': None, 'code': 'N/A'}
+
+
+def serialize_order(order):
+    """Đơn lấy từ order_aggregate_queryset() -> dict, không phát sinh thêm truy vấn"""
+    return {
+        'id': order.id,
+        'order_number': order.order_number,
+        'order_type': order.order_type,
+        'partner': serialize_partner(order),
+        'delivery_date': _isoformat(order.delivery_date),
+        'shipping_address': order.shipping_address,
+        'tracking_number': order.tracking_number,
+        'payment_status': order.payment_status,
+        'status': order.status,
+        'subtotal': _decimal(order.subtotal),
+        'tax_amount': _decimal(order.tax_amount),
+        'shipping_cost': _decimal(order.shipping_cost),
+        'discount_amount': _decimal(order.discount_amount),
+        'total_amount': _decimal(order.total_amount),
+        'notes': order.notes,
+        'created_at': _isoformat(order.created_at),
+        'updated_at': _isoformat(order.updated_at),
+        'order_details': [
+            {
+                'id': detail.id,
+                'product': {
+                    'id': detail.product.id,
+                    'code': detail.product.code,
+                    'name': detail.product.name
+                },
+                'quantity': _decimal(detail.quantity),
+                'unit_price': _decimal(detail.unit_price),
+                'discount_rate': _decimal(detail.discount_rate),
+                'tax_rate': _decimal(detail.tax_rate),
+                'total_price': _decimal(detail.total_price)
+            }
+            for detail in order.details.all()
+        ],
+        'status_history': [
+            {
+                'from_status': history.from_status,
+                'to_status': history.to_status,
+                'notes': history.notes,
+                'changed_by': history.changed_by.username if history.changed_by else None,
+                'changed_at': _isoformat(history.changed_at),
+            }
+            for history in order.status_history.all()
+        ],
+        'payments': [
+            {
+                'id': payment.id,
+                'payment_code': payment.payment_code,
+                'payment_type': payment.payment_type,
+                'payment_method': payment.payment_method,
+                'status': payment.status,
+                'amount': _decimal(payment.amount),
+                'currency': payment.currency,
+                'payment_date': _isoformat(payment.payment_date),
+            }
+            for payment in order.payments.all()
+        ],
+    }
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from customers.models import Customer
+from farmers.models import Farmer
+from .models import Order
+from .search import index_order_queryset, index_orders
+
+
+@receiver(post_save, sender=Order)
+def update_order_search_index(sender, instance, raw=False, **kwargs):
+    """
+    Ghi lại chỉ mục tìm kiếm của đơn sau mỗi lần lưu
+    """
+    if not raw:
+        index_orders([instance.pk])
+
+
+@receiver(post_save, sender=Farmer)
+@receiver(post_save, sender=Customer)
+def update_partner_order_search_index(sender, instance, created, raw=False, **kwargs):
+    """
+    Đổi tên/số điện thoại của nông dân, khách hàng thì dựng lại chỉ mục các đơn của họ
+    """
+    if not created and not raw:
+        index_order_queryset(instance.orders.all())
@@ -1,3 +1,116 @@
+import io
+from decimal import Decimal
+from unittest import mock
+
 from django.test import TestCase
+from django.urls import reverse
+
+from customers.models import Customer
+from products.models import Category, Product, Unit
+from .importer import import_orders
+from .models import Order, OrderDetail, OrderStatusHistory
+from .workflow import can_transition, transition_orders
+
+
+def create_product(code):
+    category, _ = Category.objects.get_or_create(name='Trái cây')
+    unit, _ = Unit.objects.get_or_create(name='Kilogram', defaults={'symbol': 'kg'})
+    return Product.objects.create(
+        code=code, name=f'Sản phẩm {code}', category=category, unit=unit, origin='domestic',
+        quality_grade='A', cost_price=Decimal('10000'), selling_price=Decimal('15000'), shelf_life_days=14,
+    )
+
+
+def create_customer(code):
+    return Customer.objects.create(
+        customer_code=code, full_name=f'Khách hàng {code}', phone='0900000000', email=f'{code.lower()}@example.com',
+        province='Hà Nội', district='Ba Đình', ward='Điện Biên', address='1 Điện Biên Phủ',
+    )
+
+
+def csv_file(lines):
+    uploaded = io.BytesIO('\n'.join(lines).encode())
+    uploaded.name = 'don-hang.csv'
+    return uploaded
+
+
+class WorkflowTests(TestCase):
+    """Bảng chuyển trạng thái và chuyển trạng thái hàng loạt"""
+
+    def test_transition_table(self):
+        self.assertTrue(can_transition('draft', 'confirmed'))
+        self.assertTrue(can_transition('packed', 'shipped'))
+        self.assertFalse(can_transition('draft', 'shipped'))
+        self.assertFalse(can_transition('cancelled', 'confirmed'))
+        self.assertFalse(can_transition('draft', 'khong-ton-tai'))
+
+    def test_invalid_orders_are_reported_and_others_moved(self):
+        valid = Order.objects.create(order_type='sale', shipping_address='Hà Nội')
+        invalid = Order.objects.create(order_type='sale', shipping_address='Hà Nội', status='cancelled')
+
+        changed, errors = transition_orders({valid.id: 'cancelled', invalid.id: 'cancelled', 0: 'cancelled'})
+
+        self.assertEqual(list(changed), [valid.id])
+        self.assertEqual(set(errors), {invalid.id, 0})
+        valid.refresh_from_db()
+        invalid.refresh_from_db()
+        self.assertEqual((valid.status, invalid.status), ('cancelled', 'cancelled'))
+        self.assertEqual(OrderStatusHistory.objects.filter(order=valid, to_status='cancelled').count(), 1)
+        self.assertFalse(OrderStatusHistory.objects.filter(order=invalid, to_status='cancelled').exists())
+
+
+class ImporterTests(TestCase):
+    """Nhập đơn từ file: dòng lỗi được báo theo số dòng, không ghi sai đơn"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = create_customer('KH01')
+        cls.products = [create_product('SP01'), create_product('SP02')]
+
+    def line(self, ref, product, quantity=1):
+        return f'{ref},{self.customer.customer_code},{product.code},{quantity}'
+
+    def test_non_contiguous_ref_is_reported(self):
+        first, second = self.products
+        lines = [
+            'order_ref,partner_code,product_code,quantity',
+            self.line('A', first), self.line('B', first), self.line('A', second), self.line('C', second),
+        ]
+        for batch_size in (500, 1):
+            with self.subTest(batch_size=batch_size):
+                result = import_orders(csv_file(lines), batch_size=batch_size)
+                self.assertEqual(result['orders'], 3)
+                self.assertEqual([error['row'] for error in result['errors']], [4])
+                self.assertEqual(Order.objects.filter(internal_notes__endswith='mã tham chiếu A').count(), 1)
+                Order.objects.all().delete()
+
+    def test_errors_are_capped_and_counted(self):
+        lines = ['order_ref,partner_code,product_code,quantity']
+        lines += [f'R{i},KHONG-CO,SP01,1' for i in range(5)]
+        with mock.patch('orders.importer.MAX_REPORTED_ERRORS', 2):
+            result = import_orders(csv_file(lines))
+        self.assertEqual(result['orders'], 0)
+        self.assertEqual(result['rejected_orders'], 5)
+        self.assertEqual(result['error_count'], 5)
+        self.assertEqual([error['row'] for error in result['errors']], [2, 3])
+
+
+class OrderDetailAPITests(TestCase):
+    """API chi tiết đơn trả 304 khi ETag còn đúng và ETag mới khi đơn thay đổi"""
+
+    def test_etag_round_trip(self):
+        product = create_product('SP03')
+        order = Order.objects.create(order_type='sale', customer=create_customer('KH02'), shipping_address='Hà Nội')
+        OrderDetail.objects.create(order=order, product=product, quantity=Decimal('2'), unit_price=Decimal('15000'))
+        url = reverse('orders:api_detail', args=[order.pk])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
 
-# Create your tests here.
+        OrderDetail.objects.filter(order=order).update(quantity=Decimal('3'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
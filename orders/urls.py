@@ -12,5 +12,9 @@ urlpatterns = [
     
     # API endpoints
     path('api/create/', views.OrderAPICreateView.as_view(), name='api_create'),
+    path('api/import/', views.OrderAPIImportView.as_view(), name='api_import'),
+    path('api/positions/', views.OrderAPIPositionIngestView.as_view(), name='api_positions'),
+    path('api/status/', views.OrderAPIStatusView.as_view(), name='api_status'),
     path('api/<int:pk>/', views.OrderAPIDetailView.as_view(), name='api_detail'),
+    path('api/<int:pk>/position/', views.OrderAPIPositionView.as_view(), name='api_position'),
 ]
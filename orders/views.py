@@ -5,18 +5,29 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.utils import timezone
 from django.db import transaction, models
-from django.db.models import Q
 from django.urls import reverse_lazy
 from django.core import serializers
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from django.utils.decorators import method_decorator
 from django.views import View
+from decimal import Decimal, InvalidOperation
 import json
-from .models import Order, OrderDetail
+import logging
+from .models import Order, OrderDetail, OrderStatusHistory
+from .lines import build_order_details, set_order_totals, save_order_details
+from .workflow import STATUS_LABELS, transition_error, transition_orders
+from .search import search_orders
+from .importer import import_orders
+from .positions import PingError, ingest_pings, latest_position
+from .serializers import order_aggregate_queryset, order_etag, serialize_order
 from farmers.models import Farmer
+from utils.spreadsheets import SpreadsheetError
 from customers.models import Customer
 from products.models import Product
 
+logger = logging.getLogger(__name__)
+
 class OrderListView(LoginRequiredMixin, ListView):
     model = Order
     template_name = 'orders/order_list.html'
@@ -39,12 +50,7 @@ class OrderListView(LoginRequiredMixin, ListView):
         # Search filter
         search = self.request.GET.get('search')
         if search:
-            queryset = queryset.filter(
-                Q(order_code__icontains=search) |
-                Q(farmer__farm_name__icontains=search) |
-                Q(customer__full_name__icontains=search) |
-                Q(notes__icontains=search)
-            )
+            queryset = search_orders(queryset, search)
         
         return queryset.order_by('-created_at')
     
@@ -61,6 +67,7 @@ class OrderDetailView(LoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['order_details'] = OrderDetail.objects.filter(order=self.object).select_related('product')
+        context['latest_position'] = latest_position(self.object.id)
         return context
 
 class OrderCreateView(LoginRequiredMixin, CreateView):
@@ -74,43 +81,22 @@ class OrderCreateView(LoginRequiredMixin, CreateView):
         context['farmers'] = Farmer.objects.filter(is_active=True)
         context['customers'] = Customer.objects.filter(is_active=True)
         
-        # Get products with stock information
-        products_list = []
+        # Get products with stock information (một truy vấn gom nhóm, cache theo phiên bản)
         try:
-            from inventory.models import InventoryStock
-            from django.db.models import Sum
-            
-            products = Product.objects.select_related('unit').filter(is_active=True)
-            for product in products:
-                # Get total stock across all warehouses
-                total_stock = InventoryStock.objects.filter(
-                    product=product
-                ).aggregate(
-                    total=Sum('quantity')
-                )['total'] or 0
-                
-                products_list.append({
-                    'id': product.id,
-                    'name': product.name,
-                    'code': product.code,
-                    'price': float(product.selling_price),
-                    'unit': product.unit.name if product.unit else '',
-                    'stock': float(total_stock)
-                })
+            from inventory.aggregates import product_catalog_json
+            context['products'] = product_catalog_json()
         except ImportError:
             # Fallback if inventory module is not available
             products = Product.objects.select_related('unit').filter(is_active=True)
-            for product in products:
-                products_list.append({
-                    'id': product.id,
-                    'name': product.name,
-                    'code': product.code,
-                    'price': float(product.selling_price),
-                    'unit': product.unit.name if product.unit else '',
-                    'stock': 0
-                })
+            context['products'] = json.dumps([{
+                'id': product.id,
+                'name': product.name,
+                'code': product.code,
+                'price': float(product.selling_price),
+                'unit': product.unit.name if product.unit else '',
+                'stock': 0
+            } for product in products])
         
-        context['products'] = json.dumps(products_list)
         context['today'] = timezone.now().date()
         return context
     
@@ -119,69 +105,39 @@ class OrderCreateView(LoginRequiredMixin, CreateView):
             form.instance.created_by = self.request.user
             form.instance.status = 'draft'
             
-            # Save the order first
-            response = super().form_valid(form)
-            
-            # Generate order number if not exists
-            if not self.object.order_number:
-                from datetime import datetime
-                import uuid
-                now = datetime.now()
-                
-                # Try to generate unique order number
-                max_attempts = 100
-                for attempt in range(max_attempts):
-                    order_count = Order.objects.filter(
-                        created_at__date=now.date()
-                    ).count() + attempt + 1
-                    
-                    potential_order_number = f"ORD{now.strftime('%Y%m%d')}{order_count:03d}"
-                    
-                    # Check if this order number already exists
-                    if not Order.objects.filter(order_number=potential_order_number).exists():
-                        self.object.order_number = potential_order_number
-                        break
-                else:
-                    # Fallback: use UUID if we can't generate unique number
-                    self.object.order_number = f"ORD{now.strftime('%Y%m%d')}{str(uuid.uuid4())[:6].upper()}"
-                
-                self.object.save()
-            
-            # Create order details from form data
-            products_data = self.request.POST.getlist('products')
-            total_amount = 0
-            
-            for product_json in products_data:
+            # Parse order lines from form data
+            items = []
+            for product_json in self.request.POST.getlist('products'):
                 if product_json:
                     try:
                         product_data = json.loads(product_json)
-                        product = Product.objects.get(id=product_data['id'])
-                        quantity = float(product_data['quantity'])
-                        unit_price = float(product_data['price'])
-                        line_total = quantity * unit_price
-                        
-                        OrderDetail.objects.create(
-                            order=self.object,
-                            product=product,
-                            quantity=quantity,
-                            unit_price=unit_price,
-                            total_price=line_total
-                        )
-                        total_amount += line_total
-                    except (json.JSONDecodeError, ValueError, Product.DoesNotExist) as e:
-                        print(f"Error processing product data: {e}")
+                        items.append({
+                            'product_id': int(product_data['id']),
+                            'quantity': Decimal(str(product_data['quantity'])),
+                            'unit_price': Decimal(str(product_data['price'])),
+                        })
+                    except (json.JSONDecodeError, KeyError, TypeError, ValueError, InvalidOperation) as e:
+                        logger.warning('Bỏ qua dòng hàng không hợp lệ %r: %s', product_json, e)
+                        messages.warning(self.request, f'Đã bỏ qua một dòng hàng không hợp lệ: {e}')
                         continue
             
-            # Calculate totals
-            discount_percent = float(self.request.POST.get('discount', 0))
-            discount_amount = total_amount * (discount_percent / 100)
-            final_total = total_amount - discount_amount
+            # Một truy vấn sản phẩm cho mọi dòng, tổng tiền tính bằng Decimal trước khi lưu đơn
+            details, missing = build_order_details(items)
+            if missing:
+                logger.warning('Bỏ qua dòng hàng của sản phẩm không tồn tại: %s', missing)
+                messages.warning(
+                    self.request,
+                    f'Đã bỏ qua {len(missing)} dòng hàng có sản phẩm không tồn tại (ID: '
+                    f'{", ".join(str(product_id) for product_id in missing)})'
+                )
+            set_order_totals(
+                form.instance, details, discount_percent=Decimal(self.request.POST.get('discount') or 0)
+            )
             
-            # Update order totals
-            self.object.subtotal = total_amount
-            self.object.discount_amount = discount_amount
-            self.object.total_amount = final_total
-            self.object.save()
+            with transaction.atomic():
+                # Save the order once (Order.save cấp số đơn hàng từ bộ đếm), then all lines in one batch
+                response = super().form_valid(form)
+                save_order_details(self.object, details)
             
             messages.success(self.request, f'Tạo đơn hàng #{self.object.order_number} thành công!')
             return response
@@ -210,8 +166,30 @@ class OrderUpdateView(LoginRequiredMixin, UpdateView):
         return context
     
     def form_valid(self, form):
+        from inventory.allocation import InsufficientStockError
+        previous_status = form.initial.get('status')
+        new_status = form.cleaned_data['status']
+        if new_status != previous_status:
+            error = transition_error(previous_status, new_status)
+            if error:
+                form.add_error('status', error)
+                return self.form_invalid(form)
+        try:
+            # Xác nhận đơn bán sẽ giữ hàng; thiếu hàng thì hủy cả lần cập nhật
+            with transaction.atomic():
+                response = super().form_valid(form)
+                if new_status != previous_status:
+                    OrderStatusHistory.objects.create(
+                        order=self.object,
+                        from_status=previous_status,
+                        to_status=new_status,
+                        changed_by=self.request.user
+                    )
+        except InsufficientStockError as e:
+            messages.error(self.request, f'Không thể xác nhận đơn hàng: {str(e)}')
+            return self.form_invalid(form)
         messages.success(self.request, 'Cập nhật đơn hàng thành công!')
-        return super().form_valid(form)
+        return response
 
 class OrderDeleteView(LoginRequiredMixin, DeleteView):
     model = Order
@@ -274,9 +252,22 @@ class OrderAPICreateView(View):
                         'error': f'Customer with ID {data["partner_id"]} not found'
                     }, status=400)
             
+            # Validate order lines (một truy vấn sản phẩm cho mọi dòng)
+            details, missing = build_order_details([{
+                'product_id': int(detail_data['product_id']),
+                'quantity': detail_data['quantity'],
+                'unit_price': detail_data.get('unit_price'),
+                'discount_rate': detail_data.get('discount_rate'),
+            } for detail_data in data['order_details']])
+            if missing:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'Product with ID {missing[0]} not found'
+                }, status=400)
+            
             # Create order
             with transaction.atomic():
-                order = Order.objects.create(
+                order = Order(
                     order_type=data['order_type'],
                     farmer=farmer,
                     customer=customer,
@@ -284,39 +275,12 @@ class OrderAPICreateView(View):
                     shipping_address=shipping_address,
                     payment_status=data.get('payment_status', 'pending'),
                     notes=data.get('notes', ''),
+                    shipping_cost=data.get('shipping_cost', 0),
                     created_by_id=data.get('created_by_id', 1)  # Default user ID
                 )
-                
-                # Create order details
-                total_amount = 0
-                for detail_data in data['order_details']:
-                    try:
-                        product = Product.objects.get(id=detail_data['product_id'])
-                    except Product.DoesNotExist:
-                        return JsonResponse({
-                            'success': False,
-                            'error': f'Product with ID {detail_data["product_id"]} not found'
-                        }, status=400)
-                    
-                    quantity = detail_data['quantity']
-                    unit_price = detail_data.get('unit_price', product.selling_price)
-                    total_price = quantity * unit_price
-                    
-                    OrderDetail.objects.create(
-                        order=order,
-                        product=product,
-                        quantity=quantity,
-                        unit_price=unit_price,
-                        total_price=total_price
-                    )
-                    
-                    total_amount += total_price
-                
-                # Update order totals
-                order.subtotal = total_amount
-                order.discount_amount = data.get('discount_amount', 0)
-                order.total_amount = total_amount - order.discount_amount
+                set_order_totals(order, details, discount_amount=data.get('discount_amount', 0))
                 order.save()
+                save_order_details(order, details)
                 
                 return JsonResponse({
                     'success': True,
@@ -340,52 +304,20 @@ class OrderAPICreateView(View):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class OrderAPIDetailView(View):
-    """API endpoint để lấy thông tin đơn hàng"""
+    """
+    API endpoint để lấy thông tin đơn hàng.
+    Trả kèm ETag theo phiên bản đơn; If-None-Match trùng thì trả 304 mà không đọc dữ liệu đơn.
+    """
     
+    @method_decorator(condition(etag_func=order_etag))
     def get(self, request, pk):
         try:
-            order = Order.objects.get(pk=pk)
-            order_details = OrderDetail.objects.filter(order=order)
+            order = order_aggregate_queryset().get(pk=pk)
             
-            response_data = {
+            return JsonResponse({
                 'success': True,
-                'order': {
-                    'id': order.id,
-                    'order_number': order.order_number,
-                    'order_type': order.order_type,
-                    'partner': {
-                        'id': order.farmer.id if order.farmer else (order.customer.id if order.customer else None),
-                        'name': order.farmer.farm_name if order.farmer else (order.customer.full_name if order.customer else 'N/A'),
-                        'type': 'farmer' if order.farmer else 'customer',
-                        'code': order.farmer.farmer_code if order.farmer else (order.customer.customer_code if order.customer else 'N/A')
-                    },
-                    'delivery_date': order.delivery_date.isoformat() if order.delivery_date else None,
-                    'shipping_address': order.shipping_address,
-                    'payment_status': order.payment_status,
-                    'status': order.status,
-                    'subtotal': float(order.subtotal),
-                    'discount_amount': float(order.discount_amount),
-                    'total_amount': float(order.total_amount),
-                    'notes': order.notes,
-                    'created_at': order.created_at.isoformat(),
-                    'order_details': [
-                        {
-                            'id': detail.id,
-                            'product': {
-                                'id': detail.product.id,
-                                'code': detail.product.code,
-                                'name': detail.product.name
-                            },
-                            'quantity': float(detail.quantity),
-                            'unit_price': float(detail.unit_price),
-                            'total_price': float(detail.total_price)
-                        }
-                        for detail in order_details
-                    ]
-                }
-            }
-            
-            return JsonResponse(response_data)
+                'order': serialize_order(order)
+            })
             
         except Order.DoesNotExist:
             return JsonResponse({
@@ -397,3 +329,151 @@ class OrderAPIDetailView(View):
                 'success': False,
                 'error': str(e)
             }, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class OrderAPIImportView(View):
+    """Nhập đơn hàng hàng loạt từ file .xlsx/.csv (trường 'file'), xem orders/importer.py"""
+    
+    def post(self, request):
+        try:
+            uploaded_file = request.FILES.get('file')
+            if not uploaded_file:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Trường file là bắt buộc'
+                }, status=400)
+            
+            user = request.user if request.user.is_authenticated else None
+            result = import_orders(uploaded_file, user)
+            
+            return JsonResponse({
+                'success': True,
+                'message': f'Đã nhập {result["orders"]} đơn hàng ({result["lines"]} dòng)',
+                'data': result
+            })
+            
+        except SpreadsheetError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Lỗi server: {str(e)}'
+            }, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class OrderAPIPositionIngestView(View):
+    """
+    API nhận vị trí GPS theo lô:
+    {"pings": [{"order_id", "latitude", "longitude", "recorded_at", "location"}, ...]}.
+    Điểm quá gần hoặc quá dày được bỏ qua, xem orders/positions.py.
+    """
+    
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+            pings = data.get('pings') if isinstance(data, dict) else None
+            if not isinstance(pings, list) or not pings:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'pings phải là danh sách không rỗng'
+                }, status=400)
+            
+            user = request.user if request.user.is_authenticated else None
+            result = ingest_pings(pings, user)
+            
+            return JsonResponse({
+                'success': True,
+                'data': result
+            })
+            
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Invalid JSON format'
+            }, status=400)
+        except PingError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Lỗi server: {str(e)}'
+            }, status=500)
+
+
+class OrderAPIPositionView(View):
+    """API vị trí mới nhất của đơn hàng (đọc từ cache, không truy vấn lịch sử theo dõi)"""
+    
+    def get(self, request, pk):
+        position = latest_position(pk)
+        if position is None:
+            return JsonResponse({
+                'success': False,
+                'error': f'Chưa có vị trí cho đơn hàng ID {pk}'
+            }, status=404)
+        
+        return JsonResponse({
+            'success': True,
+            'position': position
+        })
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class OrderAPIStatusView(View):
+    """
+    API chuyển trạng thái hàng loạt:
+    {"status": "shipped", "order_ids": [...]} hoặc {"items": [{"order_id", "status"}, ...]}, kèm "notes" nếu có.
+    Đơn không được chuyển được báo lỗi riêng, các đơn còn lại vẫn được chuyển.
+    """
+    
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+            if data.get('items'):
+                transitions = {int(item['order_id']): item['status'] for item in data['items']}
+            elif data.get('order_ids') and data.get('status'):
+                transitions = {int(order_id): data['status'] for order_id in data['order_ids']}
+            else:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Cần "items" hoặc "order_ids" và "status"'
+                }, status=400)
+            
+            user = request.user if request.user.is_authenticated else None
+            changed, errors = transition_orders(transitions, user, data.get('notes', ''))
+            
+            return JsonResponse({
+                'success': bool(changed),
+                'updated': len(changed),
+                'failed': len(errors),
+                'items': [{
+                    'order_id': order_id,
+                    'status': status,
+                    'status_display': STATUS_LABELS.get(status, status),
+                    'success': order_id not in errors,
+                    'error': errors.get(order_id)
+                } for order_id, status in transitions.items()]
+            }, status=200 if changed else 400)
+            
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Invalid JSON format'
+            }, status=400)
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({
+                'success': False,
+                'error': 'Dữ liệu không hợp lệ'
+            }, status=400)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=500)
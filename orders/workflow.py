@@ -0,0 +1,126 @@
+"""
+Máy trạng thái của đơn hàng.
+
+ALLOWED_TRANSITIONS liệt kê các trạng thái kế tiếp hợp lệ của từng trạng thái.
+transition_orders() chuyển trạng thái hàng loạt: khóa và kiểm tra mọi đơn bằng
+một truy vấn, ghi bằng một câu UPDATE cho mỗi trạng thái đích và một lần
+bulk_create OrderStatusHistory. Đơn không hợp lệ được báo lỗi riêng, các đơn
+còn lại vẫn được chuyển.
+
+UPDATE không phát post_save, nên việc giữ hàng khi xác nhận đơn bán, xuất kho
+phần đang giữ khi giao vận/hoàn thành và trả lại khi hủy/trả hàng được gọi trực
+tiếp ở đây (như signal của inventory làm với từng đơn lưu qua save()).
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderStatusHistory
+
+ALLOWED_TRANSITIONS = {
+    'draft': {'confirmed', 'cancelled'},
+    'confirmed': {'processing', 'picking', 'cancelled'},
+    'processing': {'picking', 'cancelled'},
+    'picking': {'packed', 'cancelled'},
+    'packed': {'shipped', 'cancelled'},
+    'shipped': {'in_transit', 'delivered', 'returned'},
+    'in_transit': {'delivered', 'returned'},
+    'delivered': {'completed', 'returned'},
+    'completed': {'returned'},
+    'cancelled': set(),
+    'returned': set(),
+}
+
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+
+
+def can_transition(from_status, to_status):
+    return to_status in ALLOWED_TRANSITIONS.get(from_status, ())
+
+
+def transition_error(from_status, to_status):
+    """Thông báo lỗi nếu không được chuyển from_status -> to_status, ngược lại None"""
+    if to_status not in STATUS_LABELS:
+        return f'Trạng thái {to_status} không hợp lệ'
+    if not can_transition(from_status, to_status):
+        return (f'Không thể chuyển từ "{STATUS_LABELS.get(from_status, from_status)}" '
+                f'sang "{STATUS_LABELS[to_status]}"')
+    return None
+
+
+def _apply_side_effects(order_ids, to_status, errors, user=None):
+    """
+    Giữ hàng khi xác nhận, xuất kho phần đang giữ khi giao vận/hoàn thành, trả lại khi hủy/trả hàng.
+    Đơn giữ hàng thất bại được đưa vào errors và bỏ khỏi lô.
+    """
+    from inventory.allocation import (
+        CONSUMING_STATUSES, RELEASING_STATUSES, InsufficientStockError, consume_order, release_order, reserve_order
+    )
+
+    if to_status != 'confirmed' and to_status not in CONSUMING_STATUSES + RELEASING_STATUSES:
+        return order_ids
+    applied = []
+    orders = Order.objects.select_related('customer').in_bulk(order_ids)
+    for order_id in order_ids:
+        order = orders[order_id]
+        try:
+            with transaction.atomic():
+                if to_status == 'confirmed':
+                    reserve_order(order)
+                elif to_status in CONSUMING_STATUSES:
+                    consume_order(order, user)
+                else:
+                    release_order(order)
+        except InsufficientStockError as e:
+            errors[order_id] = str(e)
+            continue
+        applied.append(order_id)
+    return applied
+
+
+def transition_orders(transitions, user=None, notes=''):
+    """
+    Chuyển trạng thái hàng loạt, transitions = {order_id: trạng thái đích}.
+    Trả về (các order_id đã chuyển, {order_id: lỗi}).
+    """
+    transitions = {int(order_id): status for order_id, status in transitions.items()}
+    errors = {}
+    with transaction.atomic():
+        current = dict(
+            Order.objects.select_for_update().filter(id__in=list(transitions)).order_by('id').values_list('id', 'status')
+        )
+        by_target = defaultdict(list)
+        for order_id, to_status in transitions.items():
+            if order_id not in current:
+                errors[order_id] = f'Đơn hàng ID {order_id} không tồn tại'
+                continue
+            error = transition_error(current[order_id], to_status)
+            if error:
+                errors[order_id] = error
+                continue
+            by_target[to_status].append(order_id)
+
+        now = timezone.now()
+        changed, history = [], []
+        for to_status, order_ids in by_target.items():
+            order_ids = _apply_side_effects(order_ids, to_status, errors, user)
+            if not order_ids:
+                continue
+            fields = {'status': to_status, 'updated_at': now}
+            if user is not None:
+                fields['updated_by'] = user
+            Order.objects.filter(id__in=order_ids).update(**fields)
+            history.extend(
+                OrderStatusHistory(
+                    order_id=order_id,
+                    from_status=current[order_id],
+                    to_status=to_status,
+                    notes=notes,
+                    changed_by=user,
+                )
+                for order_id in order_ids
+            )
+            changed.extend(order_ids)
+        OrderStatusHistory.objects.bulk_create(history)
+    return changed, errors
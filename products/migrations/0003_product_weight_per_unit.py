@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:22
+
+import django.core.validators
+from decimal import Decimal
+
+from django.db import migrations, models
+
+# Số tấn trên một đơn vị, theo ký hiệu đơn vị tính; đơn vị khác (thùng, hộp...) để 0 cho người dùng nhập
+UNIT_WEIGHTS = {
+    't': Decimal('1'),
+    'tấn': Decimal('1'),
+    'tạ': Decimal('0.1'),
+    'yến': Decimal('0.01'),
+    'kg': Decimal('0.001'),
+    'g': Decimal('0.000001'),
+}
+
+
+def weigh_by_unit(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Unit = apps.get_model('products', 'Unit')
+    for unit in Unit.objects.all():
+        weight = UNIT_WEIGHTS.get(unit.symbol.strip().lower())
+        if weight:
+            Product.objects.filter(unit=unit).update(weight_per_unit=weight)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_auto_20250823_1606'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='weight_per_unit',
+            field=models.DecimalField(decimal_places=6, default=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Khối lượng mỗi đơn vị (tấn)'),
+        ),
+        migrations.RunPython(weigh_by_unit, migrations.RunPython.noop),
+    ]
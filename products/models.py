@@ -65,6 +65,9 @@ class Product(models.Model):
     storage_temperature_min = models.FloatField(blank=True, null=True, verbose_name="Nhiệt độ bảo quản tối thiểu (°C)")
     storage_temperature_max = models.FloatField(blank=True, null=True, verbose_name="Nhiệt độ bảo quản tối đa (°C)")
     humidity_requirement = models.CharField(max_length=50, blank=True, verbose_name="Yêu cầu độ ẩm")
+    # Quy đổi số lượng theo đơn vị tính ra tấn để so với sức chứa kho (0: không tính vào sức chứa)
+    weight_per_unit = models.DecimalField(max_digits=12, decimal_places=6, default=0, validators=[MinValueValidator(0)],
+                                          verbose_name="Khối lượng mỗi đơn vị (tấn)")
     
     # Thông tin xuất nhập khẩu
     hs_code = models.CharField(max_length=20, blank=True, verbose_name="Mã HS")
@@ -42,6 +42,7 @@ class ProductCreateView(LoginRequiredMixin, TemplateView):
                 storage_temperature_min=request.POST.get('storage_temperature_min') or None,
                 storage_temperature_max=request.POST.get('storage_temperature_max') or None,
                 humidity_requirement=request.POST.get('humidity_requirement') or None,
+                weight_per_unit=request.POST.get('weight_per_unit') or 0,
                 hs_code=request.POST.get('hs_code', ''),
                 is_active=request.POST.get('is_active') == '1'
             )
@@ -84,7 +85,7 @@ class ProductUpdateView(LoginRequiredMixin, UpdateView):
     fields = ['code', 'name', 'category', 'unit', 'description', 'origin', 'quality_grade', 
               'cost_price', 'selling_price', 'export_price', 'shelf_life_days',
               'storage_temperature_min', 'storage_temperature_max', 'humidity_requirement',
-              'hs_code', 'is_active']
+              'weight_per_unit', 'hs_code', 'is_active']
     
     def get_success_url(self):
         return reverse_lazy('products:detail', kwargs={'pk': self.object.pk})
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+Benchmark giữ hàng đồng thời: xác nhận song song hàng trăm đơn bán tranh nhau
+cùng một lượng tồn kho, sau đó kiểm tra không dòng tồn kho nào bị giữ quá số lượng
+và tổng phần giữ khớp với các đơn đã xác nhận thành công.
+Chạy bằng lệnh: python scripts/bench_allocation.py [số_đơn] [số_luồng]
+(Cần MySQL như cấu hình thật; SQLite khóa cả file nên không đo được tranh chấp.)
+"""
+
+import random
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+sys.path.append('scripts')
+import bench_fixtures as fx
+
+from django.db import connection, transaction
+from django.db.models import Sum
+from inventory.allocation import InsufficientStockError
+from inventory.ledger import apply_deltas
+from inventory.models import InventoryStock, StockReservation
+from orders.models import Order
+
+
+def confirm(order_ids):
+    confirmed = failed = 0
+    try:
+        for order_id in order_ids:
+            order = Order.objects.get(pk=order_id)
+            order.status = 'confirmed'
+            try:
+                with transaction.atomic():
+                    order.save()
+                confirmed += 1
+            except InsufficientStockError:
+                failed += 1
+    finally:
+        connection.close()
+    return confirmed, failed
+
+
+def run(total=300, threads=16):
+    tag = fx.run_tag()
+    warehouses = fx.create_warehouses(tag, 3)
+    products = fx.create_products(tag, 8)
+
+    # Tồn kho vừa đủ cho khoảng 2/3 nhu cầu để chắc chắn có tranh chấp
+    rng = random.Random(7)
+    lines_per_order = [
+        [(product, Decimal(rng.randint(1, 10))) for product in rng.sample(products, rng.randint(1, 3))]
+        for _ in range(total)
+    ]
+    demand = defaultdict(Decimal)
+    for lines in lines_per_order:
+        for product, quantity in lines:
+            demand[product.id] += quantity
+    for index, warehouse in enumerate(warehouses):
+        apply_deltas(warehouse.id, {
+            product.id: (demand[product.id] * 2 / 3 / len(warehouses)).quantize(Decimal('1')) + index
+            for product in products
+        })
+    orders = fx.create_sale_orders(tag, lines_per_order)
+
+    ids = [order.id for order in orders]
+    chunks = [ids[i::threads] for i in range(threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(confirm, chunks))
+    elapsed = time.perf_counter() - started
+    confirmed = sum(r[0] for r in results)
+    failed = sum(r[1] for r in results)
+
+    stocks = list(InventoryStock.objects.filter(warehouse__in=warehouses))
+    oversold = [s for s in stocks if s.reserved_quantity > s.quantity]
+    held = dict(
+        StockReservation.objects.filter(stock__in=stocks).values('stock_id')
+        .annotate(total=Sum('quantity')).values_list('stock_id', 'total')
+    )
+    drift = [s for s in stocks if held.get(s.pk, Decimal('0')) != s.reserved_quantity]
+    partial = Order.objects.filter(pk__in=ids, status='confirmed', stock_reservations__isnull=True).count()
+
+    print(f"{total} đơn / {threads} luồng: {elapsed:.2f}s ({total / elapsed:.0f} đơn/s)")
+    print(f"Xác nhận: {confirmed}, thiếu hàng: {failed}")
+    print(f"Dòng tồn kho giữ quá số lượng: {len(oversold)}, lệch với bảng giữ hàng: {len(drift)}, "
+          f"đơn xác nhận nhưng không giữ hàng: {partial}")
+
+    fx.cleanup(tag)
+    return not (oversold or drift or partial) and confirmed + failed == total
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    sys.exit(0 if run(*args) else 1)
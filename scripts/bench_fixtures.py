@@ -0,0 +1,105 @@
+"""
+Dữ liệu dùng chung cho các script benchmark trong thư mục scripts/.
+Mọi bản ghi đều mang tiền tố BENCH để có thể dọn dẹp sau khi chạy.
+"""
+
+import os
+import sys
+import uuid
+from decimal import Decimal
+
+import django
+
+# Setup Django
+sys.path.append('.')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fruit_manage.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model
+from products.models import Category, Unit, Product
+from inventory.models import Warehouse
+from orders.models import Order, OrderDetail
+
+User = get_user_model()
+
+PREFIX = 'BENCH'
+
+
+def run_tag():
+    """Mã ngắn riêng cho mỗi lần chạy"""
+    return uuid.uuid4().hex[:6].upper()
+
+
+def bench_user():
+    user, _ = User.objects.get_or_create(
+        username='bench', defaults={'email': 'bench@company.com', 'is_active': False}
+    )
+    return user
+
+
+def create_products(tag, count):
+    category, _ = Category.objects.get_or_create(name=f'{PREFIX} Category')
+    unit, _ = Unit.objects.get_or_create(name=f'{PREFIX} kg', defaults={'symbol': 'kg'})
+    Product.objects.bulk_create([
+        Product(
+            code=f'{PREFIX}{tag}{i:05d}',
+            name=f'{PREFIX} {tag} #{i}',
+            category=category,
+            unit=unit,
+            origin='domestic',
+            quality_grade='A',
+            cost_price=Decimal('10000'),
+            selling_price=Decimal('15000'),
+            shelf_life_days=14,
+        )
+        for i in range(count)
+    ])
+    return list(Product.objects.filter(code__startswith=f'{PREFIX}{tag}').order_by('id'))
+
+
+def create_warehouses(tag, count, capacity=Decimal('100000')):
+    Warehouse.objects.bulk_create([
+        Warehouse(
+            name=f'{PREFIX} {tag} Kho {i}',
+            code=f'{PREFIX[:2]}{tag}{i:02d}',
+            address=f'Benchmark {i}',
+            capacity=capacity,
+        )
+        for i in range(count)
+    ])
+    return list(Warehouse.objects.filter(name__startswith=f'{PREFIX} {tag} ').order_by('id'))
+
+
+def create_sale_orders(tag, lines_per_order, status='draft'):
+    """
+    Tạo đơn bán; lines_per_order là danh sách các list [(product, quantity), ...] cho từng đơn.
+    """
+    Order.objects.bulk_create([
+        Order(
+            order_number=f'{PREFIX}{tag}-{i:06d}',
+            order_type='sale',
+            status=status,
+            shipping_address='Benchmark',
+        )
+        for i in range(len(lines_per_order))
+    ])
+    orders = list(Order.objects.filter(order_number__startswith=f'{PREFIX}{tag}-').order_by('order_number'))
+    OrderDetail.objects.bulk_create([
+        OrderDetail(
+            order=order,
+            product=product,
+            quantity=quantity,
+            unit_price=product.selling_price,
+            total_price=quantity * product.selling_price,
+        )
+        for order, lines in zip(orders, lines_per_order)
+        for product, quantity in lines
+    ])
+    return orders
+
+
+def cleanup(tag):
+    """Xóa toàn bộ dữ liệu benchmark của một lần chạy (cascade theo kho/sản phẩm)"""
+    Order.objects.filter(order_number__startswith=f'{PREFIX}{tag}-').delete()
+    Warehouse.objects.filter(name__startswith=f'{PREFIX} {tag} ').delete()
+    Product.objects.filter(code__startswith=f'{PREFIX}{tag}').delete()
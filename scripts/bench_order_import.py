@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Benchmark nhập đơn hàng hàng loạt: sinh file CSV hoặc XLSX gồm số_dòng dòng hàng
+(mỗi đơn dòng_mỗi_đơn dòng) cho các khách hàng benchmark, nhập bằng import_orders
+và đo thời gian, bộ nhớ cấp phát tối đa (tracemalloc) cùng số truy vấn.
+Chạy bằng lệnh: python scripts/bench_order_import.py [số_dòng] [dòng_mỗi_đơn] [csv|xlsx]
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append('scripts')
+import bench_fixtures as fx
+
+from django.db import connection, reset_queries
+from django.conf import settings
+from customers.models import Customer
+from orders.importer import import_orders
+from orders.models import Order, OrderDetail
+
+CUSTOMERS = 20
+PRODUCTS = 200
+
+
+def create_customers(tag):
+    Customer.objects.bulk_create([
+        Customer(
+            customer_code=f'{fx.PREFIX}{tag}{i:03d}',
+            full_name=f'{fx.PREFIX} {tag} #{i}',
+            phone='0900000000',
+            email=f'bench{i}@company.com',
+            province='Benchmark',
+            district='Benchmark',
+            ward='Benchmark',
+            address='Benchmark',
+        )
+        for i in range(CUSTOMERS)
+    ])
+    return list(Customer.objects.filter(customer_code__startswith=f'{fx.PREFIX}{tag}'))
+
+
+def iter_lines(customers, products, lines, lines_per_order):
+    yield ['order_ref', 'partner_code', 'product_code', 'quantity', 'unit_price', 'delivery_date']
+    for i in range(lines):
+        order = i // lines_per_order
+        yield [
+            f'REF{order:06d}',
+            customers[order % len(customers)].customer_code,
+            products[i % len(products)].code,
+            (i % 7) + 1,
+            15000,
+            '2026-12-01',
+        ]
+
+
+def write_file(path, rows, fmt):
+    if fmt == 'xlsx':
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        for row in rows:
+            sheet.append(row)
+        workbook.save(path)
+    else:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows(rows)
+
+
+def run(lines=20000, lines_per_order=10, fmt='csv'):
+    tag = fx.run_tag()
+    products = fx.create_products(tag, PRODUCTS)
+    customers = create_customers(tag)
+    fd, path = tempfile.mkstemp(suffix=f'.{fmt}')
+    os.close(fd)
+    try:
+        write_file(path, iter_lines(customers, products, lines, lines_per_order), fmt)
+
+        settings.DEBUG = True
+        reset_queries()
+        tracemalloc.start()
+        started = time.perf_counter()
+        with open(path, 'rb') as uploaded_file:
+            result = import_orders(uploaded_file)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        queries = len(connection.queries)
+        settings.DEBUG = False
+
+        orders = Order.objects.filter(customer__in=customers)
+        stored_lines = OrderDetail.objects.filter(order__in=orders).count()
+        print(f"{fmt}: {lines} dòng -> {result['orders']} đơn, {result['lines']} dòng trong {elapsed:.2f}s "
+              f"({lines / elapsed:.0f} dòng/s), bộ nhớ tối đa {peak / 1024 / 1024:.1f} MB, {queries} truy vấn")
+        print(f"Lỗi: {result['error_count']}, đơn đã lưu: {orders.count()}, dòng đã lưu: {stored_lines}")
+        return not result['error_count'] and stored_lines == lines
+    finally:
+        os.remove(path)
+        Customer.objects.filter(customer_code__startswith=f'{fx.PREFIX}{tag}').delete()
+        fx.cleanup(tag)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:4]
+    lines = int(args[0]) if args else 20000
+    lines_per_order = int(args[1]) if len(args) > 1 else 10
+    fmt = args[2] if len(args) > 2 else 'csv'
+    sys.exit(0 if run(lines, lines_per_order, fmt) else 1)
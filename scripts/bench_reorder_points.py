@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Benchmark tính lại điểm đặt hàng: tạo số cặp (kho, sản phẩm) yêu cầu cùng lịch sử xuất kho
+trải đều trong cửa sổ nhu cầu, đo thời gian recompute_stock_levels() và đối chiếu vài
+cặp với cách tính thuần Python. Mục tiêu: 100.000 cặp dưới 60 giây.
+Chạy bằng lệnh: python scripts/bench_reorder_points.py [số_cặp] [phiếu_xuất_mỗi_cặp]
+"""
+
+import math
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+sys.path.append('scripts')
+import bench_fixtures as fx
+
+from django.utils import timezone
+from inventory.forecasting import recompute_stock_levels, reorder_settings
+from inventory.models import InventoryStock, StockMovement
+
+WAREHOUSES = 10
+TARGET_SECONDS = 60
+
+
+def run(pairs=100000, movements_per_pair=5):
+    tag = fx.run_tag()
+    options = reorder_settings()
+    window = options['window_days']
+    warehouses = fx.create_warehouses(tag, WAREHOUSES)
+    products = fx.create_products(tag, math.ceil(pairs / WAREHOUSES))
+    keys = [(w, p) for w in warehouses for p in products][:pairs]
+
+    InventoryStock.objects.bulk_create([
+        InventoryStock(warehouse=w, product=p, quantity=Decimal('50')) for w, p in keys
+    ], batch_size=5000)
+
+    # created_at là auto_now_add: ghi theo từng ngày rồi dời cả ngày về quá khứ bằng một câu UPDATE
+    rng = random.Random(11)
+    by_day = {}
+    for w, p in keys:
+        for _ in range(movements_per_pair):
+            by_day.setdefault(rng.randrange(window), []).append((w, p, Decimal(rng.randint(1, 20))))
+    today = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+    started = time.perf_counter()
+    for day, rows in by_day.items():
+        mark = timezone.now()
+        StockMovement.objects.bulk_create([
+            StockMovement(warehouse=w, product=p, movement_type='outbound', quantity=q) for w, p, q in rows
+        ], batch_size=5000)
+        StockMovement.objects.filter(warehouse__in=warehouses, created_at__gte=mark).update(
+            created_at=today - timedelta(days=window - day)
+        )
+    print(f"Dữ liệu: {len(keys)} cặp, {len(keys) * movements_per_pair} phiếu xuất "
+          f"({time.perf_counter() - started:.1f}s)")
+
+    started = time.perf_counter()
+    updated = recompute_stock_levels(warehouse_ids=[w.id for w in warehouses])
+    elapsed = time.perf_counter() - started
+    print(f"recompute_stock_levels: {updated} dòng trong {elapsed:.2f}s (mục tiêu < {TARGET_SECONDS}s)")
+
+    # Đối chiếu vài cặp với công thức tính tay
+    mismatches = 0
+    for w, p in rng.sample(keys, min(20, len(keys))):
+        daily = [0.0] * window
+        for day, rows in by_day.items():
+            daily[day] += sum(float(q) for rw, rp, q in rows if rw == w and rp == p)
+        mean = statistics.fmean(daily)
+        reorder = mean * options['lead_time_days'] + (
+            options['service_level_z'] * statistics.stdev(daily) * math.sqrt(options['lead_time_days'])
+        )
+        stock = InventoryStock.objects.get(warehouse=w, product=p)
+        if abs(float(stock.min_stock_level) - reorder) > 0.01:
+            mismatches += 1
+    print(f"Lệch so với tính tay: {mismatches}")
+
+    fx.cleanup(tag)
+    return updated == len(keys) and not mismatches and elapsed < TARGET_SECONDS
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    sys.exit(0 if run(*args) else 1)
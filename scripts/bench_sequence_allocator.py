@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Benchmark cấp số chứng từ khi nhiều luồng cùng tạo đơn hàng: mỗi luồng (một kết nối
+database riêng) lấy số từ bộ đếm rồi INSERT đơn hàng, mỗi đơn trong một transaction
+như khi đặt hàng. Kiểm tra không có số trùng, không có lỗi trùng khóa cần thử lại,
+và đếm số truy vấn cấp số trên mỗi đơn.
+Chạy bằng lệnh: python scripts/bench_sequence_allocator.py [số_luồng] [đơn_mỗi_luồng] [khối]
+"""
+
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.append('scripts')
+import bench_fixtures as fx
+
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from orders.models import Order
+from utils.models import SequenceCounter
+from utils.sequences import allocate_number
+
+
+def worker(prefix, count, block_size, results):
+    numbers, errors, queries = [], 0, 0
+    try:
+        for _ in range(count):
+            try:
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as captured:
+                        number = allocate_number(prefix, block_size=block_size)
+                    queries += len(captured)
+                    Order.objects.create(
+                        order_number=number,
+                        order_type='sale',
+                        shipping_address=f'{prefix} benchmark',
+                    )
+                numbers.append(number)
+            except IntegrityError:
+                errors += 1
+    finally:
+        connection.close()
+    results.append((numbers, errors, queries))
+
+
+def run(threads=8, per_thread=200, block_size=1):
+    prefix = f'{fx.PREFIX}{fx.run_tag()}'
+    results = []
+    workers = [
+        threading.Thread(target=worker, args=(prefix, per_thread, block_size, results))
+        for _ in range(threads)
+    ]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    numbers = [number for numbers, _, _ in results for number in numbers]
+    errors = sum(errors for _, errors, _ in results)
+    queries = sum(queries for _, _, queries in results)
+    duplicates = sum(n - 1 for n in Counter(numbers).values() if n > 1)
+    stored = Order.objects.filter(order_number__startswith=f'{prefix}-').count()
+    print(f"{threads} luồng x {per_thread} đơn, khối {block_size}: {len(numbers)} đơn trong {elapsed:.2f}s "
+          f"({len(numbers) / elapsed:.0f} đơn/s)")
+    print(f"Số trùng: {duplicates}, lỗi trùng khóa: {errors}, đơn đã lưu: {stored}, "
+          f"truy vấn cấp số/đơn: {queries / max(len(numbers), 1):.2f}")
+
+    Order.objects.filter(order_number__startswith=f'{prefix}-').delete()
+    SequenceCounter.objects.filter(prefix=prefix).delete()
+    return not duplicates and not errors and stored == threads * per_thread
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:4]]
+    sys.exit(0 if run(*args) else 1)
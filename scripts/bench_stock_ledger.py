@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Benchmark ghi tồn kho đồng thời: nhiều luồng cùng tạo StockMovement cho một
+nhóm nhỏ (kho, sản phẩm) rồi so sánh tồn kho cuối với tổng kỳ vọng.
+Chạy bằng lệnh: python scripts/bench_stock_ledger.py [số_phiếu] [số_luồng]
+(Cần MySQL như cấu hình thật; SQLite khóa cả file nên không đo được tranh chấp.)
+"""
+
+import random
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+sys.path.append('scripts')
+import bench_fixtures as fx
+
+from django.db import connection
+from inventory.models import InventoryStock, StockMovement
+
+
+def worker(jobs, user_id):
+    try:
+        for warehouse_id, product_id, movement_type, quantity in jobs:
+            StockMovement.objects.create(
+                warehouse_id=warehouse_id,
+                product_id=product_id,
+                movement_type=movement_type,
+                quantity=quantity,
+                created_by_id=user_id,
+            )
+    finally:
+        connection.close()
+
+
+def run(total=5000, threads=32):
+    tag = fx.run_tag()
+    warehouses = fx.create_warehouses(tag, 2)
+    products = fx.create_products(tag, 5)
+    user = fx.bench_user()
+
+    # Nhập nhiều hơn xuất để tồn kho không bao giờ chạm ngưỡng 0
+    rng = random.Random(42)
+    jobs = []
+    expected = defaultdict(Decimal)
+    for _ in range(total):
+        warehouse = rng.choice(warehouses)
+        product = rng.choice(products)
+        if rng.random() < 0.7:
+            movement_type, quantity = 'inbound', Decimal(rng.randint(5, 20))
+            expected[(warehouse.id, product.id)] += quantity
+        else:
+            movement_type, quantity = 'outbound', Decimal(rng.randint(1, 2))
+            expected[(warehouse.id, product.id)] -= quantity
+        jobs.append((warehouse.id, product.id, movement_type, quantity))
+
+    # Đặt xuất kho ra sau cùng trong từng luồng để không có lúc tồn âm bị kẹp về 0
+    chunks = [sorted(jobs[i::threads], key=lambda j: j[2] != 'inbound') for i in range(threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, chunks, [user.id] * threads))
+    elapsed = time.perf_counter() - started
+
+    actual = {
+        (s.warehouse_id, s.product_id): s.quantity
+        for s in InventoryStock.objects.filter(warehouse__in=warehouses)
+    }
+    mismatches = {k: (v, actual.get(k)) for k, v in expected.items() if actual.get(k) != v}
+
+    print(f"{total} phiếu / {threads} luồng: {elapsed:.2f}s ({total / elapsed:.0f} phiếu/s)")
+    print(f"Số dòng tồn kho: {len(actual)}, lệch: {len(mismatches)}")
+    for key, (want, got) in list(mismatches.items())[:10]:
+        print(f"  {key}: kỳ vọng {want}, thực tế {got}")
+
+    fx.cleanup(tag)
+    return not mismatches
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    sys.exit(0 if run(*args) else 1)
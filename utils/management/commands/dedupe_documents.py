@@ -0,0 +1,61 @@
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from utils.models import StoredBlob
+from utils.storage import BLOB_PREFIX, DEDUPLICATED_FILE_FIELDS, SHA256_RE, document_storage
+
+
+class Command(BaseCommand):
+    help = ('Chuyển các file tài liệu lưu theo cách cũ sang kho lưu theo nội dung (mỗi nội dung một lần) '
+            'và dọn các file không còn tham chiếu')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune-only', action='store_true',
+                            help='Chỉ dọn file không còn tham chiếu, không chuyển file cũ')
+
+    def handle(self, *args, **options):
+        if not options['prune_only']:
+            for app_label, model_name, field_name in DEDUPLICATED_FILE_FIELDS:
+                self.migrate_field(apps.get_model(app_label, model_name), field_name)
+        self.prune()
+
+    def migrate_field(self, model, field_name):
+        moved = freed = 0
+        rows = model.objects.exclude(**{field_name: ''}).exclude(
+            **{f'{field_name}__startswith': f'{BLOB_PREFIX}/'}
+        ).values_list('pk', field_name)
+        for pk, name in rows.iterator():
+            if not document_storage.exists(name):
+                self.stderr.write(f'{model._meta.label} #{pk}: không tìm thấy file {name}')
+                continue
+            size = document_storage.size(name)
+            with document_storage.open(name) as content:
+                new_name = document_storage.save(os.path.basename(name), content)
+            # update() không phát signal: tham chiếu được cộng và file cũ được xóa trực tiếp
+            with transaction.atomic():
+                model.objects.filter(pk=pk).update(**{field_name: new_name})
+                document_storage.add_reference(new_name)
+            if not model.objects.filter(**{field_name: name}).exists():
+                document_storage.delete(name)
+                freed += size
+            moved += 1
+        self.stdout.write(f'{model._meta.label}: đã chuyển {moved} file, đã xóa {freed} byte file cũ')
+
+    def prune(self):
+        """
+        Xóa dòng StoredBlob hết tham chiếu và file blob không có dòng StoredBlob (upload bị rollback).
+        Nên chạy khi không có upload đang diễn ra.
+        """
+        StoredBlob.objects.filter(ref_count=0).delete()
+        known = set(StoredBlob.objects.values_list('sha256', flat=True))
+        root = document_storage.path(BLOB_PREFIX)
+        removed = 0
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                if SHA256_RE.match(filename) and filename not in known:
+                    os.remove(os.path.join(directory, filename))
+                    removed += 1
+        self.stdout.write(self.style.SUCCESS(f'Đã xóa {removed} file không còn tham chiếu'))
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('size', models.BigIntegerField(default=0, verbose_name='Kích thước (byte)')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Số tham chiếu')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+            ],
+            options={
+                'verbose_name': 'Nội dung file',
+                'verbose_name_plural': 'Nội dung file',
+            },
+        ),
+    ]
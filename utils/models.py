@@ -1,3 +1,31 @@
 from django.db import models
 
-# Create your models here.
+
+class SequenceCounter(models.Model):
+    """Bộ đếm số chứng từ theo (tiền tố, ngày), xem utils/sequences.py"""
+    prefix = models.CharField(max_length=20, verbose_name="Tiền tố")
+    day = models.DateField(verbose_name="Ngày")
+    last_value = models.PositiveIntegerField(default=0, verbose_name="Số đã cấp cuối cùng")
+    
+    class Meta:
+        verbose_name = "Bộ đếm số chứng từ"
+        verbose_name_plural = "Bộ đếm số chứng từ"
+        unique_together = ['prefix', 'day']
+        
+    def __str__(self):
+        return f"{self.prefix} {self.day}: {self.last_value}"
+
+
+class StoredBlob(models.Model):
+    """Nội dung file lưu một lần theo SHA-256, đếm số tài liệu đang dùng, xem utils/storage.py"""
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name="SHA-256")
+    size = models.BigIntegerField(default=0, verbose_name="Kích thước (byte)")
+    ref_count = models.PositiveIntegerField(default=0, verbose_name="Số tham chiếu")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Ngày tạo")
+    
+    class Meta:
+        verbose_name = "Nội dung file"
+        verbose_name_plural = "Nội dung file"
+        
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count})"
@@ -0,0 +1,99 @@
+"""
+Cấp số chứng từ (số đơn hàng, số tờ khai...) từ bộ đếm theo (tiền tố, ngày).
+
+Mỗi lần lấy số là một câu UPDATE cộng dồn trên dòng SequenceCounter phía
+database rồi đọc lại trong cùng transaction, nên hai yêu cầu đồng thời luôn
+nhận hai số khác nhau mà không phải tìm bản ghi cuối cùng hay thử lại khi trùng.
+
+Câu UPDATE chạy trong transaction ngắn của riêng nó trên kết nối SEQUENCE_DATABASE
+(khai báo trong DATABASES), tách khỏi transaction của người gọi: dòng bộ đếm chỉ
+bị khóa trong lúc giữ số, không phải tới khi request tạo chứng từ commit. Số đã
+giữ không được trả lại nếu transaction của người gọi rollback (dãy số có thể hở).
+SEQUENCE_DATABASE = 'default' (hoặc chưa khai báo kết nối riêng) thì dùng kết nối
+mặc định, khi đó bộ đếm commit/rollback cùng transaction của người gọi; test chạy
+theo cách này (utils/testing.py).
+
+Mỗi tiến trình lấy trước một khối SEQUENCE_BLOCK_SIZE số và cấp dần trong bộ nhớ,
+phần lớn lần lấy số không chạm database. Đổi lại, số giữa các tiến trình không
+tăng theo thời gian và phần còn lại của khối bị bỏ qua khi tiến trình dừng.
+"""
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import SequenceCounter
+
+DEFAULT_BLOCK_SIZE = 20
+
+_blocks = {}  # (prefix, day) -> [số kế tiếp, số cuối của khối]
+_blocks_lock = threading.Lock()
+
+
+def _database():
+    """Alias kết nối của bộ đếm: SEQUENCE_DATABASE nếu đã khai báo trong DATABASES, không thì kết nối mặc định"""
+    alias = getattr(settings, 'SEQUENCE_DATABASE', DEFAULT_DB_ALIAS)
+    return alias if alias in connections.databases else DEFAULT_DB_ALIAS
+
+
+def _reserve(prefix, day, size, using):
+    """Cộng size vào bộ đếm (tạo dòng nếu chưa có), trả về số cuối cùng vừa giữ"""
+    counters = SequenceCounter.objects.using(using).filter(prefix=prefix, day=day)
+    with transaction.atomic(using=using):
+        if not counters.update(last_value=F('last_value') + size):
+            SequenceCounter.objects.using(using).bulk_create(
+                [SequenceCounter(prefix=prefix, day=day)], ignore_conflicts=True
+            )
+            counters.update(last_value=F('last_value') + size)
+        # Dòng bộ đếm đang bị khóa bởi câu UPDATE nên giá trị đọc được là của riêng transaction này
+        return counters.values_list('last_value', flat=True).get()
+
+
+def _keep_block(key, block):
+    with _blocks_lock:
+        for old in [k for k in _blocks if k[0] == key[0] and k[1] < key[1]]:
+            del _blocks[old]
+        _blocks[key] = block
+
+
+def next_value(prefix, day=None, block_size=None):
+    """Số kế tiếp (bắt đầu từ 1) của bộ đếm (prefix, day), mặc định day là hôm nay"""
+    day = day or timezone.localdate()
+    size = block_size or getattr(settings, 'SEQUENCE_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+    key = (prefix, day)
+    with _blocks_lock:
+        block = _blocks.get(key)
+        if block and block[0] <= block[1]:
+            value = block[0]
+            block[0] += 1
+            return value
+
+    using = _database()
+    last = _reserve(prefix, day, size, using)
+    first = last - size + 1
+    if size > 1:
+        spare = [first + 1, last]
+        if connections[using].in_atomic_block:
+            # Bộ đếm nằm trong transaction của người gọi (không có kết nối riêng):
+            # rollback thì bộ đếm quay về, nên chỉ giữ khối sau khi commit
+            transaction.on_commit(lambda: _keep_block(key, spare), using=using)
+        else:
+            _keep_block(key, spare)
+    return first
+
+
+def allocate_number(prefix, day=None, width=4, block_size=None):
+    """Số chứng từ dạng PREFIX-YYYYMMDD-0001"""
+    day = day or timezone.localdate()
+    return f"{prefix}-{day:%Y%m%d}-{next_value(prefix, day, block_size):0{width}d}"
+
+
+def allocate_numbers(prefix, count, day=None, width=4):
+    """count số chứng từ liên tiếp giữ bằng một câu UPDATE, dùng khi tạo chứng từ bằng bulk_create"""
+    day = day or timezone.localdate()
+    if count <= 0:
+        return []
+    last = _reserve(prefix, day, count, _database())
+    return [f"{prefix}-{day:%Y%m%d}-{value:0{width}d}" for value in range(last - count + 1, last + 1)]
@@ -0,0 +1,43 @@
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .storage import DEDUPLICATED_FILE_FIELDS, document_storage, parse_blob_name
+
+
+def _connect(model, field_name):
+    def remember_previous_file(sender, instance, raw=False, **kwargs):
+        """Ghi nhớ file cũ để trả tham chiếu sau khi tài liệu được lưu với file khác"""
+        instance._previous_blob_name = None
+        instance._file_changed = False
+        if raw:
+            return
+        previous = None
+        if instance.pk is not None:
+            previous = sender.objects.filter(pk=instance.pk).values_list(field_name, flat=True).first()
+        instance._file_changed = previous != getattr(instance, field_name).name
+        if instance._file_changed and parse_blob_name(previous):
+            instance._previous_blob_name = previous
+
+    def update_references(sender, instance, **kwargs):
+        """Dòng tài liệu đã ghi: cộng tham chiếu của file mới, trả tham chiếu của file cũ"""
+        if getattr(instance, '_file_changed', False):
+            instance._file_changed = False
+            document_storage.add_reference(getattr(instance, field_name).name)
+        previous = getattr(instance, '_previous_blob_name', None)
+        if previous:
+            instance._previous_blob_name = None
+            document_storage.delete(previous)
+
+    def release_deleted_file(sender, instance, **kwargs):
+        name = getattr(instance, field_name).name
+        if parse_blob_name(name):
+            document_storage.delete(name)
+
+    uid = f'blob_references:{model._meta.label}.{field_name}'
+    pre_save.connect(remember_previous_file, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(update_references, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(release_deleted_file, sender=model, weak=False, dispatch_uid=uid)
+
+
+for app_label, model_name, field_name in DEDUPLICATED_FILE_FIELDS:
+    _connect(apps.get_model(app_label, model_name), field_name)
@@ -0,0 +1,50 @@
+"""
+Đọc file XLSX/CSV tải lên theo từng dòng, dùng chung cho các chức năng nhập file.
+"""
+import csv
+import io
+
+
+class SpreadsheetError(Exception):
+    """File tải lên không đọc được hoặc thiếu cột bắt buộc"""
+
+
+def iter_rows(uploaded_file):
+    """Đọc từng dòng của file tải lên (openpyxl read-only hoặc csv) mà không nạp cả file vào bộ nhớ"""
+    name = (uploaded_file.name or '').lower()
+    if name.endswith('.xlsx'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    elif name.endswith('.csv'):
+        yield from csv.reader(io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline=''))
+    else:
+        raise SpreadsheetError('Chỉ hỗ trợ file .xlsx hoặc .csv')
+
+
+def column_map(header, aliases, required):
+    """{tên cột chuẩn: vị trí} theo dòng tiêu đề; aliases = {tiêu đề viết thường: tên cột chuẩn}"""
+    columns = {}
+    for index, title in enumerate(header or ()):
+        key = aliases.get(str(title or '').strip().lower())
+        if key and key not in columns:
+            columns[key] = index
+    missing = set(required) - set(columns)
+    if missing:
+        raise SpreadsheetError(f'Thiếu cột: {", ".join(sorted(missing))}')
+    return columns
+
+
+def is_blank(row):
+    return not row or all(cell in (None, '') for cell in row)
+
+
+def cell(row, columns, key):
+    """Giá trị ô của cột key (None nếu file không có cột đó hoặc dòng ngắn hơn)"""
+    index = columns.get(key)
+    if index is None or index >= len(row):
+        return None
+    return row[index]
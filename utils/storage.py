@@ -0,0 +1,170 @@
+"""
+Lưu file tài liệu theo nội dung (content-addressed).
+
+Khi lưu, file tải lên được đọc từng khối, vừa ghi ra file tạm vừa tính SHA-256.
+Nội dung đã có thì bỏ file tạm, nên cùng một chứng chỉ/hợp đồng tải lên cho nhiều
+đơn chỉ chiếm dung lượng một lần. Mỗi nội dung có một dòng StoredBlob đếm số tài
+liệu đang tham chiếu; file chỉ bị xóa khỏi đĩa khi không còn tham chiếu nào.
+
+Tham chiếu được cộng khi dòng tài liệu đã được ghi (post_save trong utils/signals.py),
+cùng transaction với dòng đó, nên lần lưu thất bại hay bị rollback không để lại tham
+chiếu thừa. Đặt file vào kho và xóa file hết tham chiếu đều khóa dòng StoredBlob;
+file vừa ghi (chưa kịp có tham chiếu) không bị xóa trong UPLOAD_GRACE_SECONDS giây,
+dòng hết tham chiếu còn lại được lệnh dedupe_documents --prune-only dọn sau.
+
+Tên file lưu trong FileField có dạng blobs/ab/<sha256>/<tên file gốc>: phần hash
+xác định nội dung trên đĩa (blobs/ab/<sha256>), tên gốc dùng khi tải xuống. File
+lưu theo cách cũ (order_documents/... ) vẫn đọc được như FileSystemStorage.
+Tải xuống qua utils.views.blob_download (hỗ trợ Range và ETag).
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils.text import get_valid_filename
+
+from .models import StoredBlob
+
+BLOB_PREFIX = 'blobs'
+CHUNK_SIZE = 64 * 1024
+MAX_FILENAME_LENGTH = 100
+UPLOAD_GRACE_SECONDS = 60 * 60
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Các FileField dùng document_storage; reference được trả khi xóa/thay file (utils/signals.py)
+DEDUPLICATED_FILE_FIELDS = [
+    ('orders', 'OrderDocument', 'file'),
+    ('import_export', 'ImportExportDocument', 'file'),
+    ('import_export', 'ShippingDocument', 'file'),
+    ('farmers', 'FarmerDocument', 'file'),
+]
+
+
+def blob_name(sha256, filename):
+    return f'{BLOB_PREFIX}/{sha256[:2]}/{sha256}/{filename}'
+
+
+def parse_blob_name(name):
+    """'blobs/ab/<sha256>/<tên file>' -> (sha256, tên file); None nếu là file lưu theo cách cũ"""
+    parts = str(name or '').replace('\\', '/').split('/')
+    if len(parts) == 4 and parts[0] == BLOB_PREFIX and SHA256_RE.match(parts[2]):
+        return parts[2], parts[3]
+    return None
+
+
+def _short_filename(name):
+    filename = get_valid_filename(os.path.basename(name)) or 'file'
+    if len(filename) > MAX_FILENAME_LENGTH:
+        root, ext = os.path.splitext(filename)
+        filename = root[:MAX_FILENAME_LENGTH - len(ext)] + ext
+    return filename
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage lưu mỗi nội dung một lần và đếm tham chiếu"""
+
+    def blob_path(self, sha256):
+        return super().path(f'{BLOB_PREFIX}/{sha256[:2]}/{sha256}')
+
+    def path(self, name):
+        parsed = parse_blob_name(name)
+        if parsed is None:
+            return super().path(name)
+        return self.blob_path(parsed[0])
+
+    def get_available_name(self, name, max_length=None):
+        # Tên lưu được quyết định bởi nội dung trong _save, không bao giờ trùng
+        return name
+
+    def _save(self, name, content):
+        """Đặt nội dung vào kho (nếu chưa có); tham chiếu được cộng khi tài liệu được lưu"""
+        directory = super().path(BLOB_PREFIX)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            with transaction.atomic():
+                # Khóa dòng StoredBlob để lần xóa đồng thời không gỡ file giữa lúc kiểm tra và ghi
+                StoredBlob.objects.bulk_create([StoredBlob(sha256=sha256, size=size)], ignore_conflicts=True)
+                StoredBlob.objects.select_for_update().filter(sha256=sha256).get()
+                path = self.blob_path(sha256)
+                if os.path.exists(path):
+                    os.utime(path)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(temp_path, path)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(path, self.file_permissions_mode)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return blob_name(sha256, _short_filename(name))
+
+    def add_reference(self, name):
+        """Cộng một tham chiếu cho nội dung của tên file đã lưu; gọi cùng transaction ghi tài liệu"""
+        parsed = parse_blob_name(name)
+        if parsed is None:
+            return
+        sha256 = parsed[0]
+        blobs = StoredBlob.objects.filter(sha256=sha256)
+        with transaction.atomic():
+            if not blobs.update(ref_count=F('ref_count') + 1):
+                # Dòng đã bị dọn (hết tham chiếu) nhưng file vẫn còn trong thời gian chờ
+                StoredBlob.objects.bulk_create(
+                    [StoredBlob(sha256=sha256, size=os.path.getsize(self.blob_path(sha256)))], ignore_conflicts=True
+                )
+                blobs.update(ref_count=F('ref_count') + 1)
+
+    def delete(self, name):
+        """Trả một tham chiếu; nội dung hết tham chiếu được xóa khỏi đĩa sau khi commit"""
+        parsed = parse_blob_name(name)
+        if parsed is None:
+            return super().delete(name)
+        sha256 = parsed[0]
+        with transaction.atomic():
+            StoredBlob.objects.filter(sha256=sha256, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+            unreferenced = StoredBlob.objects.filter(sha256=sha256, ref_count=0).exists()
+        if unreferenced:
+            transaction.on_commit(lambda: self._remove_unreferenced(sha256))
+
+    def _remove_unreferenced(self, sha256):
+        """Xóa dòng StoredBlob và file nếu vẫn hết tham chiếu, kiểm tra lại khi đang khóa dòng"""
+        path = self.blob_path(sha256)
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(sha256=sha256).first()
+            if blob is None or blob.ref_count:
+                return
+            try:
+                if time.time() - os.path.getmtime(path) < UPLOAD_GRACE_SECONDS:
+                    # Vừa có lần tải lên cùng nội dung, tham chiếu của nó chưa được ghi
+                    return
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            blob.delete()
+
+    def url(self, name):
+        parsed = parse_blob_name(name)
+        if parsed is None:
+            return super().url(name)
+        return reverse('utils:blob_download', kwargs={'sha256': parsed[0], 'filename': parsed[1]})
+
+
+document_storage = ContentAddressedStorage()
+
+
+def get_document_storage():
+    return document_storage
@@ -0,0 +1,22 @@
+"""
+Công cụ dùng chung khi chạy test.
+"""
+from django.db import DEFAULT_DB_ALIAS
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner của dự án (settings.TEST_RUNNER): cấp số chứng từ trên kết nối mặc định,
+    vì TestCase chỉ cho truy vấn alias 'default' và số cấp trong test cần rollback cùng test.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._sequence_database = override_settings(SEQUENCE_DATABASE=DEFAULT_DB_ALIAS)
+        self._sequence_database.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._sequence_database.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,23 @@
+"""
+Chuẩn hóa chuỗi cho tìm kiếm: bỏ dấu tiếng Việt, chữ thường, tách từ.
+"""
+import re
+import unicodedata
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def fold_text(value):
+    """'Nguyễn Văn Đức' -> 'nguyen van duc' (bỏ dấu, chữ thường, ký tự khác chữ/số thành khoảng trắng)"""
+    value = unicodedata.normalize('NFD', str(value or '')).replace('đ', 'd').replace('Đ', 'D')
+    value = ''.join(char for char in value if not unicodedata.combining(char)).lower()
+    return _NON_ALNUM.sub(' ', value).strip()
+
+
+def compact_text(value):
+    """Dạng liền không dấu của mã/số: 'SO-20261018-0001' -> 'so202610180001'"""
+    return fold_text(value).replace(' ', '')
+
+
+def digits_only(value):
+    return re.sub(r'\D', '', str(value or ''))
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'utils'
+
+urlpatterns = [
+    path('blobs/<str:sha256>/<str:filename>', views.blob_download, name='blob_download'),
+]
@@ -1,3 +1,102 @@
-from django.shortcuts import render
+import mimetypes
+import os
 
-# Create your views here.
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date, parse_etags
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+from .storage import CHUNK_SIZE, SHA256_RE, document_storage
+
+# Nội dung không bao giờ đổi dưới cùng một hash
+BLOB_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+def parse_range(header, size):
+    """
+    Header Range một khoảng ('bytes=0-99', 'bytes=100-', 'bytes=-100') -> (start, end).
+    None nếu không dùng được (không phải bytes hoặc nhiều khoảng: trả cả file), False nếu vượt kích thước.
+    """
+    unit, _, ranges = (header or '').partition('=')
+    if unit.strip() != 'bytes' or ',' in ranges:
+        return None
+    start, _, end = ranges.strip().partition('-')
+    try:
+        if start == '':
+            length = int(end)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@login_required
+@require_safe
+def blob_download(request, sha256, filename):
+    """Tải tài liệu lưu theo nội dung: ETag là hash nội dung, hỗ trợ If-None-Match/If-Modified-Since và Range"""
+    if not SHA256_RE.match(sha256):
+        raise Http404
+    path = document_storage.blob_path(sha256)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404
+    etag = f'"{sha256}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': BLOB_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        not_modified = etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+    else:
+        not_modified = not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime)
+    if not_modified:
+        response = HttpResponseNotModified()
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if 'Range' in request.headers and (not if_range or if_range.strip() == etag):
+        byte_range = parse_range(request.headers['Range'], stat.st_size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(path, start, end - start + 1), status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Disposition'] = content_disposition_header(False, filename)
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type, filename=filename)
+    for key, value in headers.items():
+        response[key] = value
+    return response